@@ -10,31 +10,99 @@ Handles user queries for the Nova MME chatbot:
 6. Returns formatted response to frontend
 """
 
+import gzip
 import json
+import math
+import operator
 import os
+import re
+import threading
+import time
 import boto3
 import base64
+import heapq
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Any, List
 from datetime import datetime
+from asset_config import load_asset_config
 
 # Initialize clients
-bedrock_runtime = boto3.client('bedrock-runtime')
-s3_client = boto3.client('s3')
-s3vectors_client = boto3.client('s3vectors')
+# Bedrock connections stay alive between warm invocations; standard mode retries throttling
+BEDROCK_CLIENT_CONFIG = Config(retries={'mode': 'standard'}, tcp_keepalive=True)
+bedrock_runtime = boto3.client('bedrock-runtime', config=BEDROCK_CLIENT_CONFIG)
+
+# Upper bound on concurrent S3 GETs when fetching source content for the prompt
+MAX_FETCH_WORKERS = 8
+
+# S3 and S3 Vectors connections are kept alive too, with a pool large enough for every fetch worker
+S3_CLIENT_CONFIG = Config(
+    retries={'mode': 'standard'},
+    tcp_keepalive=True,
+    max_pool_connections=MAX_FETCH_WORKERS
+)
+s3_client = boto3.client('s3', config=S3_CLIENT_CONFIG)
+s3vectors_client = boto3.client('s3vectors', config=S3_CLIENT_CONFIG)
+
+# Deployment config baked into the asset by CDK; existing variables take precedence
+load_asset_config()
 
 # Environment variables
 VECTOR_BUCKET = os.environ['VECTOR_BUCKET']
 EMBEDDING_MODEL_ID = os.environ['EMBEDDING_MODEL_ID']
 LLM_MODEL_ID = os.environ['LLM_MODEL_ID']
 LLM_REGION = os.environ.get('LLM_REGION', os.environ.get('AWS_REGION', 'us-east-1'))
+LLM_MAX_TOKENS = int(os.environ.get('LLM_MAX_TOKENS', '2048'))
+LLM_TEMPERATURE = float(os.environ.get('LLM_TEMPERATURE', '0.7'))
+LLM_PROMPT_CACHE = os.environ.get('LLM_PROMPT_CACHE', 'false').lower() == 'true'
 DEFAULT_DIMENSION = int(os.environ.get('DEFAULT_DIMENSION', '1024'))
 DEFAULT_K = int(os.environ.get('DEFAULT_K', '5'))
 HIERARCHICAL_ENABLED = os.environ.get('HIERARCHICAL_ENABLED', 'true').lower() == 'true'
 HIERARCHICAL_CONFIG = json.loads(os.environ.get('HIERARCHICAL_CONFIG', '{}'))
 VECTOR_INDEXES = json.loads(os.environ.get('VECTOR_INDEXES', '{}'))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', '60'))
+RESPONSE_CACHE_MAX_ENTRIES = 128
+EMBEDDING_CACHE_MAX_ENTRIES = 1024
+
+# Text sources are cut to this many characters in the prompt
+MAX_TEXT_CHARS = 2000
+
+# Bodies at least this large are gzipped for clients that accept it; smaller ones
+# gain little and would grow by the base64 encoding
+GZIP_MIN_BYTES = 1024
+
+# Fastest gzip level: answers are mostly prose, which compresses well even at level 1
+GZIP_COMPRESS_LEVEL = 1
+
+# Longest UTF-8 encoding of one character, bounding the bytes a text read spans
+UTF8_MAX_BYTES_PER_CHAR = 4
+
+# s3://bucket/key, split into bucket and (non-empty) key
+S3_URI_PATTERN = re.compile(r'^s3://([^/]+)/(.+)$')
+
+# Per-container cache of recent /query responses, keyed by the canonical request body.
+# HTTP APIs have no stage cache, so repeat questions are answered here instead of
+# repeating the embedding, vector search and LLM round-trip.
+_response_cache = {}
+
+# Per-container cache of base64-encoded source images, keyed by S3 URI and holding
+# (ETag, data). PDF page images recur across questions; a repeat is revalidated with
+# a conditional GET, so an unchanged image is neither downloaded nor re-encoded.
+# Locked because images are fetched from several threads at once.
+IMAGE_CACHE_MAX_ENTRIES = 32
+_image_cache = {}
+_image_cache_lock = threading.Lock()
+
+# Same for text segments, keyed by (S3 URI, start char, end char) and holding
+# (ETag, content), so segments of a hot document are revalidated rather than re-read
+TEXT_CACHE_MAX_ENTRIES = 256
+_text_cache = {}
+_text_cache_lock = threading.Lock()
 
 # Create region-specific Bedrock client for LLM if needed
-bedrock_runtime_llm = boto3.client('bedrock-runtime', region_name=LLM_REGION) if LLM_REGION != os.environ.get('AWS_REGION') else bedrock_runtime
+bedrock_runtime_llm = boto3.client('bedrock-runtime', region_name=LLM_REGION, config=BEDROCK_CLIENT_CONFIG) if LLM_REGION != os.environ.get('AWS_REGION') else bedrock_runtime
 
 
 def handler(event, context):
@@ -64,6 +132,17 @@ def handler(event, context):
         if not query:
             return create_response(400, {'error': 'Query is required'})
         
+        # Serve repeat payloads from cache unless the client asked for a fresh answer
+        cache_key = json.dumps(body, sort_keys=True)
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        use_cache = 'no-cache' not in headers.get('cache-control', '').lower()
+        accept_encoding = headers.get('accept-encoding', '')
+        if use_cache:
+            cached = get_cached_response(cache_key)
+            if cached is not None:
+                print(f"Serving cached response for query: {query[:100]}")
+                return compress_response(cached, accept_encoding)
+        
         print(f"Processing query: {query[:100]}... (dimension={dimension}, hierarchical={use_hierarchical})")
         
         # Track processing steps for transparency
@@ -100,7 +179,7 @@ def handler(event, context):
             # Return helpful fallback response
             no_results_response = create_no_results_response(query, len(sources))
             
-            return create_response(200, {
+            return compress_response(create_response(200, {
                 'answer': no_results_response,
                 'sources': [],
                 'model': LLM_MODEL_ID,
@@ -108,7 +187,7 @@ def handler(event, context):
                 'dimension': dimension,
                 'resultsFound': 0,
                 'processingSteps': processing_steps
-            })
+            }), accept_encoding)
         
         # Step 3: Fetch media content and format prompt
         processing_steps.append(f"📝 Fetching media content and preparing context...")
@@ -135,7 +214,12 @@ def handler(event, context):
             'processingSteps': processing_steps  # Add processing transparency
         }
         
-        return create_response(200, response_data)
+        response = create_response(200, response_data)
+        if use_cache:
+            # Cached uncompressed; each hit is encoded for the client that asked
+            cache_response(cache_key, response)
+        
+        return compress_response(response, accept_encoding)
         
     except Exception as e:
         print(f"Error processing query: {str(e)}")
@@ -151,9 +235,19 @@ def embed_query(query: str, dimension: int) -> List[float]:
     """
     Embed user query using Nova MME synchronous API
     
+    Embeddings are cached per container by (query, dimension): the model is
+    deterministic, so a repeated question skips the Bedrock round-trip even
+    when its response is no longer cached (other settings, expired, no-cache).
+    
     Returns:
         List of floats representing the embedding vector
     """
+    return list(_embed_query_cached(query, dimension))
+
+
+@lru_cache(maxsize=EMBEDDING_CACHE_MAX_ENTRIES)
+def _embed_query_cached(query: str, dimension: int) -> tuple:
+    """Invoke Nova MME for one query; the tuple result is immutable, so it is safe to share"""
     model_input = {
         "schemaVersion": "nova-multimodal-embed-v1",
         "taskType": "SINGLE_EMBEDDING",
@@ -175,21 +269,21 @@ def embed_query(query: str, dimension: int) -> List[float]:
     result = json.loads(response['body'].read())
     embedding = result['embeddings'][0]['embedding']
     
-    return embedding
+    return tuple(embedding)
 
 
-def simple_search(query_embedding: List[float], dimension: int, k: int) -> List[Dict[str, Any]]:
+def simple_search(query_embedding: List[float], dimension: int, k: int, return_metadata: bool = True) -> List[Dict[str, Any]]:
     """
     Simple vector search at specified dimension
     
     Returns:
-        List of source documents with metadata
+        List of source documents with metadata (empty metadata if return_metadata is False)
     """
     index_name = f"embeddings-{dimension}d"
     
     # TODO: Replace with actual S3 Vector API call
     # For now, this is a placeholder that reads from S3 structure
-    sources = search_s3_vector_index(index_name, query_embedding, k)
+    sources = search_s3_vector_index(index_name, query_embedding, k, return_metadata)
     
     return sources
 
@@ -215,9 +309,10 @@ def hierarchical_search(query_embedding: List[float], final_k: int, processing_s
     if processing_steps is not None:
         processing_steps.append(f"  → Searching {first_dim}d index for top {first_k} candidates...")
     
-    # Truncate query embedding to first pass dimension
-    first_embedding = query_embedding[:first_dim]
-    first_results = simple_search(first_embedding, first_dim, first_k)
+    # Truncate query embedding to first pass dimension (prefixes are not unit-norm)
+    # Only the candidate count is used from this pass, so skip its metadata
+    first_embedding = normalize(query_embedding[:first_dim])
+    first_results = simple_search(first_embedding, first_dim, first_k, return_metadata=False)
     
     if processing_steps is not None:
         processing_steps.append(f"  ✓ Found {len(first_results)} candidates from fast search")
@@ -232,7 +327,7 @@ def hierarchical_search(query_embedding: List[float], final_k: int, processing_s
         processing_steps.append(f"  → Searching {second_dim}d index for top {second_k} precise matches...")
     
     # Search at higher dimension for better precision
-    second_embedding = query_embedding[:second_dim]
+    second_embedding = normalize(query_embedding[:second_dim])
     refined_results = simple_search(second_embedding, second_dim, second_k)
     
     if processing_steps is not None:
@@ -241,11 +336,12 @@ def hierarchical_search(query_embedding: List[float], final_k: int, processing_s
     return refined_results
 
 
-def search_s3_vector_index(index_name: str, embedding: List[float], k: int) -> List[Dict[str, Any]]:
+def search_s3_vector_index(index_name: str, embedding: List[float], k: int, return_metadata: bool = True) -> List[Dict[str, Any]]:
     """
     Search S3 Vector index for similar embeddings using native S3 Vectors API
     
     S3 Vectors supports all 4 MRL dimensions (256, 384, 1024, 3072)
+    Pass return_metadata=False when only keys and distances are needed.
     """
     results = []
     
@@ -258,7 +354,7 @@ def search_s3_vector_index(index_name: str, embedding: List[float], k: int) -> L
             indexName=index_name,
             queryVector={'float32': embedding},
             topK=k,
-            returnMetadata=True,
+            returnMetadata=return_metadata,
             returnDistance=True
         )
         
@@ -303,7 +399,12 @@ def search_s3_vector_index(index_name: str, embedding: List[float], k: int) -> L
 def rerank_results(results: List[Dict[str, Any]], embedding: List[float], k: int) -> List[Dict[str, Any]]:
     """
     Re-rank results using a higher-dimension embedding
+    
+    The query is normalized once up front, so each stored embedding at the
+    query's dimension (already unit-norm from embedding_utils) scores with a
+    plain dot product.
     """
+    embedding = normalize(embedding)
     scored = []
     for result in results:
         # Truncate stored embedding to match query dimension
@@ -319,8 +420,11 @@ def rerank_results(results: List[Dict[str, Any]], embedding: List[float], k: int
             })
             continue
         
-        stored_embedding_truncated = stored_embedding[:len(embedding)]
-        similarity = cosine_similarity(embedding, stored_embedding_truncated)
+        if len(stored_embedding) == len(embedding):
+            similarity = dot_product(embedding, stored_embedding)
+        else:
+            # Truncated prefixes of longer embeddings need re-normalizing
+            similarity = dot_product(embedding, normalize(stored_embedding[:len(embedding)]))
         
         print(f"Rerank: query_dim={len(embedding)}, stored_dim={len(stored_embedding)}, similarity={similarity:.4f}")
         
@@ -329,23 +433,37 @@ def rerank_results(results: List[Dict[str, Any]], embedding: List[float], k: int
             'metadata': result['metadata']
         })
     
-    # Sort by new similarity scores
-    scored.sort(key=lambda x: x['similarity'], reverse=True)
-    return scored[:k]
+    # Top k by new similarity score, without sorting the rest
+    return heapq.nlargest(k, scored, key=lambda x: x['similarity'])
+
+
+def normalize(vec: List[float]) -> List[float]:
+    """Scale a vector to unit L2 norm (zero vectors are returned unchanged)"""
+    magnitude = math.hypot(*vec)
+    if magnitude == 0:
+        return list(vec)
+    return [a / magnitude for a in vec]
+
+
+def dot_product(vec1: List[float], vec2: List[float]) -> float:
+    """Dot product; equals cosine similarity when both vectors are unit-norm"""
+    return sum(map(operator.mul, vec1, vec2))
 
 
 def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """Calculate cosine similarity between two vectors"""
-    import math
+    """
+    Calculate cosine similarity between two vectors
     
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    magnitude1 = math.sqrt(sum(a * a for a in vec1))
-    magnitude2 = math.sqrt(sum(b * b for b in vec2))
+    Norms and the dot product run in C (math.hypot, map over operator.mul)
+    rather than as Python-level generator loops; the handler has no NumPy.
+    """
+    magnitude1 = math.hypot(*vec1)
+    magnitude2 = math.hypot(*vec2)
     
     if magnitude1 == 0 or magnitude2 == 0:
         return 0.0
     
-    return dot_product / (magnitude1 * magnitude2)
+    return dot_product(vec1, vec2) / (magnitude1 * magnitude2)
 
 
 def format_prompt(query: str, sources: List[Dict[str, Any]]) -> str:
@@ -433,6 +551,14 @@ Answer:"""
     return prompt
 
 
+def parse_s3_uri(source_uri: str) -> tuple:
+    """Split an s3://bucket/key URI into (bucket, key), or (None, None) if it isn't one"""
+    match = S3_URI_PATTERN.match(source_uri or '')
+    if match is None:
+        return None, None
+    return match.group(1), match.group(2)
+
+
 def get_text_content(source_uri: str, metadata: Dict[str, Any]) -> str:
     """
     Retrieve actual text content from S3 for text sources
@@ -443,20 +569,14 @@ def get_text_content(source_uri: str, metadata: Dict[str, Any]) -> str:
     
     Returns:
         Text content (truncated if needed)
+    
+    Cached segments are only re-read when the file's ETag has changed.
     """
-    if not source_uri or not source_uri.startswith('s3://'):
+    bucket, key = parse_s3_uri(source_uri)
+    if bucket is None:
         return ""
     
     try:
-        # Parse S3 URI
-        parts = source_uri.replace('s3://', '').split('/', 1)
-        bucket = parts[0]
-        key = parts[1] if len(parts) > 1 else ''
-        
-        # Download file
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        full_content = response['Body'].read().decode('utf-8', errors='ignore')
-        
         # If this is a segment, extract the relevant portion
         start_char = metadata.get('segmentStartCharPosition')
         end_char = metadata.get('segmentEndCharPosition')
@@ -465,14 +585,45 @@ def get_text_content(source_uri: str, metadata: Dict[str, Any]) -> str:
             # Convert to int (S3 Vectors stores metadata as strings)
             start_char = int(start_char)
             end_char = int(end_char)
-            content = full_content[start_char:end_char]
         else:
-            content = full_content
+            start_char, end_char = 0, None
+        
+        # Only the first MAX_TEXT_CHARS characters are kept (one more shows whether to
+        # truncate), so the read stops there even for whole files. Character positions
+        # don't map to byte offsets in UTF-8, but those characters end within the first
+        # 4 bytes per character, so only that prefix is read
+        read_chars = start_char + MAX_TEXT_CHARS + 1
+        if end_char is not None:
+            read_chars = min(read_chars, end_char)
+        last_byte = UTF8_MAX_BYTES_PER_CHAR * max(read_chars, 1) - 1
+        
+        cache_key = (source_uri, start_char, end_char)
+        cached = _text_cache.get(cache_key)
+        request = {'Bucket': bucket, 'Key': key, 'Range': f"bytes=0-{last_byte}"}
+        if cached is not None:
+            request['IfNoneMatch'] = cached[0]
+        
+        try:
+            response = s3_client.get_object(**request)
+        except ClientError as e:
+            if cached is not None and e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304:
+                print(f"Text unchanged, using cached segment of {source_uri}")
+                return cached[1]
+            raise
+        
+        prefix = response['Body'].read().decode('utf-8', errors='ignore')
+        content = prefix[start_char:end_char]
         
         # Truncate if too long (keep first 2000 chars for context)
-        MAX_CHARS = 2000
-        if len(content) > MAX_CHARS:
-            content = content[:MAX_CHARS] + f"\n\n[Content truncated - showing first {MAX_CHARS} characters]"
+        if len(content) > MAX_TEXT_CHARS:
+            content = content[:MAX_TEXT_CHARS] + f"\n\n[Content truncated - showing first {MAX_TEXT_CHARS} characters]"
+        
+        etag = response.get('ETag')
+        if etag:
+            with _text_cache_lock:
+                if cache_key not in _text_cache and len(_text_cache) >= TEXT_CACHE_MAX_ENTRIES:
+                    del _text_cache[next(iter(_text_cache))]
+                _text_cache[cache_key] = (etag, content)
         
         return content
         
@@ -491,6 +642,9 @@ def prepare_multimodal_content(query: str, sources: List[Dict[str, Any]]) -> Lis
     content_blocks = []
     text_context_parts = []
     
+    # All S3 reads happen up front and in parallel; blocks are then assembled in source order
+    fetched = fetch_source_contents(sources)
+    
     for i, source in enumerate(sources, 1):
         metadata = source.get('metadata', {})
         filename = metadata.get('fileName', 'Unknown')
@@ -505,13 +659,10 @@ def prepare_multimodal_content(query: str, sources: List[Dict[str, Any]]) -> Lis
             if page_num is not None:
                 page_num = int(page_num)
             
-            # Fetch image from S3
-            image_data = fetch_image_from_s3(source_uri)
+            # Image fetched from S3, already base64-encoded
+            image_b64 = fetched[i - 1]
             
-            if image_data:
-                # Base64 encode
-                image_b64 = base64.b64encode(image_data).decode('utf-8')
-                
+            if image_b64:
                 # Determine media type from source URI
                 media_type = 'image/png' if source_uri.endswith('.png') else 'image/jpeg'
                 
@@ -535,7 +686,7 @@ def prepare_multimodal_content(query: str, sources: List[Dict[str, Any]]) -> Lis
         
         # For text, include actual content
         elif modality == 'TEXT':
-            content = get_text_content(source_uri, metadata)
+            content = fetched[i - 1]
             if content:
                 text_context_parts.append(f"Text Source - {filename}:\n{content}")
         
@@ -577,37 +728,88 @@ Answer:"""
     return content_blocks
 
 
-def fetch_image_from_s3(source_uri: str) -> bytes:
+def fetch_source_contents(sources: List[Dict[str, Any]]) -> List[Any]:
     """
-    Fetch image from S3 and return as bytes
+    Fetch every source's S3 content concurrently
+    
+    Returns one entry per source, in order: base64 image data for IMAGE sources, text
+    for TEXT sources, None for the rest (and for failed fetches). The GETs are
+    network-bound, so overlapping them makes the wait the slowest fetch rather
+    than the sum. Both fetchers handle their own errors.
+    """
+    fetched = [None] * len(sources)
+    tasks = []
+    for i, source in enumerate(sources):
+        metadata = source.get('metadata', {})
+        modality = metadata.get('modalityType', 'Unknown')
+        source_uri = metadata.get('sourceS3Uri', '')
+        if modality == 'IMAGE':
+            tasks.append((i, fetch_image_from_s3, (source_uri,)))
+        elif modality == 'TEXT':
+            tasks.append((i, get_text_content, (source_uri, metadata)))
+    
+    if not tasks:
+        return fetched
+    
+    with ThreadPoolExecutor(max_workers=min(len(tasks), MAX_FETCH_WORKERS)) as executor:
+        futures = [(i, executor.submit(fetch, *args)) for i, fetch, args in tasks]
+    
+    for i, future in futures:
+        fetched[i] = future.result()
+    return fetched
+
+
+def fetch_image_from_s3(source_uri: str) -> str:
+    """
+    Fetch image from S3 and return it base64-encoded
+    
+    Cached images are only re-downloaded when their ETag has changed.
     
     Args:
         source_uri: S3 URI (s3://bucket/key)
     
     Returns:
-        Image bytes, or None if fetch fails
+        Base64 image data, or None if fetch fails
     """
-    if not source_uri or not source_uri.startswith('s3://'):
+    bucket, key = parse_s3_uri(source_uri)
+    if bucket is None:
         return None
     
     try:
-        # Parse S3 URI
-        parts = source_uri.replace('s3://', '').split('/', 1)
-        bucket = parts[0]
-        key = parts[1] if len(parts) > 1 else ''
+        # Download image, unless the cached copy is still current
+        cached = _image_cache.get(source_uri)
+        request = {'Bucket': bucket, 'Key': key}
+        if cached is not None:
+            request['IfNoneMatch'] = cached[0]
         
-        # Download image
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        image_data = response['Body'].read()
+        try:
+            response = s3_client.get_object(**request)
+        except ClientError as e:
+            if cached is not None and e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304:
+                print(f"Image unchanged, using cached copy of {source_uri}")
+                return cached[1]
+            raise
         
-        # Check size (Claude has 5MB limit per image)
-        size_mb = len(image_data) / (1024 * 1024)
+        # Check size from the headers before streaming the body (Claude has 5MB limit per image)
+        size_mb = response.get('ContentLength', 0) / (1024 * 1024)
         if size_mb > 5:
+            response['Body'].close()
             print(f"Warning: Image {source_uri} is {size_mb:.2f}MB, exceeds 5MB limit")
             return None
         
+        image_data = response['Body'].read()
+        size_mb = len(image_data) / (1024 * 1024)
+        
+        image_b64 = base64.b64encode(image_data).decode('utf-8')
+        etag = response.get('ETag')
+        if etag:
+            with _image_cache_lock:
+                if source_uri not in _image_cache and len(_image_cache) >= IMAGE_CACHE_MAX_ENTRIES:
+                    del _image_cache[next(iter(_image_cache))]
+                _image_cache[source_uri] = (etag, image_b64)
+        
         print(f"Fetched image from {source_uri} ({size_mb:.2f}MB)")
-        return image_data
+        return image_b64
         
     except Exception as e:
         print(f"Error fetching image from {source_uri}: {e}")
@@ -618,13 +820,13 @@ def call_claude_multimodal(content_blocks: List[Dict[str, Any]]) -> str:
     """
     Call Claude with multimodal content (images + text)
     """
-    max_tokens = int(os.environ.get('LLM_MAX_TOKENS', '2048'))
-    temperature = float(os.environ.get('LLM_TEMPERATURE', '0.7'))
+    if LLM_PROMPT_CACHE:
+        content_blocks = mark_prompt_cache_point(content_blocks)
     
     request_body = {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": max_tokens,
-        "temperature": temperature,
+        "max_tokens": LLM_MAX_TOKENS,
+        "temperature": LLM_TEMPERATURE,
         "messages": [
             {
                 "role": "user",
@@ -644,6 +846,27 @@ def call_claude_multimodal(content_blocks: List[Dict[str, Any]]) -> str:
     return answer
 
 
+def mark_prompt_cache_point(content_blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return content_blocks with a prompt cache point after the last image block
+    
+    Images lead the message and dominate its token count; the closing text block
+    carries the question, so it changes on every request. Caching the image
+    prefix lets a follow-up question about the same sources skip reprocessing it
+    (5-minute TTL). Requests without images are returned unchanged.
+    """
+    last_image = max(
+        (i for i, block in enumerate(content_blocks) if block.get('type') == 'image'),
+        default=None
+    )
+    if last_image is None:
+        return content_blocks
+    
+    marked = list(content_blocks)
+    marked[last_image] = {**content_blocks[last_image], 'cache_control': {'type': 'ephemeral'}}
+    return marked
+
+
 def format_sources(sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Format sources for frontend display
@@ -755,6 +978,35 @@ Try:
 • Checking if the right files have been uploaded"""
 
 
+def get_cached_response(cache_key: str) -> Dict[str, Any]:
+    """
+    Return the cached response for a request body, or None if missing or expired
+    """
+    entry = _response_cache.get(cache_key)
+    if entry is None:
+        return None
+    
+    expires_at, response = entry
+    if time.monotonic() >= expires_at:
+        del _response_cache[cache_key]
+        return None
+    
+    return response
+
+
+def cache_response(cache_key: str, response: Dict[str, Any]) -> None:
+    """
+    Cache a successful response for RESPONSE_CACHE_TTL_SECONDS, evicting the oldest entry when full
+    """
+    if RESPONSE_CACHE_TTL_SECONDS <= 0:
+        return
+    
+    if cache_key not in _response_cache and len(_response_cache) >= RESPONSE_CACHE_MAX_ENTRIES:
+        del _response_cache[next(iter(_response_cache))]
+    
+    _response_cache[cache_key] = (time.monotonic() + RESPONSE_CACHE_TTL_SECONDS, response)
+
+
 def create_response(status_code: int, data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create API Gateway response with CORS headers
@@ -764,8 +1016,28 @@ def create_response(status_code: int, data: Dict[str, Any]) -> Dict[str, Any]:
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,Authorization',
-            'Access-Control-Allow-Methods': 'GET,POST,OPTIONS'
+            'Access-Control-Allow-Headers': 'Content-Type,Authorization,Cache-Control',
+            'Access-Control-Allow-Methods': 'POST,OPTIONS'
         },
         'body': json.dumps(data)
     }
+
+
+def compress_response(response: Dict[str, Any], accept_encoding: str) -> Dict[str, Any]:
+    """
+    Gzip a create_response() body if the client accepts gzip and the body is large
+    
+    API Gateway decodes the base64 body and passes the gzip bytes through, and the
+    browser inflates them per Content-Encoding. Returns a new response; the one
+    passed in is left as is so it can stay in the response cache.
+    """
+    body = response['body'].encode('utf-8')
+    if 'gzip' not in accept_encoding.lower() or len(body) < GZIP_MIN_BYTES:
+        return response
+    
+    return {
+        **response,
+        'headers': {**response['headers'], 'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)).decode('ascii'),
+        'isBase64Encoded': True
+    }
@@ -0,0 +1,161 @@
+"""
+Lambda: Job Callback
+
+Resumes the Step Functions execution when a Nova MME async invocation finishes,
+instead of polling get_async_invoke on a timer.
+- Invoked by Step Functions (.waitForTaskToken): stores the task token next to
+  the invocation's output folder
+- Invoked by S3 when segmented-embedding-result.json lands in the output bucket:
+  reads the stored token and sends the job back to Step Functions
+
+Whichever side arrives second sends SendTaskSuccess, so a job that finishes
+before its token is registered still resumes immediately. Failed invocations
+write no result file: a job that has already failed at registration is
+reported with SendTaskFailure, and later failures are caught by the state
+machine falling back to CheckJobStatus polling when no callback arrives.
+"""
+
+import json
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from urllib.parse import unquote_plus
+from typing import Dict, Any, Optional
+
+# Initialize clients
+s3_client = boto3.client('s3')
+sfn_client = boto3.client('stepfunctions')
+bedrock_runtime = boto3.client(
+    'bedrock-runtime',
+    config=Config(retries={'mode': 'standard'}, tcp_keepalive=True)
+)
+
+RESULT_FILE_NAME = 'segmented-embedding-result.json'
+TOKEN_FILE_NAME = 'task-token.json'
+
+# Error name the state machine catches to fail the file without waiting
+JOB_FAILED_ERROR = 'AsyncInvokeFailed'
+
+# SendTaskSuccess errors meaning the task no longer waits on this token
+STALE_TOKEN_ERRORS = ('InvalidToken', 'TaskDoesNotExist', 'TaskTimedOut')
+
+
+def handler(event, context):
+    """
+    Main handler for Job Callback Lambda
+    
+    Args:
+        event: Either {'taskToken': ..., 'job': {...}} from Step Functions,
+            or an S3 ObjectCreated notification for a result file
+        context: Lambda context
+    
+    Returns:
+        Dict with the number of executions resumed
+    """
+    if 'taskToken' in event:
+        resumed = register_task_token(event['taskToken'], event['job'])
+    else:
+        resumed = 0
+        for record in event.get('Records', []):
+            bucket = record['s3']['bucket']['name']
+            key = unquote_plus(record['s3']['object']['key'])
+            resumed += resume_from_result(bucket, key)
+    
+    return {'resumed': resumed}
+
+
+def job_output_location(job: Dict[str, Any]) -> tuple:
+    """
+    Return (bucket, prefix) of the folder Nova MME writes this job's output to
+    
+    Nova MME creates a subdirectory named after the invocation ID under outputS3Uri.
+    """
+    bucket, prefix = job['outputS3Uri'].replace('s3://', '').split('/', 1)
+    invocation_id = job['invocationArn'].split('/')[-1]
+    return bucket, f"{prefix.rstrip('/')}/{invocation_id}"
+
+
+def register_task_token(task_token: str, job: Dict[str, Any]) -> int:
+    """Store the task token for the job, resuming at once if the result already exists"""
+    bucket, prefix = job_output_location(job)
+    
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/{TOKEN_FILE_NAME}",
+        Body=json.dumps({'taskToken': task_token, 'job': job}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    print(f"Registered task token for s3://{bucket}/{prefix}/")
+    
+    # The job may have completed before the token was stored
+    try:
+        s3_client.head_object(Bucket=bucket, Key=f"{prefix}/{RESULT_FILE_NAME}")
+    except ClientError:
+        # No result yet; a job that already failed will never write one
+        fail_if_job_failed(task_token, job)
+        return 0
+    
+    print(f"Result already present for s3://{bucket}/{prefix}/")
+    return send_task_success(task_token, job)
+
+
+def fail_if_job_failed(task_token: str, job: Dict[str, Any]) -> None:
+    """Send SendTaskFailure if Bedrock already reports the job as failed"""
+    response = bedrock_runtime.get_async_invoke(invocationArn=job['invocationArn'])
+    status = response['status']
+    if status not in ('Failed', 'Expired'):
+        return
+    
+    failure_message = response.get('failureMessage', status)
+    print(f"Job {job['invocationArn']} already {status}: {failure_message}")
+    sfn_client.send_task_failure(
+        taskToken=task_token,
+        error=JOB_FAILED_ERROR,
+        cause=failure_message
+    )
+
+
+def resume_from_result(bucket: str, key: str) -> int:
+    """Resume the execution waiting on the result file at bucket/key, if any"""
+    if not key.endswith(f"/{RESULT_FILE_NAME}"):
+        print(f"Skipping non-result object: {key}")
+        return 0
+    
+    prefix = key[:-len(RESULT_FILE_NAME) - 1]
+    registration = read_registration(bucket, prefix)
+    if registration is None:
+        # Step Functions has not registered yet; register_task_token will see the result
+        print(f"No task token yet for s3://{bucket}/{prefix}/")
+        return 0
+    
+    return send_task_success(registration['taskToken'], registration['job'])
+
+
+def read_registration(bucket: str, prefix: str) -> Optional[Dict[str, Any]]:
+    """Read the stored task token and job, or None if not registered"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{prefix}/{TOKEN_FILE_NAME}")
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'NoSuchKey':
+            return None
+        raise
+    
+    return json.loads(response['Body'].read())
+
+
+def send_task_success(task_token: str, job: Dict[str, Any]) -> int:
+    """Hand the job back to Step Functions, ignoring tokens that were already used"""
+    try:
+        sfn_client.send_task_success(
+            taskToken=task_token,
+            output=json.dumps({**job, 'status': 'COMPLETED'})
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] not in STALE_TOKEN_ERRORS:
+            raise
+        # The other side already resumed the task, or it fell back to polling
+        print(f"Task token no longer valid: {str(e)}")
+        return 0
+    
+    print(f"Resumed execution for {job['invocationArn']}")
+    return 1
@@ -11,9 +11,11 @@ Triggered by S3 upload via Step Functions.
 import json
 import os
 import boto3
+from botocore.config import Config
 from datetime import datetime
 from typing import Dict, Any, List
 from urllib.parse import unquote_plus
+from asset_config import load_asset_config
 import tempfile
 
 # PyMuPDF import (optional for testing)
@@ -33,8 +35,18 @@ except ImportError:
     print("Warning: python-docx not installed, .docx support disabled")
 
 # Initialize clients
+# Bedrock connections stay alive between warm invocations. Adaptive mode rate-limits
+# StartAsyncInvoke on the client once Bedrock throttles, so multi-page PDFs back off
+# only as much as needed instead of sleeping a fixed interval between pages.
+BEDROCK_CLIENT_CONFIG = Config(
+    retries={'mode': 'adaptive', 'max_attempts': 8},
+    tcp_keepalive=True
+)
 s3_client = boto3.client('s3')
-bedrock_runtime = boto3.client('bedrock-runtime')
+bedrock_runtime = boto3.client('bedrock-runtime', config=BEDROCK_CLIENT_CONFIG)
+
+# Deployment config baked into the asset by CDK; existing variables take precedence
+load_asset_config()
 
 # Environment variables
 EMBEDDING_DIMENSION = int(os.environ.get('EMBEDDING_DIMENSION', '3072'))
@@ -167,22 +179,26 @@ def handler(event, context):
                     'outputS3Uri': output_s3_uri,
                     'metadata': page_metadata
                 })
-                
-                # Add delay to avoid Bedrock rate limiting (quick fix)
-                # TODO: Long-term, move invocation logic to Step Functions for proper rate limiting
-                if page_num < len(image_uris):  # Don't delay after last page
-                    import time
-                    time.sleep(1.0)  # 1 second delay between pages (increased from 500ms)
             
-            # Return all pages - Step Functions will need to process each
-            # For now, return first page in standard format for compatibility
+            # Page list goes to S3 rather than the state payload: large PDFs exceed
+            # the 256 KB Step Functions payload limit. A Distributed Map reads it back.
+            manifest_key = f"pdf-pages/{metadata['objectId']}/pages-manifest.json"
+            s3_client.put_object(
+                Bucket=OUTPUT_BUCKET,
+                Key=manifest_key,
+                Body=json.dumps(pdf_pages).encode('utf-8'),
+                ContentType='application/json'
+            )
+            print(f"Wrote page manifest to s3://{OUTPUT_BUCKET}/{manifest_key}")
+            
+            # First page in standard format for compatibility
             return {
                 'statusCode': 200,
                 'invocationArn': pdf_pages[0]['invocationArn'],
                 'outputS3Uri': pdf_pages[0]['outputS3Uri'],
                 'metadata': pdf_pages[0]['metadata'],
                 'status': 'IN_PROGRESS',
-                'pdfPages': pdf_pages,  # All pages for potential batch processing
+                'pdfPagesManifestKey': manifest_key,
                 'totalPages': len(image_uris)
             }
         else:
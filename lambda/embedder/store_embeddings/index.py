@@ -12,28 +12,21 @@ import json
 import os
 import boto3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Any, List
+from botocore.exceptions import ClientError
 
-# Add shared utilities to path
-sys.path.insert(0, '/opt/python')  # Lambda layer path
+# Shared modules are copied to the asset root at deploy time (lib/lambda_assets.py);
+# locally they are imported from lambda/shared
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../shared'))
 
-try:
-    from embedding_utils import create_multi_dimensional_embeddings
-except ImportError:
-    # Fallback for local testing
-    import numpy as np
-    def create_multi_dimensional_embeddings(embedding_3072, dimensions=[256, 384, 1024, 3072]):
-        result = {}
-        for dim in dimensions:
-            if dim == 3072:
-                result[dim] = embedding_3072
-            else:
-                truncated = np.array(embedding_3072[:dim])
-                normalized = truncated / np.linalg.norm(truncated)
-                result[dim] = normalized.tolist()
-        return result
+from asset_config import load_asset_config
+from embedding_utils import (
+    create_multi_dimensional_embeddings,
+    create_multi_dimensional_embeddings_batch
+)
 
 # Import numpy for float32 conversion (required by S3 Vectors API)
 import numpy as np
@@ -42,9 +35,52 @@ import numpy as np
 s3_client = boto3.client('s3')
 s3vectors_client = boto3.client('s3vectors', region_name=os.environ.get('AWS_REGION', 'us-east-1'))
 
+
+def _prebuild_put_vectors_body(params, context, **kwargs):
+    """
+    Serialize the PutVectors body with a single json.dumps call
+
+    botocore's rest-json serializer walks every float in every vector in Python,
+    which dominates request build time for large batches. The body is encoded
+    here instead and the float arrays are emptied so the serializer has almost
+    nothing to walk; _inject_put_vectors_body swaps the prebuilt body back in
+    before the request is signed.
+    """
+    context['put_vectors_body'] = json.dumps(params).encode('utf-8')
+    params['vectors'] = [
+        {**vector, 'data': {'float32': []}} for vector in params['vectors']
+    ]
+
+
+def _inject_put_vectors_body(params, context, **kwargs):
+    """Replace the serialized PutVectors body with the prebuilt one"""
+    body = context.pop('put_vectors_body', None)
+    if body is not None:
+        params['body'] = body
+
+
+s3vectors_client.meta.events.register(
+    'before-parameter-build.s3vectors.PutVectors', _prebuild_put_vectors_body
+)
+s3vectors_client.meta.events.register(
+    'before-call.s3vectors.PutVectors', _inject_put_vectors_body
+)
+
+# Deployment config baked into the asset by CDK; existing variables take precedence
+load_asset_config()
+
 # Environment variables
 VECTOR_BUCKET = os.environ['VECTOR_BUCKET']
 EMBEDDING_DIMENSIONS = [int(d) for d in os.environ.get('EMBEDDING_DIMENSIONS', '256,384,1024,3072').split(',')]
+# One-off migration: delete the unpadded keys written before segment keys were zero-padded
+DELETE_LEGACY_VECTOR_KEYS = os.environ.get('DELETE_LEGACY_VECTOR_KEYS', 'false').lower() == 'true'
+
+# Maximum number of vectors accepted by a single S3 Vectors PutVectors call
+PUT_VECTORS_BATCH_SIZE = 500
+
+# PutVectors also rejects request bodies over 20 MiB. A 3072d vector serializes to
+# ~69 KB of JSON, so batches are capped by size too, leaving headroom for the envelope.
+PUT_VECTORS_MAX_BATCH_BYTES = 16 * 1024 * 1024
 
 print(f"Lambda initialized - VECTOR_BUCKET: {VECTOR_BUCKET}")
 print(f"Lambda initialized - EMBEDDING_DIMENSIONS: {EMBEDDING_DIMENSIONS}")
@@ -74,6 +110,9 @@ def handler(event, context):
         invocation_id = invocation_arn.split('/')[-1]
         print(f"Invocation ID: {invocation_id}")
         
+        # One timestamp for every vector written by this invocation
+        processing_timestamp = datetime.now().isoformat()
+        
         # Parse S3 URI and append invocation ID
         bucket, prefix = parse_s3_uri(output_s3_uri)
         # Nova MME creates a subdirectory with the invocation ID
@@ -91,7 +130,8 @@ def handler(event, context):
                     embedding_result,
                     source_metadata,
                     bucket,
-                    full_prefix
+                    full_prefix,
+                    processing_timestamp
                 )
                 total_stored += count
         
@@ -155,7 +195,8 @@ def process_modality_embeddings(
     embedding_result: Dict[str, Any],
     source_metadata: Dict[str, Any],
     bucket: str,
-    prefix: str
+    prefix: str,
+    processing_timestamp: str
 ) -> int:
     """
     Process embeddings for a single modality
@@ -175,8 +216,11 @@ def process_modality_embeddings(
     response = s3_client.get_object(Bucket=output_bucket, Key=output_key)
     content = response['Body'].read().decode('utf-8')
     
-    # Process each line (each segment)
-    count = 0
+    # Collect vectors per dimension so each index is written with batched PutVectors calls
+    batches = {dim: [] for dim in EMBEDDING_DIMENSIONS}
+    
+    # Parse every successful segment first so MRL truncation runs once per file
+    segments = []
     for line in content.strip().split('\n'):
         if not line:
             continue
@@ -184,7 +228,21 @@ def process_modality_embeddings(
         segment_data = json.loads(line)
         
         if segment_data.get('status') == 'SUCCESS':
-            count += process_segment(segment_data, source_metadata, embedding_type)
+            segments.append(segment_data)
+    
+    variants_by_segment = create_multi_dimensional_embeddings_batch(
+        [segment_data['embedding'] for segment_data in segments],
+        EMBEDDING_DIMENSIONS
+    )
+    
+    count = 0
+    for segment_data, embeddings_by_dim in zip(segments, variants_by_segment):
+        count += process_segment(
+            segment_data, source_metadata, embedding_type, batches, processing_timestamp,
+            embeddings_by_dim
+        )
+    
+    store_all_dimensions(batches)
     
     return count
 
@@ -192,24 +250,31 @@ def process_modality_embeddings(
 def process_segment(
     segment_data: Dict[str, Any],
     source_metadata: Dict[str, Any],
-    embedding_type: str
+    embedding_type: str,
+    batches: Dict[int, List[Dict[str, Any]]],
+    processing_timestamp: str,
+    embeddings_by_dim: Dict[int, List[float]] = None
 ) -> int:
     """
-    Process a single segment: truncate to all dimensions and store
+    Process a single segment: truncate to all dimensions and queue for storage
+    
+    Each dimension variant is appended to batches[dim]; the caller flushes
+    the batches to the S3 Vector indexes. Pass embeddings_by_dim when the
+    variants were already computed for the whole file.
     
     Returns:
-        Number of variants stored (typically 4)
+        Number of variants queued (typically 4)
     """
-    embedding_3072 = segment_data['embedding']
     segment_metadata = segment_data.get('segmentMetadata', {})
     
     # Create all dimension variants using MRL
-    embeddings_by_dim = create_multi_dimensional_embeddings(
-        embedding_3072,
-        EMBEDDING_DIMENSIONS
-    )
+    if embeddings_by_dim is None:
+        embeddings_by_dim = create_multi_dimensional_embeddings(
+            segment_data['embedding'],
+            EMBEDDING_DIMENSIONS
+        )
     
-    # Store each dimension variant
+    # Queue each dimension variant
     stored_count = 0
     for dim, embedding in embeddings_by_dim.items():
         # Combine all metadata
@@ -217,11 +282,13 @@ def process_segment(
             source_metadata,
             segment_metadata,
             embedding_type,
-            dim
+            dim,
+            processing_timestamp
         )
         
-        # Store in S3 Vector index
-        store_in_vector_index(dim, embedding, combined_metadata)
+        batches.setdefault(dim, []).append(
+            build_vector_record(embedding, combined_metadata)
+        )
         stored_count += 1
     
     return stored_count
@@ -231,7 +298,8 @@ def create_combined_metadata(
     source_metadata: Dict[str, Any],
     segment_metadata: Dict[str, Any],
     embedding_type: str,
-    dimension: int
+    dimension: int,
+    processing_timestamp: str
 ) -> Dict[str, Any]:
     """
     Combine metadata from multiple sources
@@ -255,7 +323,7 @@ def create_combined_metadata(
         
         # From Lambda 3 processing
         'embeddingDimension': dimension,
-        'processingTimestamp': datetime.now().isoformat(),
+        'processingTimestamp': processing_timestamp,
     }
     
     # Add PDF-specific metadata if present
@@ -306,45 +374,149 @@ def sanitize_metadata_for_s3vectors(metadata: Dict[str, Any]) -> Dict[str, Any]:
     return sanitized
 
 
-def store_in_vector_index(
-    dimension: int,
+def build_vector_record(
     embedding: List[float],
     metadata: Dict[str, Any]
-):
-    """
-    Store embedding in S3 Vector index using S3 Vectors API
+) -> Dict[str, Any]:
     """
-    index_name = f"embeddings-{dimension}d"
+    Build a vector object in the shape expected by the S3 Vectors PutVectors API
     
+    The segment index is zero-padded in the key so that lexicographic key
+    order matches segment order.
+    """
     # Create a unique vector ID
     object_id = metadata['objectId']
-    segment_index = metadata.get('segmentIndex', 0)
-    vector_id = f"{object_id}_segment_{segment_index}"
+    segment_index = int(metadata.get('segmentIndex') or 0)
+    vector_id = f"{object_id}_segment_{segment_index:08d}"
     
     # Sanitize metadata for S3 Vectors
     clean_metadata = sanitize_metadata_for_s3vectors(metadata)
     
-    # Prepare vector object for S3 Vectors API
     # The API expects 'key', 'data' with 'float32' array, and 'metadata'
     # IMPORTANT: Must convert to numpy.float32 as per S3 Vectors API requirements
-    vector_obj = {
+    return {
         'key': vector_id,
         'data': {
             'float32': np.array(embedding, dtype=np.float32).tolist()
         },
         'metadata': clean_metadata
     }
+
+
+def store_all_dimensions(batches: Dict[int, List[Dict[str, Any]]]):
+    """
+    Flush every dimension's batches to its S3 Vector index concurrently
+    
+    The four indexes are independent and the writes are network-bound, so one
+    thread per dimension makes the wall time the slowest index rather than the
+    sum of all four. boto3 clients are thread-safe, so the module client is shared.
+    Any write error is re-raised once all dimensions have finished.
+    """
+    pending = {dim: vectors for dim, vectors in batches.items() if vectors}
+    if not pending:
+        return
+    
+    with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        futures = [
+            executor.submit(store_vector_batches, dim, vectors)
+            for dim, vectors in pending.items()
+        ]
+    
+    for future in futures:
+        future.result()
+
+
+def store_vector_batches(dimension: int, vectors: List[Dict[str, Any]]):
+    """
+    Store vectors in the S3 Vector index for a dimension using batched PutVectors calls
+    
+    Vectors are sorted by key before being split into batches so that writes
+    arrive at the index in key order (sequential appends rather than random inserts).
+    """
+    index_name = f"embeddings-{dimension}d"
+    
+    for batch in split_put_vectors_batches(sorted(vectors, key=lambda v: v['key'])):
+        if DELETE_LEGACY_VECTOR_KEYS:
+            delete_legacy_vectors(index_name, batch)
+        _put_with_split(dimension, index_name, batch)
+
+
+def legacy_vector_key(key: str) -> str:
+    """Return the unpadded key an object's segment was stored under before keys were zero-padded"""
+    object_id, segment_index = key.rsplit('_segment_', 1)
+    return f"{object_id}_segment_{int(segment_index)}"
+
+
+def delete_legacy_vectors(index_name: str, batch: List[Dict[str, Any]]):
+    """
+    Delete the unpadded keys for the vectors about to be written
     
-    # Use S3 Vectors put_vectors API (batch operation)
-    s3vectors_client.put_vectors(
+    Re-ingesting a file indexed before keys were zero-padded would otherwise
+    leave its old vectors next to the new ones, returning every segment twice.
+    Only runs while DELETE_LEGACY_VECTOR_KEYS is enabled for that re-index.
+    Deleting keys that don't exist is a no-op, so any error is re-raised.
+    """
+    s3vectors_client.delete_vectors(
         vectorBucketName=VECTOR_BUCKET,
         indexName=index_name,
-        vectors=[vector_obj]
+        keys=[legacy_vector_key(vector['key']) for vector in batch]
     )
+
+
+def split_put_vectors_batches(vectors: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Split vectors into PutVectors batches, keeping their order
     
-    print(f"Stored {dimension}d embedding in S3 Vector index {index_name}: {vector_id}")
-    #     index=index_name,
-    #     vector_id=f"{object_id}_segment_{segment_index}",
-    #     vector=embedding,
-    #     metadata=metadata
-    # )
+    A batch ends at PUT_VECTORS_BATCH_SIZE vectors or when the next vector would
+    take its serialized size past PUT_VECTORS_MAX_BATCH_BYTES, whichever comes first.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for vector in vectors:
+        # Serialized size plus the ", " separating it from the previous vector
+        vector_bytes = len(json.dumps(vector)) + 2
+        if batch and (len(batch) >= PUT_VECTORS_BATCH_SIZE or batch_bytes + vector_bytes > PUT_VECTORS_MAX_BATCH_BYTES):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(vector)
+        batch_bytes += vector_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _put_with_split(dimension: int, index_name: str, batch: List[Dict[str, Any]]):
+    """
+    Write a batch with PutVectors, splitting it in half on a ConflictException
+    
+    S3 Vectors rejects the whole batch when any vector conflicts, so halving
+    isolates the offending vector in O(log N) extra calls while the rest of the
+    batch is still written. A single conflicting vector is logged and re-raised.
+    """
+    start_time = time.perf_counter()
+    try:
+        s3vectors_client.put_vectors(
+            vectorBucketName=VECTOR_BUCKET,
+            indexName=index_name,
+            vectors=batch
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConflictException':
+            raise
+        if len(batch) == 1:
+            print(f"Conflict storing vector {batch[0]['key']} in {index_name}: {e}")
+            raise
+        print(f"Conflict in batch dim={dimension} count={len(batch)}, splitting")
+        mid = len(batch) // 2
+        _put_with_split(dimension, index_name, batch[:mid])
+        _put_with_split(dimension, index_name, batch[mid:])
+        return
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    
+    # One summary line per PutVectors call; the key range keeps individual vectors traceable
+    print(
+        f"Stored batch dim={dimension} index={index_name} count={len(batch)} "
+        f"keys={batch[0]['key']}..{batch[-1]['key']} latency_ms={latency_ms:.1f}"
+    )
@@ -0,0 +1,37 @@
+"""
+Deployment config bundled with a Lambda asset
+
+CDK writes static settings into the asset as config.json (lib/lambda_assets.py)
+instead of the function's environment map. Handlers call load_asset_config() at
+import, before reading os.environ.
+"""
+
+import json
+import os
+from typing import Optional
+
+CONFIG_FILE_NAME = 'config.json'
+
+
+def load_asset_config(task_root: Optional[str] = None) -> None:
+    """
+    Copy config.json from the asset root into os.environ
+
+    Variables already present in the environment take precedence, so a setting
+    can be overridden on the function without rebuilding the asset.
+
+    Args:
+        task_root: Directory holding config.json (defaults to LAMBDA_TASK_ROOT;
+            nothing is loaded outside Lambda if neither is set)
+    """
+    task_root = task_root or os.environ.get('LAMBDA_TASK_ROOT')
+    if not task_root:
+        return
+
+    config_file = os.path.join(task_root, CONFIG_FILE_NAME)
+    if not os.path.exists(config_file):
+        return
+
+    with open(config_file) as f:
+        for key, value in json.load(f).items():
+            os.environ.setdefault(key, value)
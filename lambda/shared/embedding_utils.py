@@ -6,7 +6,7 @@ import numpy as np
 from typing import List
 
 
-def truncate_and_normalize(embedding: List[float], target_dim: int) -> List[float]:
+def truncate_and_normalize(embedding: List[float], target_dim: int) -> np.ndarray:
     """
     Truncate an embedding to target dimension and renormalize using L2 norm.
     
@@ -18,24 +18,23 @@ def truncate_and_normalize(embedding: List[float], target_dim: int) -> List[floa
         target_dim: Target dimension to truncate to (e.g., 256, 384, 1024)
     
     Returns:
-        Truncated and renormalized embedding vector
+        Truncated and renormalized embedding as a float32 array (4 bytes per
+        value instead of a boxed Python float); call .tolist() where JSON is needed
     """
     if len(embedding) < target_dim:
         raise ValueError(
             f"Embedding length ({len(embedding)}) is less than target dimension ({target_dim})"
         )
     
-    # Truncate to first N dimensions
-    truncated = np.array(embedding[:target_dim])
+    # Truncate to first N dimensions (single float32 conversion of the slice only)
+    truncated = np.asarray(embedding[:target_dim], dtype=np.float32)
     
-    # Renormalize using L2 norm
-    norm = np.linalg.norm(truncated)
+    # Renormalize using L2 norm; np.dot avoids np.linalg.norm's per-call dispatch overhead
+    norm = np.sqrt(np.dot(truncated, truncated))
     if norm == 0:
         raise ValueError("Cannot normalize zero vector")
     
-    normalized = truncated / norm
-    
-    return normalized.tolist()
+    return truncated / norm
 
 
 def create_multi_dimensional_embeddings(
@@ -55,50 +54,85 @@ def create_multi_dimensional_embeddings(
     Returns:
         Dictionary mapping dimension -> truncated embedding
     """
+    # Single float32 buffer shared by every dimension variant
+    arr = np.asarray(embedding_3072, dtype=np.float32)
+    
+    # Squared L2 norm of every prefix in one pass: norm(arr[:d]) = sqrt(cumsq[d - 1])
+    cumsq = np.cumsum(arr * arr, dtype=np.float64)
+    
     result = {}
     
     for dim in dimensions:
         if dim == 3072:
             # Keep full embedding as-is
             result[dim] = embedding_3072
-        else:
-            # Truncate and renormalize
-            result[dim] = truncate_and_normalize(embedding_3072, dim)
+            continue
+        
+        if len(arr) < dim:
+            raise ValueError(
+                f"Embedding length ({len(arr)}) is less than target dimension ({dim})"
+            )
+        
+        norm = np.sqrt(cumsq[dim - 1])
+        if norm == 0:
+            raise ValueError("Cannot normalize zero vector")
+        
+        # Division allocates a fresh array, so variants never alias the buffer
+        result[dim] = (arr[:dim] / norm).tolist()
     
     return result
 
 
-def validate_mrl_property(
-    embedding_3072: List[float],
-    embedding_native: List[float],
-    target_dim: int,
-    tolerance: float = 0.01
-) -> bool:
+def create_multi_dimensional_embeddings_batch(
+    embeddings_3072: List[List[float]],
+    dimensions: List[int] = [256, 384, 1024, 3072]
+) -> List[dict]:
     """
-    Validate that the MRL nesting property holds.
+    Create dimension variants for many 3072-dim embeddings at once.
     
-    Checks if the first N dimensions of a 3072-dim embedding (after renormalization)
-    match a native N-dim embedding from the model.
+    Equivalent to calling create_multi_dimensional_embeddings on each embedding,
+    but all segments share one float32 matrix and one cumulative-sum pass, so the
+    per-vector work runs inside NumPy rather than a Python loop per segment.
     
     Args:
-        embedding_3072: Full 3072-dimensional embedding
-        embedding_native: Native embedding at target dimension
-        target_dim: Dimension to compare
-        tolerance: Acceptable difference threshold
+        embeddings_3072: Full 3072-dimensional embeddings, all the same length
+        dimensions: List of target dimensions to generate
     
     Returns:
-        True if embeddings match within tolerance
+        List (one per input embedding) of dicts mapping dimension -> embedding
     """
-    truncated = truncate_and_normalize(embedding_3072, target_dim)
+    if not embeddings_3072:
+        return []
+    
+    matrix = np.asarray(embeddings_3072, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError("All embeddings in a batch must have the same length")
     
-    # Calculate cosine similarity
-    truncated_arr = np.array(truncated)
-    native_arr = np.array(embedding_native)
+    truncated_dims = [dim for dim in dimensions if dim != 3072]
+    for dim in truncated_dims:
+        if matrix.shape[1] < dim:
+            raise ValueError(
+                f"Embedding length ({matrix.shape[1]}) is less than target dimension ({dim})"
+            )
     
-    cosine_sim = np.dot(truncated_arr, native_arr) / (
-        np.linalg.norm(truncated_arr) * np.linalg.norm(native_arr)
-    )
+    # Prefix norms for every row, only as far as the largest truncation needs
+    prefix = max(truncated_dims, default=0)
+    cumsq = np.cumsum(matrix[:, :prefix] ** 2, axis=1, dtype=np.float64)
     
-    # Should be very close to 1.0
-    # Convert to Python bool to avoid np.bool_ type issues
-    return bool(abs(1.0 - cosine_sim) < tolerance)
+    variants = {}
+    for dim in dimensions:
+        if dim == 3072:
+            # Keep full embeddings as-is
+            variants[dim] = embeddings_3072
+            continue
+        
+        norms = np.sqrt(cumsq[:, dim - 1])
+        if np.any(norms == 0):
+            raise ValueError("Cannot normalize zero vector")
+        
+        variants[dim] = (matrix[:, :dim] / norms[:, np.newaxis]).tolist()
+    
+    return [
+        {dim: variants[dim][i] for dim in dimensions}
+        for i in range(len(embeddings_3072))
+    ]
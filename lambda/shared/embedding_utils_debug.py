@@ -0,0 +1,45 @@
+"""
+Diagnostic utilities for MRL embeddings
+
+Kept out of embedding_utils so the Lambda hot path only imports what it uses.
+Not imported by any Lambda handler.
+"""
+
+import numpy as np
+from typing import List, Union
+
+from embedding_utils import truncate_and_normalize
+
+
+def validate_mrl_property(
+    embedding_3072: Union[List[float], np.ndarray],
+    embedding_native: Union[List[float], np.ndarray],
+    target_dim: int,
+    tolerance: float = 0.01
+) -> bool:
+    """
+    Validate that the MRL nesting property holds.
+    
+    Checks if the first N dimensions of a 3072-dim embedding (after renormalization)
+    match a native N-dim embedding from the model.
+    
+    Args:
+        embedding_3072: Full 3072-dimensional embedding (list or array)
+        embedding_native: Native embedding at target dimension (list or array)
+        target_dim: Dimension to compare
+        tolerance: Acceptable difference threshold
+    
+    Returns:
+        True if embeddings match within tolerance
+    """
+    # Unit-norm float32 array; arrays are sliced in place rather than copied to lists
+    truncated = truncate_and_normalize(embedding_3072, target_dim)
+    
+    # Cosine similarity; only the native side needs its norm
+    native_arr = np.asarray(embedding_native, dtype=np.float32)
+    
+    cosine_sim = np.dot(truncated, native_arr) / np.linalg.norm(native_arr)
+    
+    # Should be very close to 1.0
+    # Convert to Python bool to avoid np.bool_ type issues
+    return bool(abs(1.0 - cosine_sim) < tolerance)
@@ -3,7 +3,8 @@ Chatbot Stack - Query interface with hierarchical search
 
 This stack creates:
 - Query handler Lambda function
-- API Gateway REST API
+- API Gateway HTTP API
+- CloudWatch alarms for API and query handler errors
 - Amplify app hosting (placeholder)
 - IAM roles for Bedrock and S3 Vector access
 """
@@ -13,16 +14,46 @@ from aws_cdk import (
     Duration,
     aws_lambda as lambda_,
     aws_iam as iam,
-    aws_apigateway as apigw,
+    aws_apigatewayv2 as apigwv2,
+    aws_apigatewayv2_integrations as apigwv2_integrations,
     aws_s3 as s3,
     aws_amplify as amplify,
     aws_secretsmanager as secretsmanager,
     aws_logs as logs,
+    aws_cloudwatch as cloudwatch,
     CfnOutput,
 )
 from constructs import Construct
 import json
 
+from lib.config_loader import load_config
+from lib.lambda_assets import code_with_config, deploy_time_environment
+
+# Used when config/{env}.json does not exist
+DEFAULT_CONFIG = {
+    "embedding": {
+        "dimensions": [256, 384, 1024, 3072],
+        "default_dimension": 1024,
+        "model_id": "amazon.nova-2-multimodal-embeddings-v1:0",
+    },
+    "search": {
+        "default_k": 5,
+        "hierarchical_enabled": True,
+        "hierarchical_config": {
+            "first_pass_dimension": 256,
+            "first_pass_k": 20,
+            "second_pass_dimension": 1024,
+            "second_pass_k": 5,
+        },
+    },
+    "llm": {
+        "model_id": "anthropic.claude-3-5-sonnet-20241022-v2:0",
+        "max_tokens": 2048,
+        "temperature": 0.7,
+        "prompt_cache": False,
+    },
+}
+
 
 class ChatbotStack(Stack):
     def __init__(
@@ -51,8 +82,24 @@ class ChatbotStack(Stack):
         # Create Query Handler Lambda
         self.query_handler = self._create_query_handler_lambda(lambda_role, config)
 
-        # Create API Gateway
-        self.api = self._create_api_gateway()
+        # Front the handler with a provisioned-concurrency alias when configured,
+        # so API requests land on already-initialized environments
+        provisioned_concurrency = config.get("lambda", {}).get(
+            "query_handler_provisioned_concurrency", 0
+        )
+        query_target = (
+            self._create_query_handler_alias(provisioned_concurrency)
+            if provisioned_concurrency
+            else self.query_handler
+        )
+
+        # Create API Gateway (CORS origins can be narrowed to the frontend domain via config)
+        allowed_origins = config.get("api", {}).get("cors_allow_origins", ["*"])
+        self.api = self._create_api_gateway(query_target, allowed_origins)
+
+        # Health is tracked from metrics the API already emits, instead of a
+        # polled /health route that would bill an API request per probe
+        self._create_health_alarms()
 
         # Create Amplify app for frontend hosting
         self.amplify_app = self._create_amplify_app()
@@ -76,35 +123,7 @@ class ChatbotStack(Stack):
     def _load_config(self) -> dict:
         """Load configuration from context or use defaults"""
         env = self.node.try_get_context("environment") or "dev"
-        config_path = f"config/{env}.json"
-
-        try:
-            with open(config_path, "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            # Return default config
-            return {
-                "embedding": {
-                    "dimensions": [256, 384, 1024, 3072],
-                    "default_dimension": 1024,
-                    "model_id": "amazon.nova-2-multimodal-embeddings-v1:0",
-                },
-                "search": {
-                    "default_k": 5,
-                    "hierarchical_enabled": True,
-                    "hierarchical_config": {
-                        "first_pass_dimension": 256,
-                        "first_pass_k": 20,
-                        "second_pass_dimension": 1024,
-                        "second_pass_k": 5,
-                    },
-                },
-                "llm": {
-                    "model_id": "anthropic.claude-3-5-sonnet-20241022-v2:0",
-                    "max_tokens": 2048,
-                    "temperature": 0.7,
-                },
-            }
+        return load_config(env, DEFAULT_CONFIG)
 
     def _create_lambda_role(self) -> iam.Role:
         """Create IAM role with permissions for Bedrock, S3 Vector"""
@@ -181,76 +200,112 @@ class ChatbotStack(Stack):
         self, role: iam.Role, config: dict
     ) -> lambda_.Function:
         """Create Query Handler Lambda"""
+        # Static settings are baked into the asset as config.json (see lib/lambda_assets.py)
+        settings = {
+            "VECTOR_BUCKET": self.vector_bucket.bucket_name,
+            "EMBEDDING_MODEL_ID": config["embedding"]["model_id"],
+            "LLM_MODEL_ID": config["llm"]["model_id"],
+            "LLM_REGION": config["llm"].get("region", self.region),
+            "DEFAULT_DIMENSION": str(config["embedding"]["default_dimension"]),
+            "DEFAULT_K": str(config["search"]["default_k"]),
+            "HIERARCHICAL_ENABLED": str(config["search"]["hierarchical_enabled"]),
+            # Compact separators: these are parsed again on every cold start
+            "HIERARCHICAL_CONFIG": json.dumps(
+                config["search"]["hierarchical_config"], separators=(",", ":")
+            ),
+            "VECTOR_INDEXES": json.dumps(self.vector_indexes, separators=(",", ":")),
+            "LLM_MAX_TOKENS": str(config["llm"]["max_tokens"]),
+            "LLM_TEMPERATURE": str(config["llm"]["temperature"]),
+            "LLM_PROMPT_CACHE": str(config["llm"].get("prompt_cache", False)),
+        }
+
         return lambda_.Function(
             self,
             "QueryHandlerFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
+            architecture=lambda_.Architecture.ARM_64,  # Graviton: better price/performance
             handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/chatbot/query_handler"),
+            code=code_with_config(
+                "lambda/chatbot/query_handler",
+                settings,
+                shared_files=["lambda/shared/asset_config.py"],
+            ),
             role=role,
             timeout=Duration.seconds(60),
             memory_size=1024,
             log_retention=logs.RetentionDays.THREE_DAYS,  # Auto-delete logs after 3 days
-            environment={
-                "VECTOR_BUCKET": self.vector_bucket.bucket_name,
-                "EMBEDDING_MODEL_ID": config["embedding"]["model_id"],
-                "LLM_MODEL_ID": config["llm"]["model_id"],
-                "LLM_REGION": config["llm"].get("region", self.region),
-                "DEFAULT_DIMENSION": str(config["embedding"]["default_dimension"]),
-                "DEFAULT_K": str(config["search"]["default_k"]),
-                "HIERARCHICAL_ENABLED": str(config["search"]["hierarchical_enabled"]),
-                "HIERARCHICAL_CONFIG": json.dumps(
-                    config["search"]["hierarchical_config"]
-                ),
-                "VECTOR_INDEXES": json.dumps(self.vector_indexes),
-                "LLM_MAX_TOKENS": str(config["llm"]["max_tokens"]),
-                "LLM_TEMPERATURE": str(config["llm"]["temperature"]),
-            },
+            environment=deploy_time_environment(settings),
         )
 
-    def _create_api_gateway(self) -> apigw.RestApi:
-        """Create API Gateway REST API"""
-        api = apigw.RestApi(
+    def _create_query_handler_alias(
+        self, provisioned_concurrency: int
+    ) -> lambda_.Alias:
+        """Create a 'live' alias with provisioned concurrency for the query handler"""
+        return lambda_.Alias(
+            self,
+            "QueryHandlerAlias",
+            alias_name="live",
+            version=self.query_handler.current_version,
+            provisioned_concurrent_executions=provisioned_concurrency,
+        )
+
+    def _create_api_gateway(
+        self, query_target: lambda_.IFunction, allowed_origins: list
+    ) -> apigwv2.HttpApi:
+        """Create API Gateway HTTP API"""
+        api = apigwv2.HttpApi(
             self,
             "ChatbotApi",
-            rest_api_name="Nova MME Chatbot API",
+            api_name="Nova MME Chatbot API",
             description="API for Nova MME multimodal chatbot with MRL",
-            default_cors_preflight_options=apigw.CorsOptions(
-                allow_origins=apigw.Cors.ALL_ORIGINS,
-                allow_methods=apigw.Cors.ALL_METHODS,
-                allow_headers=["Content-Type", "Authorization"],
+            cors_preflight=apigwv2.CorsPreflightOptions(
+                allow_origins=allowed_origins,
+                allow_methods=[
+                    apigwv2.CorsHttpMethod.POST,
+                    apigwv2.CorsHttpMethod.OPTIONS,
+                ],
+                allow_headers=["Content-Type", "Authorization", "Cache-Control"],
+                # Let browsers cache the preflight so each POST /query skips an OPTIONS round trip
+                max_age=Duration.hours(24),
             ),
         )
 
-        # Create /query endpoint
-        query_resource = api.root.add_resource("query")
-        query_integration = apigw.LambdaIntegration(
-            self.query_handler,
-            proxy=True,
+        query_integration = apigwv2_integrations.HttpLambdaIntegration(
+            "QueryIntegration",
+            query_target,
         )
-        query_resource.add_method("POST", query_integration)
 
-        # Create /health endpoint
-        health_resource = api.root.add_resource("health")
-        health_integration = apigw.MockIntegration(
-            integration_responses=[
-                apigw.IntegrationResponse(
-                    status_code="200",
-                    response_templates={
-                        "application/json": '{"status": "healthy"}'
-                    },
-                )
-            ],
-            request_templates={"application/json": '{"statusCode": 200}'},
-        )
-        health_resource.add_method(
-            "GET",
-            health_integration,
-            method_responses=[apigw.MethodResponse(status_code="200")],
+        # Create /query endpoint
+        api.add_routes(
+            path="/query",
+            methods=[apigwv2.HttpMethod.POST],
+            integration=query_integration,
         )
 
         return api
 
+    def _create_health_alarms(self) -> None:
+        """Alarm on API 5xx responses and query handler errors"""
+        cloudwatch.Alarm(
+            self,
+            "ApiServerErrorAlarm",
+            alarm_description="Chatbot API is returning 5xx responses",
+            metric=self.api.metric_server_error(period=Duration.minutes(5)),
+            threshold=5,
+            evaluation_periods=1,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+
+        cloudwatch.Alarm(
+            self,
+            "QueryHandlerErrorAlarm",
+            alarm_description="Query handler Lambda invocations are failing",
+            metric=self.query_handler.metric_errors(period=Duration.minutes(5)),
+            threshold=5,
+            evaluation_periods=1,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+
     def _create_amplify_app(self) -> amplify.CfnApp:
         """Create Amplify app for frontend hosting"""
         
@@ -0,0 +1,29 @@
+"""
+Cached loading of config/{env}.json shared by the CDK stacks
+"""
+
+import copy
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def _read_config(config_path: str) -> Optional[dict]:
+    """Read and parse a config file once per synth; None if the file is missing"""
+    try:
+        return json.loads(Path(config_path).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def load_config(env: str, default_config: dict) -> dict:
+    """
+    Load config/{env}.json, falling back to default_config if it does not exist
+
+    The parsed file is cached across stacks; each caller gets its own deep copy
+    so one stack cannot mutate the config seen by another.
+    """
+    config = _read_config(f"config/{env}.json")
+    return copy.deepcopy(config if config is not None else default_config)
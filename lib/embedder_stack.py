@@ -4,29 +4,49 @@ Embedder Stack - Async processing pipeline for Nova MME with MRL
 This stack creates:
 - S3 bucket for source files
 - S3 Vector bucket with multi-dimensional indexes
-- Three Lambda functions (processor, check_status, store_embeddings)
+- Lambda functions (processor, job_callback, store_embeddings)
 - Step Functions state machine for orchestration
-- S3 event trigger
+- Event triggers (source uploads via EventBridge, async job results via S3)
 """
 
 from aws_cdk import (
+    ArnFormat,
     Stack,
     Duration,
     RemovalPolicy,
     aws_s3 as s3,
+    aws_s3vectors as s3vectors,
     aws_lambda as lambda_,
     aws_iam as iam,
     aws_stepfunctions as sfn,
     aws_stepfunctions_tasks as tasks,
     aws_s3_notifications as s3n,
+    aws_events as events,
+    aws_events_targets as events_targets,
     aws_logs as logs,
+    aws_sqs as sqs,
 )
 from constructs import Construct
 import json
 
+from lib.config_loader import load_config
+from lib.lambda_assets import code_with_config, deploy_time_environment
+
 # NOTE: S3 Vectors construct (cdk-s3-vectors) has critical bugs and is not production-ready.
 # We use regular S3 buckets and create vector indexes manually via AWS CLI after deployment.
 
+# Used when config/{env}.json does not exist
+DEFAULT_CONFIG = {
+    "embedding": {
+        "dimensions": [256, 384, 1024, 3072],
+        "model_id": "amazon.nova-2-multimodal-embeddings-v1:0",
+    },
+    "buckets": {
+        "source_bucket": "cic-multimedia-test",
+        "vector_bucket": "nova-mme-demo-embeddings",
+    },
+}
+
 
 class EmbedderStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
@@ -43,6 +63,7 @@ class EmbedderStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
             versioned=False,
+            event_bridge_enabled=True,  # Uploads start the state machine via EventBridge
             lifecycle_rules=[
                 # Note: pdf-pages/ are kept permanently for chatbot access
                 # Only truly temporary processing files should go in temp locations
@@ -69,13 +90,19 @@ class EmbedderStack(Stack):
             dim: f"embeddings-{dim}d" for dim in config["embedding"]["dimensions"]
         }
 
+        # Fresh deployments can have the stack create the indexes instead of the CLI.
+        # Off by default: indexes that already exist would make the deploy fail.
+        if config["buckets"].get("create_vector_indexes", False):
+            self._create_vector_indexes(vector_bucket_name)
+
         # Create S3 bucket for async job outputs
         # Note: pdf-pages/ and docx-text/ are kept permanently for chatbot access
         # Only the Nova MME async output folders (with invocation IDs) are auto-deleted
+        self.output_bucket_name = f"{config['buckets']['source_bucket']}-outputs"
         self.output_bucket = s3.Bucket(
             self,
             "OutputBucket",
-            bucket_name=f"{config['buckets']['source_bucket']}-outputs",
+            bucket_name=self.output_bucket_name,
             removal_policy=RemovalPolicy.DESTROY,
             auto_delete_objects=True,
             versioned=False,
@@ -84,43 +111,86 @@ class EmbedderStack(Stack):
         # Create IAM role for Lambda functions with Bedrock access
         lambda_role = self._create_lambda_role(config)
 
+        # One code asset shared by all three embedder handlers, so CDK hashes and
+        # uploads lambda/embedder once. Static settings are baked into it as
+        # config.json, and the config loader and MRL utilities from lambda/shared
+        # are copied to its root (see lib/lambda_assets.py).
+        processor_settings = self._processor_settings(config)
+        store_embeddings_settings = self._store_embeddings_settings(config)
+        embedder_code = code_with_config(
+            "lambda/embedder",
+            {**processor_settings, **store_embeddings_settings},
+            shared_files=[
+                "lambda/shared/asset_config.py",
+                "lambda/shared/embedding_utils.py",
+            ],
+        )
+
+        # One dependency layer (PyMuPDF, python-docx, NumPy) for the functions that need it
+        dependencies_layer = self._create_dependencies_layer()
+
         # Lambda 1: Nova MME Processor
-        self.processor_lambda = self._create_processor_lambda(lambda_role, config)
+        self.processor_lambda = self._create_processor_lambda(
+            lambda_role, embedder_code, processor_settings, dependencies_layer
+        )
 
-        # Lambda 2: Check Job Status
-        self.check_status_lambda = self._create_check_status_lambda(lambda_role, config)
+        # Resumes the state machine when an async job writes its result
+        self.job_callback_lambda = self._create_job_callback_lambda(
+            lambda_role, embedder_code
+        )
 
         # Lambda 3: Store Embeddings
         self.store_embeddings_lambda = self._create_store_embeddings_lambda(
-            lambda_role, config
+            lambda_role, embedder_code, store_embeddings_settings, dependencies_layer
+        )
+
+        # Step Functions invokes store_embeddings through a provisioned-concurrency
+        # alias when configured, so NumPy is already imported when results arrive
+        provisioned_concurrency = config.get("lambda", {}).get(
+            "store_embeddings_provisioned_concurrency", 0
+        )
+        self.store_embeddings_target = (
+            self._create_store_embeddings_alias(provisioned_concurrency)
+            if provisioned_concurrency
+            else self.store_embeddings_lambda
         )
 
         # Create Step Functions state machine
         self.state_machine = self._create_state_machine(config)
 
-        # Add S3 event notification to trigger Step Functions
+        # Start Step Functions for each upload
         self._setup_s3_trigger()
 
+        # Resume waiting executions when Nova MME writes a result file
+        self.output_bucket.add_event_notification(
+            s3.EventType.OBJECT_CREATED,
+            s3n.LambdaDestination(self.job_callback_lambda),
+            s3.NotificationKeyFilter(suffix="segmented-embedding-result.json"),
+        )
+
+    def _create_vector_indexes(self, vector_bucket_name: str) -> None:
+        """
+        Create one S3 Vectors index per MRL dimension in the existing vector bucket
+
+        Indexes are retained on stack deletion so stored embeddings survive a
+        redeploy. The vector bucket itself must still exist beforehand.
+        """
+        for dim, index_name in self.vector_indexes.items():
+            index = s3vectors.CfnIndex(
+                self,
+                f"VectorIndex{dim}",
+                vector_bucket_name=vector_bucket_name,
+                index_name=index_name,
+                data_type="float32",
+                dimension=dim,
+                distance_metric="cosine",
+            )
+            index.apply_removal_policy(RemovalPolicy.RETAIN)
+
     def _load_config(self) -> dict:
         """Load configuration from context or use defaults"""
         env = self.node.try_get_context("environment") or "dev"
-        config_path = f"config/{env}.json"
-
-        try:
-            with open(config_path, "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            # Return default config
-            return {
-                "embedding": {
-                    "dimensions": [256, 384, 1024, 3072],
-                    "model_id": "amazon.nova-2-multimodal-embeddings-v1:0",
-                },
-                "buckets": {
-                    "source_bucket": "cic-multimedia-test",
-                    "vector_bucket": "nova-mme-demo-embeddings",
-                },
-            }
+        return load_config(env, DEFAULT_CONFIG)
 
     def _create_lambda_role(self, config: dict) -> iam.Role:
         """Create IAM role with permissions for Bedrock, S3, and S3 Vector"""
@@ -136,14 +206,13 @@ class EmbedderStack(Stack):
         )
 
         # Bedrock permissions for synchronous and asynchronous invocations
+        # (status polling runs in Step Functions, not in the Lambdas)
         role.add_to_policy(
             iam.PolicyStatement(
                 actions=[
                     "bedrock:InvokeModel",
                     "bedrock:InvokeModelWithResponseStream",
                     "bedrock:StartAsyncInvoke",
-                    "bedrock:GetAsyncInvoke",
-                    "bedrock:ListAsyncInvokes",
                 ],
                 resources=[
                     f"arn:aws:bedrock:{self.region}::foundation-model/*",
@@ -152,18 +221,6 @@ class EmbedderStack(Stack):
             )
         )
 
-        # Bedrock async invocation permissions
-        role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "bedrock:StartAsyncInvoke",
-                    "bedrock:GetAsyncInvoke",
-                    "bedrock:ListAsyncInvokes",
-                ],
-                resources=["*"],
-            )
-        )
-
         # S3 Vectors permissions for storing embeddings
         # Note: S3 Vectors uses a different ARN format than regular S3
         vector_bucket_name = config['buckets']['vector_bucket']
@@ -205,57 +262,104 @@ class EmbedderStack(Stack):
 
         return role
 
-    def _create_processor_lambda(
-        self, role: iam.Role, config: dict
-    ) -> lambda_.Function:
-        """Create Lambda 1: Nova MME Processor"""
-        
-        # Create Lambda Layers for PDF and DOCX processing
-        pymupdf_layer = lambda_.LayerVersion(
-            self,
-            "PyMuPDFLayer",
-            code=lambda_.Code.from_asset("lambda/layers/pdf-processing"),
-            compatible_runtimes=[lambda_.Runtime.PYTHON_3_11],
-            description="PyMuPDF for PDF to image conversion",
-        )
-        
-        docx_layer = lambda_.LayerVersion(
+    def _processor_settings(self, config: dict) -> dict:
+        """Settings read by the processor handler"""
+        return {
+            "EMBEDDING_DIMENSION": "3072",  # Always use max for MRL
+            "MODEL_ID": config["embedding"]["model_id"],
+            # Use the configured name rather than the bucket's Ref token so the
+            # value can be baked into config.json instead of the environment map
+            "OUTPUT_BUCKET": self.output_bucket_name,
+        }
+
+    def _store_embeddings_settings(self, config: dict) -> dict:
+        """Settings read by the store_embeddings handler"""
+        return {
+            "VECTOR_BUCKET": self.vector_bucket.bucket_name,
+            "EMBEDDING_DIMENSIONS": ",".join(
+                str(d) for d in config["embedding"]["dimensions"]
+            ),
+            "DELETE_LEGACY_VECTOR_KEYS": str(
+                config["embedding"].get("delete_legacy_vector_keys", False)
+            ),
+        }
+
+    def _create_dependencies_layer(self) -> lambda_.LayerVersion:
+        """
+        Create the combined dependency layer
+
+        Built locally by scripts/install-lambda-layers.sh into lambda/layers/combined.
+        A single layer means one layer fetch and extract per cold start.
+        """
+        return lambda_.LayerVersion(
             self,
-            "DocxLayer",
-            code=lambda_.Code.from_asset("lambda/layers/docx-processing"),
+            "DependenciesLayer",
+            code=lambda_.Code.from_asset("lambda/layers/combined"),
             compatible_runtimes=[lambda_.Runtime.PYTHON_3_11],
-            description="python-docx for DOCX text extraction",
+            compatible_architectures=[lambda_.Architecture.ARM_64],
+            description="PyMuPDF, python-docx and NumPy for the embedder Lambdas",
         )
-        
+
+    def _create_processor_lambda(
+        self,
+        role: iam.Role,
+        code: lambda_.Code,
+        settings: dict,
+        dependencies_layer: lambda_.LayerVersion,
+    ) -> lambda_.Function:
+        """Create Lambda 1: Nova MME Processor"""
         return lambda_.Function(
             self,
             "ProcessorFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
-            handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/embedder/processor"),
-            layers=[pymupdf_layer, docx_layer],
+            architecture=lambda_.Architecture.ARM_64,  # Graviton: better price/performance
+            handler="processor.index.handler",
+            code=code,
+            layers=[dependencies_layer],
             role=role,
             timeout=Duration.minutes(5),
-            memory_size=1024,  # Increased for PDF processing
+            memory_size=1769,  # One full vCPU for single-threaded PyMuPDF rendering
             log_retention=logs.RetentionDays.THREE_DAYS,  # Auto-delete logs after 3 days
-            environment={
-                "EMBEDDING_DIMENSION": "3072",  # Always use max for MRL
-                "MODEL_ID": config["embedding"]["model_id"],
-                "OUTPUT_BUCKET": self.output_bucket.bucket_name,
-                "SOURCE_BUCKET": self.source_bucket.bucket_name,
-            },
+            environment=deploy_time_environment(settings),
         )
 
-    def _create_check_status_lambda(
-        self, role: iam.Role, config: dict
+    def _create_job_callback_lambda(
+        self, role: iam.Role, code: lambda_.Code
     ) -> lambda_.Function:
-        """Create Lambda 2: Check Job Status"""
+        """Create the Lambda that resumes executions when async jobs complete"""
+        # Checked once at registration so jobs that failed early fail the task at once
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["bedrock:GetAsyncInvoke"],
+                resources=[
+                    f"arn:aws:bedrock:{self.region}:{self.account}:async-invoke/*"
+                ],
+            )
+        )
+
+        # Wildcard state machine ARN: naming the state machine here would create a
+        # dependency cycle (state machine -> function -> role policy -> state machine)
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["states:SendTaskSuccess", "states:SendTaskFailure"],
+                resources=[
+                    self.format_arn(
+                        service="states",
+                        resource="stateMachine",
+                        resource_name="*",
+                        arn_format=ArnFormat.COLON_RESOURCE_NAME,
+                    )
+                ],
+            )
+        )
+
         return lambda_.Function(
             self,
-            "CheckStatusFunction",
+            "JobCallbackFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
-            handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/embedder/check_status"),
+            architecture=lambda_.Architecture.ARM_64,  # Graviton: better price/performance
+            handler="job_callback.index.handler",
+            code=code,
             role=role,
             timeout=Duration.seconds(30),
             memory_size=256,
@@ -263,36 +367,38 @@ class EmbedderStack(Stack):
         )
 
     def _create_store_embeddings_lambda(
-        self, role: iam.Role, config: dict
+        self,
+        role: iam.Role,
+        code: lambda_.Code,
+        settings: dict,
+        dependencies_layer: lambda_.LayerVersion,
     ) -> lambda_.Function:
         """Create Lambda 3: Store Embeddings with MRL truncation"""
-        
-        # Create Lambda Layer for NumPy
-        numpy_layer = lambda_.LayerVersion(
-            self,
-            "NumpyLayer",
-            code=lambda_.Code.from_asset("lambda/layers/numpy"),
-            compatible_runtimes=[lambda_.Runtime.PYTHON_3_11],
-            description="NumPy for MRL truncation and normalization",
-        )
-        
         return lambda_.Function(
             self,
             "StoreEmbeddingsFunction",
             runtime=lambda_.Runtime.PYTHON_3_11,
-            handler="index.handler",
-            code=lambda_.Code.from_asset("lambda/embedder/store_embeddings"),
-            layers=[numpy_layer],
+            architecture=lambda_.Architecture.ARM_64,  # Graviton: better price/performance
+            handler="store_embeddings.index.handler",
+            code=code,
+            layers=[dependencies_layer],
             role=role,
             timeout=Duration.minutes(15),
-            memory_size=2048,  # Need memory for numpy operations
+            memory_size=3008,  # CPU scales with memory; NumPy truncation finishes sooner
             log_retention=logs.RetentionDays.THREE_DAYS,  # Auto-delete logs after 3 days
-            environment={
-                "VECTOR_BUCKET": self.vector_bucket.bucket_name,
-                "EMBEDDING_DIMENSIONS": ",".join(
-                    str(d) for d in config["embedding"]["dimensions"]
-                ),
-            },
+            environment=deploy_time_environment(settings),
+        )
+
+    def _create_store_embeddings_alias(
+        self, provisioned_concurrency: int
+    ) -> lambda_.Alias:
+        """Create a 'live' alias with provisioned concurrency for store embeddings"""
+        return lambda_.Alias(
+            self,
+            "StoreEmbeddingsAlias",
+            alias_name="live",
+            version=self.store_embeddings_lambda.current_version,
+            provisioned_concurrent_executions=provisioned_concurrency,
         )
 
     def _create_state_machine(self, config: dict) -> sfn.StateMachine:
@@ -303,24 +409,26 @@ class EmbedderStack(Stack):
             self,
             "ProcessFile",
             lambda_function=self.processor_lambda,
-            output_path="$.Payload",
+            # Return the function's payload directly instead of the invoke
+            # response envelope, so no output_path is needed to unwrap it
+            payload_response_only=True,
         )
 
         # Check if this is a PDF with multiple pages
         is_pdf_check = sfn.Choice(self, "IsPDF?")
 
-        # For PDFs: Process all pages in parallel using Map state
-        # Map state iterates over pdfPages array
+        # For PDFs: Process all pages in parallel using a Distributed Map
+        # that iterates over the page manifest in S3
         
-        # Task: Check job status (for use in Map)
-        check_status_task_map = tasks.LambdaInvoke(
-            self,
-            "CheckJobStatusMap",
-            lambda_function=self.check_status_lambda,
-            output_path="$.Payload",
+        # Task: Wait for the async job's completion callback (for use in Map)
+        wait_callback_task_map = self._create_wait_for_callback_task(
+            "WaitForJobCallbackMap"
         )
 
-        # Wait state for Map (30 seconds between status checks)
+        # Task: Check job status (fallback polling for use in Map)
+        check_status_task_map = self._create_check_status_task("CheckJobStatusMap")
+
+        # Wait state for Map (30 seconds between fallback status checks)
         wait_state_map = sfn.Wait(
             self,
             "WaitForJobMap",
@@ -331,8 +439,8 @@ class EmbedderStack(Stack):
         store_task_map = tasks.LambdaInvoke(
             self,
             "StoreEmbeddingsMap",
-            lambda_function=self.store_embeddings_lambda,
-            output_path="$.Payload",
+            lambda_function=self.store_embeddings_target,
+            payload_response_only=True,
         )
 
         # Success state for individual page
@@ -352,48 +460,74 @@ class EmbedderStack(Stack):
             sfn.Condition.string_equals("$.status", "SUCCESS"),
             page_success
         ).otherwise(page_failure)
+        store_task_map.next(page_storage_check)
+
+        # Fallback polling loop, entered only if the callback never arrives
+        # (e.g. the job failed and wrote no result file)
+        wait_state_map.next(check_status_task_map).next(
+            sfn.Choice(self, "PageJobComplete?")
+            .when(
+                sfn.Condition.string_equals("$.jobStatus.status", "Completed"),
+                store_task_map,
+            )
+            .when(
+                sfn.Condition.or_(
+                    sfn.Condition.string_equals("$.jobStatus.status", "Failed"),
+                    sfn.Condition.string_equals("$.jobStatus.status", "Expired"),
+                ),
+                page_failure,
+            )
+            .otherwise(wait_state_map)
+        )
 
         # Define page processing workflow (used in Map)
-        page_workflow = (
-            wait_state_map
-            .next(check_status_task_map)
-            .next(
-                sfn.Choice(self, "PageJobComplete?")
-                .when(
-                    sfn.Condition.string_equals("$.status", "COMPLETED"),
-                    store_task_map.next(page_storage_check),
-                )
-                .when(
-                    sfn.Condition.string_equals("$.status", "FAILED"),
-                    page_failure,
-                )
-                .otherwise(wait_state_map)
-            )
+        wait_callback_task_map.add_catch(
+            check_status_task_map,
+            errors=[sfn.Errors.TIMEOUT],
+            result_path=sfn.JsonPath.DISCARD,
         )
+        wait_callback_task_map.add_catch(
+            page_failure,
+            errors=["AsyncInvokeFailed"],  # Reported by the job callback Lambda
+        )
+        page_workflow = wait_callback_task_map.next(store_task_map)
 
-        # Map state to process all PDF pages in parallel
-        pdf_map_state = sfn.Map(
+        # Distributed Map to process all PDF pages in parallel. Pages are read from
+        # the manifest the processor writes to S3, so page count is not bounded by
+        # the state payload size, and each page runs as its own child execution.
+        pdf_map_state = sfn.DistributedMap(
             self,
             "ProcessAllPages",
-            items_path="$.pdfPages",
-            max_concurrency=10,  # Process up to 10 pages concurrently
+            item_reader=sfn.S3JsonItemReader(
+                bucket=self.output_bucket,
+                key=sfn.JsonPath.string_at("$.pdfPagesManifestKey"),
+            ),
+            # Standard children, not Express: Express workflows support neither
+            # .waitForTaskToken nor runs over 5 minutes, and a page waits on its
+            # async job for longer. With the callback there is no per-page
+            # polling loop, so a page costs ~5 state transitions either way.
+            map_execution_type=sfn.StateMachineType.STANDARD,
+            max_concurrency=200,  # Process up to 200 pages concurrently
+            # Write per-page results to S3 instead of returning them in the payload
+            result_writer_v2=sfn.ResultWriterV2(
+                bucket=self.output_bucket,
+                prefix="pdf-map-results",
+            ),
         )
-        pdf_map_state.iterator(page_workflow)
+        pdf_map_state.item_processor(page_workflow)
 
         # Success state for PDF (all pages complete)
         pdf_success = sfn.Succeed(self, "AllPagesComplete")
 
         # For non-PDFs: Use original single-job workflow
-        
-        # Task: Check job status (for single files)
-        check_status_task = tasks.LambdaInvoke(
-            self,
-            "CheckJobStatus",
-            lambda_function=self.check_status_lambda,
-            output_path="$.Payload",
-        )
 
-        # Wait state (30 seconds between status checks)
+        # Task: Wait for the async job's completion callback (for single files)
+        wait_callback_task = self._create_wait_for_callback_task("WaitForJobCallback")
+
+        # Task: Check job status (fallback polling for single files)
+        check_status_task = self._create_check_status_task("CheckJobStatus")
+
+        # Wait state (30 seconds between fallback status checks)
         wait_state = sfn.Wait(
             self,
             "WaitForJob",
@@ -404,8 +538,8 @@ class EmbedderStack(Stack):
         store_task = tasks.LambdaInvoke(
             self,
             "StoreEmbeddings",
-            lambda_function=self.store_embeddings_lambda,
-            output_path="$.Payload",
+            lambda_function=self.store_embeddings_target,
+            payload_response_only=True,
         )
 
         # Success state
@@ -425,28 +559,40 @@ class EmbedderStack(Stack):
             sfn.Condition.string_equals("$.status", "SUCCESS"),
             success_state
         ).otherwise(failure_state)
+        store_task.next(storage_check)
+
+        # Fallback polling loop, entered only if the callback never arrives
+        wait_state.next(check_status_task).next(
+            sfn.Choice(self, "JobComplete?")
+            .when(
+                sfn.Condition.string_equals("$.jobStatus.status", "Completed"),
+                store_task,
+            )
+            .when(
+                sfn.Condition.or_(
+                    sfn.Condition.string_equals("$.jobStatus.status", "Failed"),
+                    sfn.Condition.string_equals("$.jobStatus.status", "Expired"),
+                ),
+                failure_state,
+            )
+            .otherwise(wait_state)
+        )
 
         # Single file workflow
-        single_file_workflow = (
-            wait_state
-            .next(check_status_task)
-            .next(
-                sfn.Choice(self, "JobComplete?")
-                .when(
-                    sfn.Condition.string_equals("$.status", "COMPLETED"),
-                    store_task.next(storage_check),
-                )
-                .when(
-                    sfn.Condition.string_equals("$.status", "FAILED"),
-                    failure_state,
-                )
-                .otherwise(wait_state)
-            )
+        wait_callback_task.add_catch(
+            check_status_task,
+            errors=[sfn.Errors.TIMEOUT],
+            result_path=sfn.JsonPath.DISCARD,
         )
+        wait_callback_task.add_catch(
+            failure_state,
+            errors=["AsyncInvokeFailed"],  # Reported by the job callback Lambda
+        )
+        single_file_workflow = wait_callback_task.next(store_task)
 
         # Main workflow: Check if PDF, then branch
         is_pdf_check.when(
-            sfn.Condition.is_present("$.pdfPages"),
+            sfn.Condition.is_present("$.pdfPagesManifestKey"),
             pdf_map_state.next(pdf_success)
         ).otherwise(single_file_workflow)
 
@@ -460,60 +606,91 @@ class EmbedderStack(Stack):
             timeout=Duration.hours(2),
         )
 
-    def _setup_s3_trigger(self):
-        """Setup S3 event notification to trigger state machine"""
-        # Create Lambda to trigger Step Functions
-        trigger_lambda = lambda_.Function(
+    def _create_check_status_task(self, construct_id: str) -> tasks.CallAwsService:
+        """
+        Read the async job status with a direct Bedrock SDK integration
+
+        The Bedrock status lands in $.jobStatus (InProgress, Completed, Failed);
+        the rest of the job passes through unchanged for StoreEmbeddings.
+        """
+        return tasks.CallAwsService(
             self,
-            "TriggerFunction",
-            runtime=lambda_.Runtime.PYTHON_3_11,
-            handler="index.handler",
-            code=lambda_.Code.from_inline(
-                f"""
-import json
-import boto3
-from urllib.parse import unquote_plus
+            construct_id,
+            service="bedrockruntime",
+            action="getAsyncInvoke",
+            iam_action="bedrock:GetAsyncInvoke",
+            iam_resources=[
+                f"arn:aws:bedrock:{self.region}:{self.account}:async-invoke/*"
+            ],
+            parameters={
+                "InvocationArn": sfn.JsonPath.string_at("$.invocationArn"),
+            },
+            result_selector={
+                "status": sfn.JsonPath.string_at("$.Status"),
+            },
+            result_path="$.jobStatus",
+        )
 
-sfn = boto3.client('stepfunctions')
+    def _create_wait_for_callback_task(self, construct_id: str) -> tasks.LambdaInvoke:
+        """
+        Register a task token with the job callback Lambda and pause until it resumes us
 
-def handler(event, context):
-    for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        key = record['s3']['object']['key']
-        
-        # URL-decode the key (S3 events URL-encode special characters)
-        key = unquote_plus(key)
-        
-        # Skip derived files to avoid infinite loop
-        if key.startswith('pdf-pages/'):
-            print(f"Skipping PDF page image: {{key}}")
-            continue
-        if key.startswith('docx-text/'):
-            print(f"Skipping extracted DOCX text: {{key}}")
-            continue
-        
-        # Start state machine execution
-        sfn.start_execution(
-            stateMachineArn='{self.state_machine.state_machine_arn}',
-            input=json.dumps({{
-                'bucket': bucket,
-                'key': key
-            }})
-        )
-    
-    return {{'statusCode': 200}}
-"""
-            ),
-            timeout=Duration.seconds(30),
-            log_retention=logs.RetentionDays.THREE_DAYS,  # Auto-delete logs after 3 days
+        The execution resumes with the job unchanged (status COMPLETED) as soon as
+        Nova MME writes its result file. After 10 minutes without a callback the
+        task times out and the caller falls back to CheckJobStatus polling.
+        """
+        return tasks.LambdaInvoke(
+            self,
+            construct_id,
+            lambda_function=self.job_callback_lambda,
+            integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+            payload=sfn.TaskInput.from_object({
+                "taskToken": sfn.JsonPath.task_token,
+                "job": sfn.JsonPath.entire_payload,
+            }),
+            task_timeout=sfn.Timeout.duration(Duration.minutes(10)),
         )
 
-        # Grant permissions
-        self.state_machine.grant_start_execution(trigger_lambda)
-        self.source_bucket.grant_read(trigger_lambda)
+    def _setup_s3_trigger(self):
+        """
+        Start the state machine for each upload via S3 -> EventBridge -> Step Functions
+
+        No Lambda sits in between: EventBridge filters out derived files and
+        starts the execution directly with {"bucket": ..., "key": ...}.
+        Uploads whose execution cannot be started after EventBridge's retries
+        land in a dead-letter queue instead of being dropped.
+        """
+        trigger_dlq = sqs.Queue(
+            self,
+            "TriggerDeadLetterQueue",
+            retention_period=Duration.days(14),
+            enforce_ssl=True,
+        )
 
-        # Add S3 notification
-        self.source_bucket.add_event_notification(
-            s3.EventType.OBJECT_CREATED,
-            s3n.LambdaDestination(trigger_lambda),
+        events.Rule(
+            self,
+            "TriggerRule",
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created"],
+                detail={
+                    "bucket": {"name": [self.source_bucket.bucket_name]},
+                    # Skip derived files to avoid infinite loops
+                    "object": {
+                        "key": events.Match.anything_but_prefix("pdf-pages/", "docx-text/")
+                    },
+                },
+            ),
+            targets=[
+                events_targets.SfnStateMachine(
+                    self.state_machine,
+                    input=events.RuleTargetInput.from_object({
+                        "bucket": events.EventField.from_path("$.detail.bucket.name"),
+                        "key": events.EventField.from_path("$.detail.object.key"),
+                    }),
+                    dead_letter_queue=trigger_dlq,
+                    retry_attempts=10,
+                    max_event_age=Duration.hours(2),
+                )
+            ],
         )
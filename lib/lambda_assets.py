@@ -0,0 +1,150 @@
+"""
+Lambda code assets with deployment config bundled in as config.json
+
+Static configuration is written into the asset instead of the function's
+environment map, which keeps Lambda-managed environment variables to the few
+values only known at deploy time (CloudFormation tokens such as generated
+bucket names); those cannot be written at synth time and are returned by
+deploy_time_environment() for `environment=`. The handlers load config.json into os.environ at import,
+without overriding variables that are already set.
+
+Third-party packages come from the dependencies layer, so bundling does not
+pip install; it drops the per-function requirements.txt files and ships
+precompiled bytecode so cold starts skip compiling the handler modules.
+Local bundling is only used when the local interpreter matches the Lambda
+runtime; otherwise the Docker image builds the asset.
+Modules shared between assets (lambda/shared) are copied to the asset root,
+which Lambda puts on sys.path.
+"""
+
+import compileall
+import json
+import py_compile
+import shlex
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import jsii
+from aws_cdk import (
+    AssetHashType,
+    BundlingOptions,
+    DockerVolume,
+    ILocalBundling,
+    Token,
+    aws_lambda as lambda_,
+)
+
+CONFIG_FILE_NAME = "config.json"
+
+# Bytecode is only valid for the interpreter version that wrote it
+RUNTIME_PYTHON_VERSION = (3, 11)
+
+# Where Lambda extracts the asset; recorded as the source path in the bytecode
+LAMBDA_TASK_ROOT = "/var/task"
+
+# Not needed at runtime: dependencies ship in the layer, tests stay in the repo
+EXCLUDED_PATTERNS = ("__pycache__", "*.pyc", "requirements.txt", "tests")
+
+# Where the Docker fallback mounts the shared modules
+DOCKER_SHARED_DIR = "/asset-shared"
+
+
+@jsii.implements(ILocalBundling)
+class _CopyWithConfig:
+    """Copy the source directory and shared modules, and write config.json next to the handler"""
+
+    def __init__(self, source_dir: str, config_json: str, shared_files: Sequence[str]) -> None:
+        self._source_dir = source_dir
+        self._config_json = config_json
+        self._shared_files = shared_files
+
+    def try_bundle(self, output_dir: str, *, image=None, **kwargs) -> bool:
+        # Bytecode from another interpreter would be ignored at runtime, and leaving
+        # it out would make the asset hash depend on the machine that synthesized.
+        # Declining here hands the build to the Docker command, which always compiles.
+        if sys.version_info[:2] != RUNTIME_PYTHON_VERSION:
+            print(
+                f"⚠️  Local Python {sys.version_info[0]}.{sys.version_info[1]} does not match "
+                f"the Lambda runtime {RUNTIME_PYTHON_VERSION[0]}.{RUNTIME_PYTHON_VERSION[1]}; "
+                f"bundling {self._source_dir} in Docker"
+            )
+            return False
+
+        shutil.copytree(
+            self._source_dir,
+            output_dir,
+            dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns(*EXCLUDED_PATTERNS),
+        )
+        for shared_file in self._shared_files:
+            shutil.copy2(shared_file, output_dir)
+        Path(output_dir, CONFIG_FILE_NAME).write_text(self._config_json)
+
+        # Sources stay alongside the bytecode for readable tracebacks. Hash-based
+        # pycs and a fixed ddir keep the output (and so the asset hash) independent
+        # of file mtimes and of the bundling directory.
+        compileall.compile_dir(
+            output_dir,
+            ddir=LAMBDA_TASK_ROOT,
+            quiet=1,
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        )
+        return True
+
+
+def code_with_config(
+    source_dir: str, config: Dict[str, str], shared_files: Sequence[str] = ()
+) -> lambda_.Code:
+    """
+    Build a Lambda asset from source_dir with the resolved config values baked in
+
+    config.json is written at the asset root, which Lambda exposes as
+    LAMBDA_TASK_ROOT. Unresolved token values are skipped; pass them to the
+    function with deploy_time_environment(). shared_files (paths to modules
+    outside source_dir, all in one directory) are copied to the asset root so
+    handlers can import them by name.
+    """
+    baked = {k: v for k, v in config.items() if not Token.is_unresolved(v)}
+    config_json = json.dumps(baked, indent=2, sort_keys=True)
+
+    shared_dirs = {str(Path(f).resolve().parent) for f in shared_files}
+    if len(shared_dirs) > 1:
+        raise ValueError(f"shared_files must be in one directory, got {sorted(shared_dirs)}")
+    volumes = [
+        DockerVolume(host_path=shared_dir, container_path=DOCKER_SHARED_DIR)
+        for shared_dir in shared_dirs
+    ]
+    copy_shared = "".join(
+        f"cp {DOCKER_SHARED_DIR}/{shlex.quote(Path(f).name)} /asset-output/ && "
+        for f in shared_files
+    )
+
+    return lambda_.Code.from_asset(
+        source_dir,
+        asset_hash_type=AssetHashType.OUTPUT,
+        bundling=BundlingOptions(
+            image=lambda_.Runtime.PYTHON_3_11.bundling_image,
+            local=_CopyWithConfig(source_dir, config_json, shared_files),
+            volumes=volumes,
+            # Docker fallback, only used if local bundling is unavailable
+            command=[
+                "bash",
+                "-c",
+                "cp -r /asset-input/. /asset-output/ && "
+                "find /asset-output \\( -name __pycache__ -o -name '*.pyc' "
+                "-o -name requirements.txt -o -name tests \\) -prune -exec rm -rf {} + && "
+                f"{copy_shared}"
+                f"printf '%s' {shlex.quote(config_json)} > /asset-output/{CONFIG_FILE_NAME} && "
+                "python -m compileall -q --invalidation-mode unchecked-hash "
+                f"-d {LAMBDA_TASK_ROOT} /asset-output",
+            ],
+        ),
+    )
+
+
+def deploy_time_environment(config: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Return the config values that are only known at deploy time, or None"""
+    environment = {k: v for k, v in config.items() if Token.is_unresolved(v)}
+    return environment or None
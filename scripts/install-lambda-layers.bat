@@ -1,22 +1,29 @@
 @echo off
 REM Install Lambda Layer dependencies
 REM Layers must have a python/ subdirectory for Python packages
+REM
+REM PyMuPDF, python-docx and NumPy are installed into a single combined layer so
+REM each function attaches one layer instead of up to three.
 
 setlocal
 
+set LAYER_DIR=lambda\layers\combined\python
+set PIP_TARGET_OPTS=--platform manylinux2014_aarch64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade
+
 echo ========================================
 echo Installing Lambda Layer Dependencies
 echo ========================================
 echo.
 
-REM Create layer directories if they don't exist
-if not exist "lambda\layers\pdf-processing\python" mkdir lambda\layers\pdf-processing\python
-if not exist "lambda\layers\docx-processing\python" mkdir lambda\layers\docx-processing\python
-if not exist "lambda\layers\numpy\python" mkdir lambda\layers\numpy\python
+REM Start from a clean layer directory
+if exist "%LAYER_DIR%" rmdir /s /q "%LAYER_DIR%"
+mkdir "%LAYER_DIR%"
+
+echo Note: Installing for Linux arm64 platform (Graviton Lambda runtime)
+echo.
 
-echo [1/3] Installing PyMuPDF layer (for PDF processing)...
-echo Note: Installing for Linux x86_64 platform (Lambda runtime)
-pip install PyMuPDF>=1.23.0 -t lambda\layers\pdf-processing\python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade --no-deps
+echo [1/4] Installing PyMuPDF (for PDF processing)...
+pip install PyMuPDF>=1.23.0 -t %LAYER_DIR% %PIP_TARGET_OPTS% --no-deps
 if errorlevel 1 (
     echo ERROR: Failed to install PyMuPDF
     exit /b 1
@@ -24,10 +31,8 @@ if errorlevel 1 (
 echo Done!
 echo.
 
-echo [2/3] Installing python-docx layer (for DOCX processing)...
-echo Note: Installing for Linux x86_64 platform (Lambda runtime)
-echo Installing python-docx and its dependencies...
-pip install python-docx>=1.1.0 lxml typing_extensions -t lambda\layers\docx-processing\python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade
+echo [2/4] Installing python-docx and its dependencies (for DOCX processing)...
+pip install python-docx>=1.1.0 lxml typing_extensions -t %LAYER_DIR% %PIP_TARGET_OPTS%
 if errorlevel 1 (
     echo ERROR: Failed to install python-docx
     exit /b 1
@@ -35,24 +40,28 @@ if errorlevel 1 (
 echo Done!
 echo.
 
-echo [3/3] Installing NumPy layer (for MRL truncation)...
-echo Note: Installing for Linux x86_64 platform (Lambda runtime)
-pip install numpy>=1.24.0 -t lambda\layers\numpy\python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade --no-deps
+echo [3/4] Installing NumPy (for MRL truncation)...
+pip install numpy>=1.24.0 -t %LAYER_DIR% %PIP_TARGET_OPTS% --no-deps
 if errorlevel 1 (
     echo ERROR: Failed to install NumPy
     exit /b 1
 )
 echo Done!
+echo.
+
+echo [4/4] Trimming layer size...
+REM Package test suites and bytecode caches are never used at runtime
+for /d /r "%LAYER_DIR%" %%d in (__pycache__) do if exist "%%d" rmdir /s /q "%%d"
+for /d /r "%LAYER_DIR%\numpy" %%d in (tests) do if exist "%%d" rmdir /s /q "%%d"
+echo Done!
 
 echo.
 echo ========================================
-echo All Lambda Layers installed!
+echo Lambda Layer installed!
 echo ========================================
 echo.
-echo Layer locations:
-echo   - lambda\layers\pdf-processing\python\
-echo   - lambda\layers\docx-processing\python\
-echo   - lambda\layers\numpy\python\
+echo Layer location:
+echo   - %LAYER_DIR%\
 echo.
 echo You can now run: cdk deploy NovaMMEEmbedderStack
 
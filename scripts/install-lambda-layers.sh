@@ -1,45 +1,60 @@
 #!/bin/bash
 # Install Lambda Layer dependencies
 # Layers must have a python/ subdirectory for Python packages
+#
+# PyMuPDF, python-docx and NumPy are installed into a single combined layer so
+# each function attaches one layer instead of up to three.
 
 set -e
 
+LAYER_DIR=lambda/layers/combined/python
+PIP_TARGET_OPTS="--platform manylinux2014_aarch64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade"
+
 echo "========================================"
 echo "Installing Lambda Layer Dependencies"
 echo "========================================"
 echo ""
 
-# Create layer directories if they don't exist
-mkdir -p lambda/layers/pdf-processing/python
-mkdir -p lambda/layers/docx-processing/python
-mkdir -p lambda/layers/numpy/python
+# Start from a clean layer directory
+rm -rf "$LAYER_DIR"
+mkdir -p "$LAYER_DIR"
+
+echo "Note: Installing for Linux arm64 platform (Graviton Lambda runtime)"
+echo ""
+
+echo "[1/4] Installing PyMuPDF (for PDF processing)..."
+pip install "PyMuPDF>=1.23.0" -t "$LAYER_DIR" $PIP_TARGET_OPTS --no-deps
+echo "Done!"
+echo ""
 
-echo "[1/3] Installing PyMuPDF layer (for PDF processing)..."
-echo "Note: Installing for Linux x86_64 platform (Lambda runtime)"
-pip install "PyMuPDF>=1.23.0" -t lambda/layers/pdf-processing/python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade --no-deps
+echo "[2/4] Installing python-docx and its dependencies (for DOCX processing)..."
+pip install "python-docx>=1.1.0" lxml typing_extensions -t "$LAYER_DIR" $PIP_TARGET_OPTS
 echo "Done!"
 echo ""
 
-echo "[2/3] Installing python-docx layer (for DOCX processing)..."
-echo "Note: Installing for Linux x86_64 platform (Lambda runtime)"
-echo "Installing python-docx and its dependencies..."
-pip install "python-docx>=1.1.0" lxml typing_extensions -t lambda/layers/docx-processing/python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade
+echo "[3/4] Installing NumPy (for MRL truncation)..."
+pip install "numpy>=1.24.0" -t "$LAYER_DIR" $PIP_TARGET_OPTS --no-deps
 echo "Done!"
 echo ""
 
-echo "[3/3] Installing NumPy layer (for MRL truncation)..."
-echo "Note: Installing for Linux x86_64 platform (Lambda runtime)"
-pip install "numpy>=1.24.0" -t lambda/layers/numpy/python --platform manylinux2014_x86_64 --implementation cp --python-version 3.11 --only-binary=:all: --upgrade --no-deps
+echo "[4/4] Trimming layer size..."
+# Package test suites and bytecode caches are never used at runtime
+find "$LAYER_DIR" -type d -name "__pycache__" -prune -exec rm -rf {} +
+find "$LAYER_DIR/numpy" -type d -name "tests" -prune -exec rm -rf {} +
+# Drop debug symbols from compiled extensions (needs binutils; skipped if unavailable)
+if command -v strip >/dev/null 2>&1; then
+    find "$LAYER_DIR" -name "*.so*" -type f -exec strip --strip-unneeded {} + 2>/dev/null || true
+else
+    echo "strip not found, skipping symbol stripping"
+fi
 echo "Done!"
 
 echo ""
 echo "========================================"
-echo "All Lambda Layers installed!"
+echo "Lambda Layer installed!"
 echo "========================================"
 echo ""
-echo "Layer locations:"
-echo "  - lambda/layers/pdf-processing/python/"
-echo "  - lambda/layers/docx-processing/python/"
-echo "  - lambda/layers/numpy/python/"
+echo "Layer location:"
+echo "  - $LAYER_DIR/"
 echo ""
 echo "You can now run: cdk deploy NovaMMEEmbedderStack"
@@ -0,0 +1,63 @@
+"""
+Shared fixtures for unit tests
+"""
+
+import json
+import os
+import pytest
+import numpy as np
+
+# Processor handler settings, shared by both processor test files. Set at conftest
+# import so they are in place before any test module loads the handler.
+os.environ.update({
+    'EMBEDDING_DIMENSION': '3072',
+    'MODEL_ID': 'amazon.nova-2-multimodal-embeddings-v1:0',
+    'OUTPUT_BUCKET': 'test-output-bucket',
+    'SOURCE_BUCKET': 'test-source-bucket',
+})
+
+# Store embeddings handler settings
+os.environ.update({
+    'VECTOR_BUCKET': 'test-vector-bucket',
+    'EMBEDDING_DIMENSIONS': '256,384,1024,3072',
+})
+
+# Query handler settings, shared by both query handler test files
+os.environ.update({
+    'VECTOR_BUCKET': 'test-vector-bucket',
+    'EMBEDDING_MODEL_ID': 'amazon.nova-2-multimodal-embeddings-v1:0',
+    'LLM_MODEL_ID': 'anthropic.claude-3-5-sonnet-20240620-v1:0',
+    'DEFAULT_DIMENSION': '1024',
+    'DEFAULT_K': '5',
+    'HIERARCHICAL_ENABLED': 'true',
+    'HIERARCHICAL_CONFIG': json.dumps({
+        'first_pass_dimension': 256,
+        'first_pass_k': 20,
+        'second_pass_dimension': 1024,
+        'second_pass_k': 5
+    }),
+    'VECTOR_INDEXES': json.dumps({
+        '256': 'embeddings-256d',
+        '384': 'embeddings-384d',
+        '1024': 'embeddings-1024d',
+        '3072': 'embeddings-3072d'
+    }),
+    'LLM_MAX_TOKENS': '2048',
+    'LLM_TEMPERATURE': '0.7',
+})
+
+
+@pytest.fixture(scope="session")
+def rng_pool():
+    """
+    Seeded pool of random unit-norm 3072-dim embeddings, one per row
+    
+    Generated once per session so tests don't each draw fresh vectors, and
+    seeded so tolerance-sensitive tests are deterministic. Rows are read-only;
+    tests slice or copy them instead of modifying them in place.
+    """
+    rng = np.random.default_rng(42)
+    pool = rng.standard_normal((32, 3072))
+    pool /= np.linalg.norm(pool, axis=1, keepdims=True)
+    pool.flags.writeable = False
+    return pool
@@ -0,0 +1,51 @@
+"""
+Unit tests for the shared config.json loader
+"""
+
+import json
+import os
+import pytest
+
+# lambda/shared is on pythonpath (pytest.ini)
+from asset_config import load_asset_config
+
+
+class TestLoadAssetConfig:
+    """Tests for load_asset_config function"""
+    
+    def test_loads_config_without_overriding_environment(self, tmp_path, monkeypatch):
+        """Test config.json fills unset variables and existing variables win"""
+        (tmp_path / 'config.json').write_text(json.dumps({
+            'ASSET_CONFIG_TEST_NEW': 'from-config',
+            'ASSET_CONFIG_TEST_SET': 'from-config'
+        }))
+        monkeypatch.delenv('ASSET_CONFIG_TEST_NEW', raising=False)
+        monkeypatch.setenv('ASSET_CONFIG_TEST_SET', 'from-environment')
+        monkeypatch.setenv('LAMBDA_TASK_ROOT', str(tmp_path))
+        
+        load_asset_config()
+        
+        assert os.environ['ASSET_CONFIG_TEST_NEW'] == 'from-config'
+        assert os.environ['ASSET_CONFIG_TEST_SET'] == 'from-environment'
+        monkeypatch.delenv('ASSET_CONFIG_TEST_NEW')
+    
+    def test_missing_config_is_ignored(self, tmp_path, monkeypatch):
+        """Test an asset without config.json leaves the environment unchanged"""
+        environ = dict(os.environ)
+        
+        load_asset_config(str(tmp_path))
+        
+        assert dict(os.environ) == environ
+    
+    def test_no_task_root_outside_lambda(self, monkeypatch):
+        """Test nothing is loaded when LAMBDA_TASK_ROOT is unset"""
+        monkeypatch.delenv('LAMBDA_TASK_ROOT', raising=False)
+        environ = dict(os.environ)
+        
+        load_asset_config()
+        
+        assert dict(os.environ) == environ
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -13,8 +13,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../lambda/shared'
 from embedding_utils import (
     truncate_and_normalize,
     create_multi_dimensional_embeddings,
-    validate_mrl_property
+    create_multi_dimensional_embeddings_batch
 )
+from embedding_utils_debug import validate_mrl_property
 
 
 class TestTruncateAndNormalize:
@@ -29,15 +30,16 @@ class TestTruncateAndNormalize:
         result = truncate_and_normalize(embedding, 256)
         
         assert len(result) == 256
-        assert isinstance(result, list)
+        assert isinstance(result, np.ndarray)
+        assert result.dtype == np.float32
         
         # Check that it's normalized (L2 norm should be 1.0)
         norm = np.linalg.norm(result)
         assert abs(norm - 1.0) < 1e-6
     
-    def test_all_dimensions(self):
+    def test_all_dimensions(self, rng_pool):
         """Test truncation to all standard dimensions"""
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         for dim in [256, 384, 1024]:
             result = truncate_and_normalize(embedding_3072, dim)
@@ -75,9 +77,9 @@ class TestTruncateAndNormalize:
 class TestCreateMultiDimensionalEmbeddings:
     """Tests for create_multi_dimensional_embeddings function"""
     
-    def test_creates_all_dimensions(self):
+    def test_creates_all_dimensions(self, rng_pool):
         """Test that all dimension variants are created"""
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         result = create_multi_dimensional_embeddings(embedding_3072)
         
@@ -87,18 +89,18 @@ class TestCreateMultiDimensionalEmbeddings:
         assert 1024 in result
         assert 3072 in result
     
-    def test_full_dimension_unchanged(self):
+    def test_full_dimension_unchanged(self, rng_pool):
         """Test that 3072-dim embedding is kept as-is"""
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         result = create_multi_dimensional_embeddings(embedding_3072)
         
         # 3072-dim should be identical
         assert result[3072] == embedding_3072
     
-    def test_custom_dimensions(self):
+    def test_custom_dimensions(self, rng_pool):
         """Test with custom dimension list"""
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         result = create_multi_dimensional_embeddings(
             embedding_3072,
@@ -109,24 +111,74 @@ class TestCreateMultiDimensionalEmbeddings:
         assert 256 in result
         assert 1024 in result
     
-    def test_all_normalized(self):
+    def test_all_normalized(self, rng_pool):
         """Test that all truncated embeddings are normalized"""
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         result = create_multi_dimensional_embeddings(embedding_3072)
         
         for dim in [256, 384, 1024]:
             norm = np.linalg.norm(result[dim])
             assert abs(norm - 1.0) < 1e-6
+    
+    def test_matches_truncate_and_normalize(self, rng_pool):
+        """Test that prefix-norm variants match per-dimension truncation"""
+        embedding_3072 = rng_pool[0].tolist()
+        
+        result = create_multi_dimensional_embeddings(embedding_3072)
+        
+        for dim in [256, 384, 1024]:
+            expected = truncate_and_normalize(embedding_3072, dim)
+            assert np.allclose(result[dim], expected, atol=1e-6)
+    
+    def test_zero_prefix(self):
+        """Test error handling when a truncated prefix is all zeros"""
+        embedding_3072 = [0.0] * 256 + [1.0] * 2816
+        
+        with pytest.raises(ValueError, match="Cannot normalize zero vector"):
+            create_multi_dimensional_embeddings(embedding_3072)
+
+
+class TestCreateMultiDimensionalEmbeddingsBatch:
+    """Tests for create_multi_dimensional_embeddings_batch function"""
+    
+    def test_matches_single_embedding_version(self, rng_pool):
+        """Test each batch row matches the per-embedding result"""
+        embeddings = [row.tolist() for row in rng_pool[:5]]
+        
+        result = create_multi_dimensional_embeddings_batch(embeddings)
+        
+        assert len(result) == 5
+        for embedding, variants in zip(embeddings, result):
+            expected = create_multi_dimensional_embeddings(embedding)
+            assert variants[3072] == embedding
+            for dim in [256, 384, 1024]:
+                assert np.allclose(variants[dim], expected[dim], atol=1e-6)
+    
+    def test_empty_batch(self):
+        """Test an empty batch returns no variants"""
+        assert create_multi_dimensional_embeddings_batch([]) == []
+    
+    def test_zero_prefix(self, rng_pool):
+        """Test error handling when any row's truncated prefix is all zeros"""
+        embeddings = [rng_pool[0].tolist(), [0.0] * 256 + [1.0] * 2816]
+        
+        with pytest.raises(ValueError, match="Cannot normalize zero vector"):
+            create_multi_dimensional_embeddings_batch(embeddings)
+    
+    def test_mismatched_lengths(self):
+        """Test error handling for embeddings of different lengths"""
+        with pytest.raises(ValueError):
+            create_multi_dimensional_embeddings_batch([[1.0] * 3072, [1.0] * 1024])
 
 
 class TestValidateMRLProperty:
     """Tests for validate_mrl_property function"""
     
-    def test_perfect_match(self):
+    def test_perfect_match(self, rng_pool):
         """Test validation with perfectly matching embeddings"""
         # Create a 3072-dim embedding
-        embedding_3072 = np.random.randn(3072)
+        embedding_3072 = rng_pool[0]
         embedding_3072 = embedding_3072 / np.linalg.norm(embedding_3072)
         
         # Truncate it ourselves to create "native" embedding
@@ -134,35 +186,35 @@ class TestValidateMRLProperty:
         embedding_256 = embedding_256 / np.linalg.norm(embedding_256)
         
         result = validate_mrl_property(
-            embedding_3072.tolist(),
-            embedding_256.tolist(),
+            embedding_3072,
+            embedding_256,
             256
         )
         
         assert result is True
     
-    def test_close_match(self):
+    def test_close_match(self, rng_pool):
         """Test validation with very similar embeddings"""
-        embedding_3072 = np.random.randn(3072)
+        embedding_3072 = rng_pool[0]
         embedding_3072 = embedding_3072 / np.linalg.norm(embedding_3072)
         
         # Create slightly different "native" embedding
-        embedding_256 = embedding_3072[:256] + np.random.randn(256) * 0.001
+        embedding_256 = embedding_3072[:256] + rng_pool[1][:256] * 0.001
         embedding_256 = embedding_256 / np.linalg.norm(embedding_256)
         
         result = validate_mrl_property(
-            embedding_3072.tolist(),
-            embedding_256.tolist(),
+            embedding_3072,
+            embedding_256,
             256,
             tolerance=0.01
         )
         
         assert result is True
     
-    def test_no_match(self):
+    def test_no_match(self, rng_pool):
         """Test validation with completely different embeddings"""
-        embedding_3072 = np.random.randn(3072).tolist()
-        embedding_256 = np.random.randn(256).tolist()
+        embedding_3072 = rng_pool[0]
+        embedding_256 = rng_pool[1][:256]
         
         result = validate_mrl_property(
             embedding_3072,
@@ -172,15 +224,15 @@ class TestValidateMRLProperty:
         
         assert result is False
     
-    def test_custom_tolerance(self):
+    def test_custom_tolerance(self, rng_pool):
         """Test validation with custom tolerance"""
         # Create a base embedding
-        embedding_3072 = np.random.randn(3072)
+        embedding_3072 = rng_pool[0]
         embedding_3072 = embedding_3072 / np.linalg.norm(embedding_3072)
         
         # Create a slightly rotated version by mixing with a small orthogonal component
         # This creates a controlled angular difference
-        orthogonal = np.random.randn(256)
+        orthogonal = rng_pool[1][:256]
         orthogonal = orthogonal - np.dot(orthogonal, embedding_3072[:256]) * embedding_3072[:256]
         orthogonal = orthogonal / np.linalg.norm(orthogonal)
         
@@ -194,8 +246,8 @@ class TestValidateMRLProperty:
         
         # Close embedding should pass with moderate tolerance
         result_close = validate_mrl_property(
-            embedding_3072.tolist(),
-            embedding_256_close.tolist(),
+            embedding_3072,
+            embedding_256_close,
             256,
             tolerance=0.01
         )
@@ -203,20 +255,34 @@ class TestValidateMRLProperty:
         
         # Far embedding should fail with strict tolerance but pass with loose
         result_far_strict = validate_mrl_property(
-            embedding_3072.tolist(),
-            embedding_256_far.tolist(),
+            embedding_3072,
+            embedding_256_far,
             256,
             tolerance=0.01
         )
         assert result_far_strict is False
         
         result_far_loose = validate_mrl_property(
-            embedding_3072.tolist(),
-            embedding_256_far.tolist(),
+            embedding_3072,
+            embedding_256_far,
             256,
             tolerance=0.1
         )
         assert result_far_loose is True
+    
+    def test_accepts_lists(self, rng_pool):
+        """Test validation with plain Python lists"""
+        embedding_3072 = rng_pool[0]
+        embedding_3072 = embedding_3072 / np.linalg.norm(embedding_3072)
+        embedding_256 = embedding_3072[:256] / np.linalg.norm(embedding_3072[:256])
+        
+        result = validate_mrl_property(
+            embedding_3072.tolist(),
+            embedding_256.tolist(),
+            256
+        )
+        
+        assert result is True
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+"""
+Unit tests for the Job Callback Lambda
+"""
+
+import pytest
+import json
+from io import BytesIO
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+
+# lambda/embedder is on pythonpath (pytest.ini)
+from job_callback import index as job_callback
+
+JOB = {
+    'invocationArn': 'arn:aws:bedrock:us-east-1:123456789012:async-invoke/abc123',
+    'outputS3Uri': 's3://output-bucket/obj-1/',
+    'metadata': {'objectId': 'obj-1'},
+    'status': 'IN_PROGRESS'
+}
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'Operation')
+
+
+class TestJobOutputLocation:
+    """Tests for job_output_location function"""
+    
+    def test_appends_invocation_id(self):
+        """Test the output folder includes the invocation ID subdirectory"""
+        bucket, prefix = job_callback.job_output_location(JOB)
+        
+        assert bucket == 'output-bucket'
+        assert prefix == 'obj-1/abc123'
+
+
+class TestRegisterTaskToken:
+    """Tests for Step Functions registration"""
+    
+    @patch.object(job_callback, 'bedrock_runtime')
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_stores_token_and_waits(self, mock_s3, mock_sfn, mock_bedrock):
+        """Test the token is stored and nothing is sent while the job runs"""
+        mock_s3.head_object.side_effect = client_error('404')
+        mock_bedrock.get_async_invoke.return_value = {'status': 'InProgress'}
+        
+        result = job_callback.handler({'taskToken': 'token-1', 'job': JOB}, None)
+        
+        assert result == {'resumed': 0}
+        put_kwargs = mock_s3.put_object.call_args.kwargs
+        assert put_kwargs['Bucket'] == 'output-bucket'
+        assert put_kwargs['Key'] == 'obj-1/abc123/task-token.json'
+        assert json.loads(put_kwargs['Body']) == {'taskToken': 'token-1', 'job': JOB}
+        mock_sfn.send_task_success.assert_not_called()
+        mock_sfn.send_task_failure.assert_not_called()
+    
+    @patch.object(job_callback, 'bedrock_runtime')
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_fails_task_if_job_already_failed(self, mock_s3, mock_sfn, mock_bedrock):
+        """Test a job that failed before registration fails the task at once"""
+        mock_s3.head_object.side_effect = client_error('404')
+        mock_bedrock.get_async_invoke.return_value = {
+            'status': 'Failed',
+            'failureMessage': 'Invalid input'
+        }
+        
+        result = job_callback.handler({'taskToken': 'token-1', 'job': JOB}, None)
+        
+        assert result == {'resumed': 0}
+        mock_sfn.send_task_failure.assert_called_once_with(
+            taskToken='token-1',
+            error='AsyncInvokeFailed',
+            cause='Invalid input'
+        )
+    
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_resumes_if_result_already_written(self, mock_s3, mock_sfn):
+        """Test a job that finished before registration resumes immediately"""
+        result = job_callback.handler({'taskToken': 'token-1', 'job': JOB}, None)
+        
+        assert result == {'resumed': 1}
+        sfn_kwargs = mock_sfn.send_task_success.call_args.kwargs
+        assert sfn_kwargs['taskToken'] == 'token-1'
+        assert json.loads(sfn_kwargs['output'])['status'] == 'COMPLETED'
+
+
+class TestResumeFromResult:
+    """Tests for S3 result notifications"""
+    
+    def s3_event(self, key):
+        return {'Records': [{'s3': {'bucket': {'name': 'output-bucket'}, 'object': {'key': key}}}]}
+    
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_sends_stored_job(self, mock_s3, mock_sfn):
+        """Test the stored job is handed back with status COMPLETED"""
+        mock_s3.get_object.return_value = {
+            'Body': BytesIO(json.dumps({'taskToken': 'token-1', 'job': JOB}).encode('utf-8'))
+        }
+        
+        result = job_callback.handler(self.s3_event('obj-1/abc123/segmented-embedding-result.json'), None)
+        
+        assert result == {'resumed': 1}
+        mock_s3.get_object.assert_called_once_with(Bucket='output-bucket', Key='obj-1/abc123/task-token.json')
+        output = json.loads(mock_sfn.send_task_success.call_args.kwargs['output'])
+        assert output == {**JOB, 'status': 'COMPLETED'}
+    
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_result_before_registration(self, mock_s3, mock_sfn):
+        """Test a result with no stored token is left for registration to pick up"""
+        mock_s3.get_object.side_effect = client_error('NoSuchKey')
+        
+        result = job_callback.handler(self.s3_event('obj-1/abc123/segmented-embedding-result.json'), None)
+        
+        assert result == {'resumed': 0}
+        mock_sfn.send_task_success.assert_not_called()
+    
+    @patch.object(job_callback, 'sfn_client')
+    @patch.object(job_callback, 's3_client')
+    def test_stale_token_ignored(self, mock_s3, mock_sfn):
+        """Test a token already used or timed out is not an error"""
+        mock_s3.get_object.return_value = {
+            'Body': BytesIO(json.dumps({'taskToken': 'token-1', 'job': JOB}).encode('utf-8'))
+        }
+        mock_sfn.send_task_success.side_effect = client_error('TaskTimedOut')
+        
+        result = job_callback.handler(self.s3_event('obj-1/abc123/segmented-embedding-result.json'), None)
+        
+        assert result == {'resumed': 0}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
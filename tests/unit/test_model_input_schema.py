@@ -6,21 +6,72 @@ to the Nova MME async API schema requirements.
 """
 
 import pytest
+import copy
+import re
 import sys
-import os
-import importlib.util
+from functools import lru_cache
 
-# Set required environment variables before importing
-os.environ['EMBEDDING_DIMENSION'] = '3072'
-os.environ['MODEL_ID'] = 'amazon.nova-2-multimodal-embeddings-v1:0'
-os.environ['OUTPUT_BUCKET'] = 'test-output-bucket'
-os.environ['SOURCE_BUCKET'] = 'test-source-bucket'
+# lambda/embedder is on pythonpath (pytest.ini); the processor package keeps its
+# index.py distinct from the other handlers'. Environment variables are set in conftest.py
+from processor import index as processor
 
-# Import the processor module directly to avoid name collision
-processor_path = os.path.join(os.path.dirname(__file__), '../../lambda/embedder/processor/index.py')
-spec = importlib.util.spec_from_file_location("processor", processor_path)
-processor = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(processor)
+
+# Values the Nova MME async schema accepts, shared by the assertions and the JSON schema
+VALID_PURPOSES = frozenset({
+    'GENERIC_INDEX', 'GENERIC_RETRIEVAL', 'TEXT_RETRIEVAL',
+    'IMAGE_RETRIEVAL', 'VIDEO_RETRIEVAL', 'DOCUMENT_RETRIEVAL',
+    'AUDIO_RETRIEVAL', 'CLASSIFICATION', 'CLUSTERING'
+})
+VALID_DIMENSIONS = frozenset({256, 384, 1024, 3072})
+VALID_IMAGE_FORMATS = frozenset({'png', 'jpeg', 'gif', 'webp'})
+VALID_DETAIL_LEVELS = frozenset({'STANDARD_IMAGE', 'DOCUMENT_IMAGE'})
+VALID_VIDEO_FORMATS = frozenset({'mp4', 'mov', 'mkv', 'webm', 'flv', 'mpeg', 'mpg', 'wmv', '3gp'})
+VALID_EMBEDDING_MODES = frozenset({'AUDIO_VIDEO_COMBINED', 'AUDIO_VIDEO_SEPARATE'})
+VALID_AUDIO_FORMATS = frozenset({'mp3', 'wav', 'ogg'})
+VALID_TRUNCATION_MODES = frozenset({'START', 'END', 'NONE'})
+MODALITIES = ('text', 'image', 'video', 'audio')
+
+# (extension, expected format) for every supported extension of each modality
+IMAGE_FORMAT_CASES = (
+    ('.png', 'png'),
+    ('.jpg', 'jpeg'),
+    ('.jpeg', 'jpeg'),
+    ('.gif', 'gif'),
+    ('.webp', 'webp'),
+)
+VIDEO_FORMAT_CASES = (
+    ('.mp4', 'mp4'), ('.mov', 'mov'), ('.mkv', 'mkv'),
+    ('.webm', 'webm'), ('.flv', 'flv'), ('.mpeg', 'mpeg'),
+    ('.mpg', 'mpg'), ('.wmv', 'wmv'), ('.3gp', '3gp'),
+)
+AUDIO_FORMAT_CASES = (
+    ('.mp3', 'mp3'),
+    ('.wav', 'wav'),
+    ('.ogg', 'ogg'),
+)
+
+# One representative (key, extension, modality) per modality
+MODALITY_CASES = (
+    ('test.jpg', '.jpg', 'image'),
+    ('test.mp4', '.mp4', 'video'),
+    ('test.mp3', '.mp3', 'audio'),
+    ('test.txt', '.txt', 'text'),
+)
+
+
+@lru_cache(maxsize=None)
+def _cached_model_input(bucket, key, ext):
+    return processor.create_model_input(bucket, key, ext)
+
+
+def model_input(bucket, key, ext):
+    """
+    create_model_input, computed once per distinct (bucket, key, ext)
+    
+    Each call returns its own copy, so a test that edits the result cannot
+    change what later tests see.
+    """
+    return copy.deepcopy(_cached_model_input(bucket, key, ext))
 
 
 class TestSchemaCompliance:
@@ -28,7 +79,7 @@ class TestSchemaCompliance:
     
     def test_required_top_level_fields(self):
         """Test that all required top-level fields are present"""
-        result = processor.create_model_input('bucket', 'test.jpg', '.jpg')
+        result = model_input('bucket', 'test.jpg', '.jpg')
         
         # Required fields
         assert 'schemaVersion' in result
@@ -41,202 +92,154 @@ class TestSchemaCompliance:
     
     def test_segmented_embedding_params_structure(self):
         """Test segmentedEmbeddingParams has required fields"""
-        result = processor.create_model_input('bucket', 'test.jpg', '.jpg')
+        result = model_input('bucket', 'test.jpg', '.jpg')
         
         params = result['segmentedEmbeddingParams']
         assert 'embeddingPurpose' in params
         assert 'embeddingDimension' in params
         
         # Valid values
-        assert params['embeddingPurpose'] in [
-            'GENERIC_INDEX', 'GENERIC_RETRIEVAL', 'TEXT_RETRIEVAL',
-            'IMAGE_RETRIEVAL', 'VIDEO_RETRIEVAL', 'DOCUMENT_RETRIEVAL',
-            'AUDIO_RETRIEVAL', 'CLASSIFICATION', 'CLUSTERING'
-        ]
-        assert params['embeddingDimension'] in [256, 384, 1024, 3072]
+        assert params['embeddingPurpose'] in VALID_PURPOSES
+        assert params['embeddingDimension'] in VALID_DIMENSIONS
     
     def test_exactly_one_modality(self):
         """Test that exactly one modality is present"""
-        test_cases = [
-            ('test.jpg', '.jpg', 'image'),
-            ('test.mp4', '.mp4', 'video'),
-            ('test.mp3', '.mp3', 'audio'),
-            ('test.txt', '.txt', 'text'),
-        ]
-        
-        for filename, ext, expected_modality in test_cases:
-            result = processor.create_model_input('bucket', filename, ext)
+        for filename, ext, expected_modality in MODALITY_CASES:
+            result = model_input('bucket', filename, ext)
             params = result['segmentedEmbeddingParams']
             
-            # Count modalities present
-            modalities = ['text', 'image', 'video', 'audio']
-            present = [m for m in modalities if m in params]
+            # Modalities present, in one key-view intersection
+            present = params.keys() & MODALITIES
             
-            assert len(present) == 1, f"Expected exactly 1 modality, found {len(present)}"
-            assert present[0] == expected_modality
+            assert present == {expected_modality}, f"Expected only {expected_modality}, found {sorted(present)}"
+
+
+# Per-modality request layout: the representative file, the fields its config
+# requires, the enum each constrained field must come from, and its segmentation
+# setting as (field, minimum, maximum), or None if the modality is not segmented
+MODALITY_SPECS = (
+    {
+        'modality': 'image',
+        'key': 'test.png',
+        'ext': '.png',
+        'required': ('format', 'source', 'detailLevel'),
+        'enums': {'format': VALID_IMAGE_FORMATS, 'detailLevel': VALID_DETAIL_LEVELS},
+        'format_cases': IMAGE_FORMAT_CASES,
+        'segmentation': None,
+    },
+    {
+        'modality': 'video',
+        'key': 'test.mp4',
+        'ext': '.mp4',
+        'required': ('format', 'source', 'embeddingMode', 'segmentationConfig'),
+        'enums': {'format': VALID_VIDEO_FORMATS, 'embeddingMode': VALID_EMBEDDING_MODES},
+        'format_cases': VIDEO_FORMAT_CASES,
+        'segmentation': ('durationSeconds', 1, 30),
+    },
+    {
+        'modality': 'audio',
+        'key': 'test.mp3',
+        'ext': '.mp3',
+        'required': ('format', 'source', 'segmentationConfig'),
+        'enums': {'format': VALID_AUDIO_FORMATS},
+        'format_cases': AUDIO_FORMAT_CASES,
+        'segmentation': ('durationSeconds', 1, 30),
+    },
+    {
+        'modality': 'text',
+        'key': 'test.txt',
+        'ext': '.txt',
+        'required': ('truncationMode', 'source', 'segmentationConfig'),
+        'enums': {'truncationMode': VALID_TRUNCATION_MODES},
+        'format_cases': (),
+        'segmentation': ('maxLengthChars', 800, 50000),
+    },
+)
+
+# (modality, extension, expected format) across every modality with a format field
+FORMAT_CASES = tuple(
+    (spec['modality'], ext, expected_format)
+    for spec in MODALITY_SPECS
+    for ext, expected_format in spec['format_cases']
+)
+VALID_FORMATS = {spec['modality']: spec['enums']['format'] for spec in MODALITY_SPECS if spec['format_cases']}
+
 
+def modality_config(spec):
+    """The modality's config block from the representative request for spec"""
+    result = model_input('bucket', spec['key'], spec['ext'])
+    return result['segmentedEmbeddingParams'][spec['modality']]
 
-class TestImageSchema:
-    """Test image-specific schema compliance"""
+
+@pytest.mark.parametrize("spec", MODALITY_SPECS, ids=lambda spec: spec['modality'])
+class TestModalitySchema:
+    """Test modality-specific schema compliance, one parametrization per modality"""
     
-    def test_image_required_fields(self):
-        """Test image config has all required fields"""
-        result = processor.create_model_input('bucket', 'test.png', '.png')
-        image = result['segmentedEmbeddingParams']['image']
+    def test_required_fields(self, spec):
+        """Test the modality config has all required fields"""
+        config = modality_config(spec)
         
-        assert 'format' in image
-        assert 'source' in image
-        assert 'detailLevel' in image
+        for field in spec['required']:
+            assert field in config, f"{spec['modality']} config missing {field}"
     
-    def test_image_format_values(self):
-        """Test image format values are valid"""
-        valid_formats = ['png', 'jpeg', 'gif', 'webp']
-        
-        test_cases = [
-            ('.png', 'png'),
-            ('.jpg', 'jpeg'),
-            ('.jpeg', 'jpeg'),
-            ('.gif', 'gif'),
-            ('.webp', 'webp'),
-        ]
+    def test_enum_values(self, spec):
+        """Test every enum-constrained field holds an accepted value"""
+        config = modality_config(spec)
         
-        for ext, expected_format in test_cases:
-            result = processor.create_model_input('bucket', f'test{ext}', ext)
-            image = result['segmentedEmbeddingParams']['image']
-            
-            assert image['format'] == expected_format
-            assert image['format'] in valid_formats
+        for field, valid_values in spec['enums'].items():
+            assert config[field] in valid_values
     
-    def test_image_source_structure(self):
-        """Test image source has correct S3 structure"""
-        result = processor.create_model_input('bucket', 'test.png', '.png')
-        source = result['segmentedEmbeddingParams']['image']['source']
+    def test_source_structure(self, spec):
+        """Test the source has the S3 location structure"""
+        source = modality_config(spec)['source']
         
         assert 's3Location' in source
         assert 'uri' in source['s3Location']
         assert source['s3Location']['uri'].startswith('s3://')
     
-    def test_image_detail_level(self):
-        """Test image detailLevel is valid"""
-        result = processor.create_model_input('bucket', 'test.png', '.png')
-        detail_level = result['segmentedEmbeddingParams']['image']['detailLevel']
+    def test_segmentation_config(self, spec):
+        """Test segmentationConfig is present, integer and in range when the modality is segmented"""
+        config = modality_config(spec)
         
-        assert detail_level in ['STANDARD_IMAGE', 'DOCUMENT_IMAGE']
-
-
-class TestVideoSchema:
-    """Test video-specific schema compliance"""
-    
-    def test_video_required_fields(self):
-        """Test video config has all required fields"""
-        result = processor.create_model_input('bucket', 'test.mp4', '.mp4')
-        video = result['segmentedEmbeddingParams']['video']
+        if spec['segmentation'] is None:
+            assert 'segmentationConfig' not in config
+            return
         
-        assert 'format' in video
-        assert 'source' in video
-        assert 'embeddingMode' in video
-        assert 'segmentationConfig' in video
-    
-    def test_video_format_values(self):
-        """Test all video formats are valid"""
-        valid_formats = ['mp4', 'mov', 'mkv', 'webm', 'flv', 'mpeg', 'mpg', 'wmv', '3gp']
-        
-        test_cases = [
-            ('.mp4', 'mp4'), ('.mov', 'mov'), ('.mkv', 'mkv'),
-            ('.webm', 'webm'), ('.flv', 'flv'), ('.mpeg', 'mpeg'),
-            ('.mpg', 'mpg'), ('.wmv', 'wmv'), ('.3gp', '3gp'),
-        ]
-        
-        for ext, expected_format in test_cases:
-            result = processor.create_model_input('bucket', f'test{ext}', ext)
-            video = result['segmentedEmbeddingParams']['video']
-            
-            assert video['format'] == expected_format
-            assert video['format'] in valid_formats
-    
-    def test_video_embedding_mode(self):
-        """Test video embeddingMode is valid"""
-        result = processor.create_model_input('bucket', 'test.mp4', '.mp4')
-        mode = result['segmentedEmbeddingParams']['video']['embeddingMode']
-        
-        assert mode in ['AUDIO_VIDEO_COMBINED', 'AUDIO_VIDEO_SEPARATE']
-    
-    def test_video_segmentation_config(self):
-        """Test video segmentationConfig structure"""
-        result = processor.create_model_input('bucket', 'test.mp4', '.mp4')
-        seg_config = result['segmentedEmbeddingParams']['video']['segmentationConfig']
+        field, minimum, maximum = spec['segmentation']
+        seg_config = config['segmentationConfig']
         
-        assert 'durationSeconds' in seg_config
-        assert isinstance(seg_config['durationSeconds'], int)
-        assert 1 <= seg_config['durationSeconds'] <= 30
+        assert field in seg_config
+        assert isinstance(seg_config[field], int)
+        assert minimum <= seg_config[field] <= maximum
 
 
-class TestAudioSchema:
-    """Test audio-specific schema compliance"""
+class TestFormatValues:
+    """Test the format chosen for every supported extension"""
     
-    def test_audio_required_fields(self):
-        """Test audio config has all required fields"""
-        result = processor.create_model_input('bucket', 'test.mp3', '.mp3')
-        audio = result['segmentedEmbeddingParams']['audio']
+    @pytest.mark.parametrize(
+        "modality,ext,expected_format",
+        FORMAT_CASES,
+        ids=[ext for _, ext, _ in FORMAT_CASES]
+    )
+    def test_format_values(self, modality, ext, expected_format):
+        """Test the extension maps to the expected, schema-accepted format"""
+        result = model_input('bucket', f'test{ext}', ext)
+        config = result['segmentedEmbeddingParams'][modality]
         
-        assert 'format' in audio
-        assert 'source' in audio
-        assert 'segmentationConfig' in audio
-    
-    def test_audio_format_values(self):
-        """Test all audio formats are valid"""
-        valid_formats = ['mp3', 'wav', 'ogg']
-        
-        test_cases = [
-            ('.mp3', 'mp3'),
-            ('.wav', 'wav'),
-            ('.ogg', 'ogg'),
-        ]
-        
-        for ext, expected_format in test_cases:
-            result = processor.create_model_input('bucket', f'test{ext}', ext)
-            audio = result['segmentedEmbeddingParams']['audio']
-            
-            assert audio['format'] == expected_format
-            assert audio['format'] in valid_formats
-    
-    def test_audio_segmentation_config(self):
-        """Test audio segmentationConfig structure"""
-        result = processor.create_model_input('bucket', 'test.mp3', '.mp3')
-        seg_config = result['segmentedEmbeddingParams']['audio']['segmentationConfig']
-        
-        assert 'durationSeconds' in seg_config
-        assert isinstance(seg_config['durationSeconds'], int)
-        assert 1 <= seg_config['durationSeconds'] <= 30
+        assert config['format'] == expected_format
+        assert config['format'] in VALID_FORMATS[modality]
 
 
-class TestTextSchema:
-    """Test text-specific schema compliance"""
-    
-    def test_text_required_fields(self):
-        """Test text config has all required fields"""
-        result = processor.create_model_input('bucket', 'test.txt', '.txt')
-        text = result['segmentedEmbeddingParams']['text']
-        
-        assert 'truncationMode' in text
-        assert 'source' in text
-        assert 'segmentationConfig' in text
-    
-    def test_text_truncation_mode(self):
-        """Test text truncationMode is valid"""
-        result = processor.create_model_input('bucket', 'test.txt', '.txt')
-        mode = result['segmentedEmbeddingParams']['text']['truncationMode']
-        
-        assert mode in ['START', 'END', 'NONE']
-    
-    def test_text_segmentation_config(self):
-        """Test text segmentationConfig structure"""
-        result = processor.create_model_input('bucket', 'test.txt', '.txt')
-        seg_config = result['segmentedEmbeddingParams']['text']['segmentationConfig']
-        
-        assert 'maxLengthChars' in seg_config
-        assert isinstance(seg_config['maxLengthChars'], int)
-        assert 800 <= seg_config['maxLengthChars'] <= 50000
+# s3://bucket/key with a single scheme separator and a non-empty key
+S3_URI_PATTERN = re.compile(r'^s3://(?P<bucket>[^/:]+)/(?P<key>(?:(?!://).)+)$')
+
+# Nested keys, to check the full key is kept in the source URI
+S3_SOURCE_CASES = (
+    ('images/photo.jpg', '.jpg', 'image'),
+    ('videos/clip.mp4', '.mp4', 'video'),
+    ('audio/song.mp3', '.mp3', 'audio'),
+    ('docs/file.txt', '.txt', 'text'),
+)
 
 
 class TestS3SourceStructure:
@@ -244,25 +247,130 @@ class TestS3SourceStructure:
     
     def test_s3_uri_format(self):
         """Test S3 URI format is correct for all modalities"""
-        test_cases = [
-            ('images/photo.jpg', '.jpg', 'image'),
-            ('videos/clip.mp4', '.mp4', 'video'),
-            ('audio/song.mp3', '.mp3', 'audio'),
-            ('docs/file.txt', '.txt', 'text'),
-        ]
-        
-        for key, ext, modality in test_cases:
-            result = processor.create_model_input('test-bucket', key, ext)
+        for key, ext, modality in S3_SOURCE_CASES:
+            result = model_input('test-bucket', key, ext)
             source = result['segmentedEmbeddingParams'][modality]['source']
             
             assert 's3Location' in source
             assert 'uri' in source['s3Location']
             
-            uri = source['s3Location']['uri']
-            assert uri == f's3://test-bucket/{key}'
-            assert uri.startswith('s3://')
-            assert '://' in uri
-            assert uri.count('://') == 1
+            match = S3_URI_PATTERN.match(source['s3Location']['uri'])
+            assert match, f"Not an s3://bucket/key URI: {source['s3Location']['uri']}"
+            assert match.group('bucket') == 'test-bucket'
+            assert match.group('key') == key
+
+
+_S3_SOURCE = {
+    'type': 'object',
+    'required': ['s3Location'],
+    'properties': {
+        's3Location': {
+            'type': 'object',
+            'required': ['uri'],
+            'properties': {'uri': {'type': 'string', 'pattern': '^s3://[^/]+/.+'}}
+        }
+    }
+}
+
+_DURATION_SEGMENTATION = {
+    'type': 'object',
+    'required': ['durationSeconds'],
+    'properties': {'durationSeconds': {'type': 'integer', 'minimum': 1, 'maximum': 30}}
+}
+
+# Nova MME async request schema, covering every constraint the tests above check
+# one assertion at a time
+NOVA_MME_ASYNC_SCHEMA = {
+    'type': 'object',
+    'required': ['schemaVersion', 'taskType', 'segmentedEmbeddingParams'],
+    'properties': {
+        'schemaVersion': {'const': 'nova-multimodal-embed-v1'},
+        'taskType': {'const': 'SEGMENTED_EMBEDDING'},
+        'segmentedEmbeddingParams': {
+            'type': 'object',
+            'required': ['embeddingPurpose', 'embeddingDimension'],
+            'properties': {
+                'embeddingPurpose': {'enum': sorted(VALID_PURPOSES)},
+                'embeddingDimension': {'enum': sorted(VALID_DIMENSIONS)},
+                'image': {
+                    'type': 'object',
+                    'required': ['format', 'source', 'detailLevel'],
+                    'properties': {
+                        'format': {'enum': sorted(VALID_IMAGE_FORMATS)},
+                        'source': _S3_SOURCE,
+                        'detailLevel': {'enum': sorted(VALID_DETAIL_LEVELS)}
+                    }
+                },
+                'video': {
+                    'type': 'object',
+                    'required': ['format', 'source', 'embeddingMode', 'segmentationConfig'],
+                    'properties': {
+                        'format': {'enum': sorted(VALID_VIDEO_FORMATS)},
+                        'source': _S3_SOURCE,
+                        'embeddingMode': {'enum': sorted(VALID_EMBEDDING_MODES)},
+                        'segmentationConfig': _DURATION_SEGMENTATION
+                    }
+                },
+                'audio': {
+                    'type': 'object',
+                    'required': ['format', 'source', 'segmentationConfig'],
+                    'properties': {
+                        'format': {'enum': sorted(VALID_AUDIO_FORMATS)},
+                        'source': _S3_SOURCE,
+                        'segmentationConfig': _DURATION_SEGMENTATION
+                    }
+                },
+                'text': {
+                    'type': 'object',
+                    'required': ['truncationMode', 'source', 'segmentationConfig'],
+                    'properties': {
+                        'truncationMode': {'enum': sorted(VALID_TRUNCATION_MODES)},
+                        'source': _S3_SOURCE,
+                        'segmentationConfig': {
+                            'type': 'object',
+                            'required': ['maxLengthChars'],
+                            'properties': {
+                                'maxLengthChars': {'type': 'integer', 'minimum': 800, 'maximum': 50000}
+                            }
+                        }
+                    }
+                }
+            },
+            # Exactly one modality per request
+            'oneOf': [{'required': [modality]} for modality in MODALITIES]
+        }
+    }
+}
+
+
+@pytest.fixture(scope="module")
+def validate():
+    """Schema compiled once to straight-line Python by fastjsonschema"""
+    fastjsonschema = pytest.importorskip("fastjsonschema")
+    return fastjsonschema.compile(NOVA_MME_ASYNC_SCHEMA)
+
+
+class TestJsonSchema:
+    """Validate every supported extension against the compiled request schema"""
+    
+    @pytest.mark.parametrize("ext", [
+        ext for cases in (IMAGE_FORMAT_CASES, VIDEO_FORMAT_CASES, AUDIO_FORMAT_CASES)
+        for ext, _ in cases
+    ] + ['.txt', '.md', '.json', '.csv'])
+    def test_matches_schema(self, validate, ext):
+        """Test the generated request for each extension is schema-valid"""
+        validate(model_input('bucket', f'test{ext}', ext))
+    
+    def test_rejects_two_modalities(self, validate):
+        """Test the schema itself catches a request with more than one modality"""
+        result = model_input('bucket', 'test.jpg', '.jpg')
+        result['segmentedEmbeddingParams']['text'] = (
+            model_input('bucket', 'test.txt', '.txt')['segmentedEmbeddingParams']['text']
+        )
+        
+        fastjsonschema = pytest.importorskip("fastjsonschema")
+        with pytest.raises(fastjsonschema.JsonSchemaValueException, match="exactly by one"):
+            validate(result)
 
 
 if __name__ == '__main__':
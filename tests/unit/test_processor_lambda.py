@@ -8,19 +8,86 @@ import sys
 import os
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
-import importlib.util
 
-# Set required environment variables before importing
-os.environ['EMBEDDING_DIMENSION'] = '3072'
-os.environ['MODEL_ID'] = 'amazon.nova-2-multimodal-embeddings-v1:0'
-os.environ['OUTPUT_BUCKET'] = 'test-output-bucket'
-os.environ['SOURCE_BUCKET'] = 'test-source-bucket'
+# lambda/embedder is on pythonpath (pytest.ini); the processor package keeps its
+# index.py distinct from the other handlers'. Environment variables are set in conftest.py
+from processor import index as processor
 
-# Import the processor module directly to avoid name collision
-processor_path = os.path.join(os.path.dirname(__file__), '../../lambda/embedder/processor/index.py')
-spec = importlib.util.spec_from_file_location("processor", processor_path)
-processor = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(processor)
+# Upload time shared by the S3 head_object and metadata mocks
+LAST_MODIFIED = datetime(2024, 1, 15, 10, 30, 0)
+
+JPG_METADATA = {
+    'sourceS3Uri': 's3://test-bucket/test.jpg',
+    'fileName': 'test.jpg',
+    'fileType': '.jpg',
+    'fileSize': 1024,
+    'uploadTimestamp': LAST_MODIFIED.isoformat(),
+    'contentType': 'image/jpeg',
+    'objectId': 'test_jpg_20240115103000'
+}
+
+
+def _expected_model_input(modality, config):
+    """Full create_model_input result for bucket 'bucket' with the given modality config"""
+    return {
+        'schemaVersion': 'nova-multimodal-embed-v1',
+        'taskType': 'SEGMENTED_EMBEDDING',
+        'segmentedEmbeddingParams': {
+            'embeddingPurpose': 'GENERIC_INDEX',
+            'embeddingDimension': 3072,
+            modality: config
+        }
+    }
+
+
+# Complete request for one representative file per modality, compared in one
+# equality so any added, dropped or changed field fails the test
+EXPECTED_MODEL_INPUTS = {
+    ('image.png', '.png'): _expected_model_input('image', {
+        'format': 'png',
+        'source': {'s3Location': {'uri': 's3://bucket/image.png'}},
+        'detailLevel': 'DOCUMENT_IMAGE'  # All images use DOCUMENT_IMAGE for better understanding
+    }),
+    ('video.mp4', '.mp4'): _expected_model_input('video', {
+        'format': 'mp4',
+        'source': {'s3Location': {'uri': 's3://bucket/video.mp4'}},
+        'embeddingMode': 'AUDIO_VIDEO_COMBINED',
+        'segmentationConfig': {'durationSeconds': 5}
+    }),
+    ('audio.mp3', '.mp3'): _expected_model_input('audio', {
+        'format': 'mp3',
+        'source': {'s3Location': {'uri': 's3://bucket/audio.mp3'}},
+        'segmentationConfig': {'durationSeconds': 5}
+    }),
+    ('document.txt', '.txt'): _expected_model_input('text', {
+        'truncationMode': 'END',
+        'source': {'s3Location': {'uri': 's3://bucket/document.txt'}},
+        'segmentationConfig': {'maxLengthChars': 32000}
+    }),
+}
+
+
+# Remaining supported formats only differ in the format value:
+# (filename, extension, modality, expected format or None for text)
+SUPPORTED_FORMAT_CASES = (
+    ('photo.jpg', '.jpg', 'image', 'jpeg'),
+    ('photo.jpeg', '.jpeg', 'image', 'jpeg'),
+    ('animation.gif', '.gif', 'image', 'gif'),
+    ('image.webp', '.webp', 'image', 'webp'),
+    ('video.mov', '.mov', 'video', 'mov'),
+    ('video.mkv', '.mkv', 'video', 'mkv'),
+    ('video.webm', '.webm', 'video', 'webm'),
+    ('video.flv', '.flv', 'video', 'flv'),
+    ('video.mpeg', '.mpeg', 'video', 'mpeg'),
+    ('video.mpg', '.mpg', 'video', 'mpg'),
+    ('video.wmv', '.wmv', 'video', 'wmv'),
+    ('video.3gp', '.3gp', 'video', '3gp'),
+    ('audio.wav', '.wav', 'audio', 'wav'),
+    ('audio.ogg', '.ogg', 'audio', 'ogg'),
+    ('README.md', '.md', 'text', None),
+    ('data.json', '.json', 'text', None),
+    ('data.csv', '.csv', 'text', None),
+)
 
 
 class TestExtractS3Metadata:
@@ -32,7 +99,7 @@ class TestExtractS3Metadata:
         # Mock S3 response
         mock_s3.head_object.return_value = {
             'ContentLength': 1024000,
-            'LastModified': datetime(2024, 1, 15, 10, 30, 0),
+            'LastModified': LAST_MODIFIED,
             'ContentType': 'image/png'
         }
         
@@ -51,7 +118,7 @@ class TestExtractS3Metadata:
         """Test handling of missing ContentType"""
         mock_s3.head_object.return_value = {
             'ContentLength': 500,
-            'LastModified': datetime(2024, 1, 15, 10, 30, 0)
+            'LastModified': LAST_MODIFIED
         }
         
         result = processor.extract_s3_metadata('test-bucket', 'file.txt')
@@ -63,168 +130,40 @@ class TestCreateModelInput:
     """Tests for create_model_input function"""
     
     def _verify_base_structure(self, result):
-        """Helper to verify base structure is correct"""
+        """Helper to verify base structure is correct; returns segmentedEmbeddingParams"""
         assert result['schemaVersion'] == 'nova-multimodal-embed-v1'
         assert result['taskType'] == 'SEGMENTED_EMBEDDING'
         assert 'segmentedEmbeddingParams' in result
-        assert result['segmentedEmbeddingParams']['embeddingDimension'] == 3072
-        assert result['segmentedEmbeddingParams']['embeddingPurpose'] == 'GENERIC_INDEX'
-    
-    # IMAGE TESTS - All supported formats
-    def test_image_png(self):
-        """Test PNG image format"""
-        result = processor.create_model_input('bucket', 'image.png', '.png')
-        self._verify_base_structure(result)
-        
-        assert 'image' in result['segmentedEmbeddingParams']
-        image_config = result['segmentedEmbeddingParams']['image']
-        assert image_config['format'] == 'png'
-        assert image_config['source']['s3Location']['uri'] == 's3://bucket/image.png'
-        assert image_config['detailLevel'] == 'DOCUMENT_IMAGE'  # All images use DOCUMENT_IMAGE for better understanding
-    
-    def test_image_jpg(self):
-        """Test JPG image format"""
-        result = processor.create_model_input('bucket', 'photo.jpg', '.jpg')
-        self._verify_base_structure(result)
-        
-        image_config = result['segmentedEmbeddingParams']['image']
-        assert image_config['format'] == 'jpeg'
+        params = result['segmentedEmbeddingParams']
+        assert params['embeddingDimension'] == 3072
+        assert params['embeddingPurpose'] == 'GENERIC_INDEX'
+        return params
     
-    def test_image_jpeg(self):
-        """Test JPEG image format"""
-        result = processor.create_model_input('bucket', 'photo.jpeg', '.jpeg')
-        self._verify_base_structure(result)
+    @pytest.mark.parametrize(
+        "filename,ext",
+        list(EXPECTED_MODEL_INPUTS),
+        ids=[filename for filename, _ in EXPECTED_MODEL_INPUTS]
+    )
+    def test_exact_output(self, filename, ext):
+        """Test the full request for one representative file per modality"""
+        result = processor.create_model_input('bucket', filename, ext)
         
-        image_config = result['segmentedEmbeddingParams']['image']
-        assert image_config['format'] == 'jpeg'
+        assert result == EXPECTED_MODEL_INPUTS[(filename, ext)]
     
-    def test_image_gif(self):
-        """Test GIF image format"""
-        result = processor.create_model_input('bucket', 'animation.gif', '.gif')
-        self._verify_base_structure(result)
+    @pytest.mark.parametrize(
+        "filename,ext,modality,expected_format",
+        SUPPORTED_FORMAT_CASES,
+        ids=[case[0] for case in SUPPORTED_FORMAT_CASES]
+    )
+    def test_supported_format(self, filename, ext, modality, expected_format):
+        """Test each supported extension maps to its modality and format"""
+        result = processor.create_model_input('bucket', filename, ext)
+        params = self._verify_base_structure(result)
         
-        image_config = result['segmentedEmbeddingParams']['image']
-        assert image_config['format'] == 'gif'
-    
-    def test_image_webp(self):
-        """Test WebP image format"""
-        result = processor.create_model_input('bucket', 'image.webp', '.webp')
-        self._verify_base_structure(result)
-        
-        image_config = result['segmentedEmbeddingParams']['image']
-        assert image_config['format'] == 'webp'
-    
-    # VIDEO TESTS - All supported formats
-    def test_video_mp4(self):
-        """Test MP4 video format"""
-        result = processor.create_model_input('bucket', 'video.mp4', '.mp4')
-        self._verify_base_structure(result)
-        
-        assert 'video' in result['segmentedEmbeddingParams']
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'mp4'
-        assert video_config['source']['s3Location']['uri'] == 's3://bucket/video.mp4'
-        assert video_config['embeddingMode'] == 'AUDIO_VIDEO_COMBINED'
-        assert video_config['segmentationConfig']['durationSeconds'] == 5
-    
-    def test_video_mov(self):
-        """Test MOV video format"""
-        result = processor.create_model_input('bucket', 'video.mov', '.mov')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'mov'
-    
-    def test_video_mkv(self):
-        """Test MKV video format"""
-        result = processor.create_model_input('bucket', 'video.mkv', '.mkv')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'mkv'
-    
-    def test_video_webm(self):
-        """Test WebM video format"""
-        result = processor.create_model_input('bucket', 'video.webm', '.webm')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'webm'
-    
-    def test_video_flv(self):
-        """Test FLV video format"""
-        result = processor.create_model_input('bucket', 'video.flv', '.flv')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'flv'
-    
-    def test_video_mpeg(self):
-        """Test MPEG video format"""
-        result = processor.create_model_input('bucket', 'video.mpeg', '.mpeg')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'mpeg'
-    
-    def test_video_mpg(self):
-        """Test MPG video format"""
-        result = processor.create_model_input('bucket', 'video.mpg', '.mpg')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'mpg'
-    
-    def test_video_wmv(self):
-        """Test WMV video format"""
-        result = processor.create_model_input('bucket', 'video.wmv', '.wmv')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == 'wmv'
-    
-    def test_video_3gp(self):
-        """Test 3GP video format"""
-        result = processor.create_model_input('bucket', 'video.3gp', '.3gp')
-        video_config = result['segmentedEmbeddingParams']['video']
-        assert video_config['format'] == '3gp'
-    
-    # AUDIO TESTS - All supported formats
-    def test_audio_mp3(self):
-        """Test MP3 audio format"""
-        result = processor.create_model_input('bucket', 'audio.mp3', '.mp3')
-        self._verify_base_structure(result)
-        
-        assert 'audio' in result['segmentedEmbeddingParams']
-        audio_config = result['segmentedEmbeddingParams']['audio']
-        assert audio_config['format'] == 'mp3'
-        assert audio_config['source']['s3Location']['uri'] == 's3://bucket/audio.mp3'
-        assert audio_config['segmentationConfig']['durationSeconds'] == 5
-    
-    def test_audio_wav(self):
-        """Test WAV audio format"""
-        result = processor.create_model_input('bucket', 'audio.wav', '.wav')
-        audio_config = result['segmentedEmbeddingParams']['audio']
-        assert audio_config['format'] == 'wav'
-    
-    def test_audio_ogg(self):
-        """Test OGG audio format"""
-        result = processor.create_model_input('bucket', 'audio.ogg', '.ogg')
-        audio_config = result['segmentedEmbeddingParams']['audio']
-        assert audio_config['format'] == 'ogg'
-    
-    # TEXT TESTS - All supported formats
-    def test_text_txt(self):
-        """Test TXT text format"""
-        result = processor.create_model_input('bucket', 'document.txt', '.txt')
-        self._verify_base_structure(result)
-        
-        assert 'text' in result['segmentedEmbeddingParams']
-        text_config = result['segmentedEmbeddingParams']['text']
-        assert text_config['truncationMode'] == 'END'
-        assert text_config['source']['s3Location']['uri'] == 's3://bucket/document.txt'
-        assert text_config['segmentationConfig']['maxLengthChars'] == 32000
-    
-    def test_text_md(self):
-        """Test Markdown text format"""
-        result = processor.create_model_input('bucket', 'README.md', '.md')
-        assert 'text' in result['segmentedEmbeddingParams']
-    
-    def test_text_json(self):
-        """Test JSON text format"""
-        result = processor.create_model_input('bucket', 'data.json', '.json')
-        assert 'text' in result['segmentedEmbeddingParams']
-    
-    def test_text_csv(self):
-        """Test CSV text format"""
-        result = processor.create_model_input('bucket', 'data.csv', '.csv')
-        assert 'text' in result['segmentedEmbeddingParams']
+        modality_config = params[modality]
+        assert modality_config['source']['s3Location']['uri'] == f's3://bucket/{filename}'
+        if expected_format is not None:
+            assert modality_config['format'] == expected_format
     
     # NOTE: PDFs and .docx are handled specially in the handler
     # PDFs: converted to images first
@@ -315,6 +254,12 @@ class TestStartAsyncInvocation:
         call_args = mock_bedrock.start_async_invoke.call_args
         assert call_args[1]['modelInput'] == model_input
         assert call_args[1]['outputDataConfig']['s3OutputDataConfig']['s3Uri'] == output_uri
+    
+    def test_client_rate_limits_adaptively(self):
+        """Test the Bedrock client backs off on throttling instead of fixed sleeps"""
+        retries = processor.bedrock_runtime.meta.config.retries
+        
+        assert retries['mode'] == 'adaptive'
 
 
 class TestHandler:
@@ -326,15 +271,7 @@ class TestHandler:
     def test_successful_processing(self, mock_extract, mock_create, mock_start):
         """Test successful file processing"""
         # Setup mocks
-        mock_extract.return_value = {
-            'sourceS3Uri': 's3://test-bucket/test.jpg',
-            'fileName': 'test.jpg',
-            'fileType': '.jpg',
-            'fileSize': 1024,
-            'uploadTimestamp': '2024-01-15T10:30:00',
-            'contentType': 'image/jpeg',
-            'objectId': 'test_jpg_20240115103000'
-        }
+        mock_extract.return_value = dict(JPG_METADATA)
         
         mock_create.return_value = {'test': 'model_input'}
         mock_start.return_value = 'arn:aws:bedrock:us-east-1:123456789012:async-invoke/test123'
@@ -355,6 +292,38 @@ class TestHandler:
         assert 'metadata' in result
         assert 'outputS3Uri' in result
     
+    @patch.object(processor, 's3_client')
+    @patch.object(processor, 'start_async_invocation')
+    @patch.object(processor, 'convert_pdf_to_images')
+    @patch.object(processor, 'extract_s3_metadata')
+    def test_pdf_writes_page_manifest(self, mock_extract, mock_convert, mock_start, mock_s3):
+        """Test PDF pages are written to an S3 manifest instead of the state payload"""
+        mock_extract.return_value = {
+            'sourceS3Uri': 's3://test-bucket/doc.pdf',
+            'fileName': 'doc.pdf',
+            'fileType': '.pdf',
+            'objectId': 'doc_pdf_20240115103000'
+        }
+        mock_convert.return_value = [
+            's3://test-output-bucket/pdf-pages/doc_pdf_20240115103000/page_1.png',
+            's3://test-output-bucket/pdf-pages/doc_pdf_20240115103000/page_2.png'
+        ]
+        mock_start.side_effect = ['arn:page1', 'arn:page2']
+        
+        result = processor.handler({'bucket': 'test-bucket', 'key': 'doc.pdf'}, None)
+        
+        assert result['status'] == 'IN_PROGRESS'
+        assert result['totalPages'] == 2
+        assert 'pdfPages' not in result
+        assert result['pdfPagesManifestKey'] == 'pdf-pages/doc_pdf_20240115103000/pages-manifest.json'
+        
+        put_kwargs = mock_s3.put_object.call_args.kwargs
+        assert put_kwargs['Bucket'] == 'test-output-bucket'
+        assert put_kwargs['Key'] == result['pdfPagesManifestKey']
+        pages = json.loads(put_kwargs['Body'])
+        assert [p['invocationArn'] for p in pages] == ['arn:page1', 'arn:page2']
+        assert pages[1]['metadata']['objectId'] == 'doc_pdf_20240115103000_page_2'
+    
     @patch.object(processor, 'extract_s3_metadata')
     def test_error_handling(self, mock_extract):
         """Test error handling in handler"""
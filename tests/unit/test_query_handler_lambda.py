@@ -3,57 +3,52 @@ Unit tests for Lambda: Query Handler
 """
 
 import pytest
+import base64
+import gzip
 import json
 import sys
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
-import importlib.util
-
-# Set required environment variables before importing
-os.environ['VECTOR_BUCKET'] = 'test-vector-bucket'
-os.environ['EMBEDDING_MODEL_ID'] = 'amazon.nova-2-multimodal-embeddings-v1:0'
-os.environ['LLM_MODEL_ID'] = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
-os.environ['DEFAULT_DIMENSION'] = '1024'
-os.environ['DEFAULT_K'] = '5'
-os.environ['HIERARCHICAL_ENABLED'] = 'true'
-os.environ['HIERARCHICAL_CONFIG'] = json.dumps({
-    'first_pass_dimension': 256,
-    'first_pass_k': 20,
-    'second_pass_dimension': 1024,
-    'second_pass_k': 5
-})
-os.environ['VECTOR_INDEXES'] = json.dumps({
-    '256': 'embeddings-256d',
-    '384': 'embeddings-384d',
-    '1024': 'embeddings-1024d',
-    '3072': 'embeddings-3072d'
-})
-os.environ['LLM_MAX_TOKENS'] = '2048'
-os.environ['LLM_TEMPERATURE'] = '0.7'
-
-# Import the query_handler module directly
-query_handler_path = os.path.join(os.path.dirname(__file__), '../../lambda/chatbot/query_handler/index.py')
-spec = importlib.util.spec_from_file_location("query_handler", query_handler_path)
-query_handler = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(query_handler)
+from botocore.exceptions import ClientError
+
+# lambda/chatbot is on pythonpath (pytest.ini); environment variables are set in conftest.py
+from query_handler import index as query_handler
+
+
+def _embedding_response():
+    """Fresh invoke_model response for a 1024-dim text embedding"""
+    return {
+        'body': Mock(read=lambda: json.dumps({
+            'embeddings': [
+                {
+                    'embeddingType': 'TEXT',
+                    'embedding': [0.1] * 1024
+                }
+            ]
+        }).encode())
+    }
+
+
+def _ranged_get(data, **extra):
+    """get_object side effect that returns the requested byte Range of data"""
+    def get_object(Range, **kwargs):
+        first, last = Range[len('bytes='):].split('-')
+        chunk = data[int(first):int(last) + 1]
+        return {'Body': Mock(read=lambda: chunk), **extra}
+    return get_object
 
 
 class TestEmbedQuery:
     """Tests for embed_query function"""
     
+    def setup_method(self):
+        query_handler._embed_query_cached.cache_clear()
+    
     @patch.object(query_handler, 'bedrock_runtime')
     def test_embeds_query(self, mock_bedrock):
         """Test query embedding"""
-        mock_bedrock.invoke_model.return_value = {
-            'body': Mock(read=lambda: json.dumps({
-                'embeddings': [
-                    {
-                        'embeddingType': 'TEXT',
-                        'embedding': [0.1] * 1024
-                    }
-                ]
-            }).encode())
-        }
+        mock_bedrock.invoke_model.return_value = _embedding_response()
         
         result = query_handler.embed_query("test query", 1024)
         
@@ -69,6 +64,21 @@ class TestEmbedQuery:
         assert body['singleEmbeddingParams']['embeddingPurpose'] == 'GENERIC_RETRIEVAL'
         assert body['singleEmbeddingParams']['embeddingDimension'] == 1024
         assert body['singleEmbeddingParams']['text']['value'] == 'test query'
+    
+    @patch.object(query_handler, 'bedrock_runtime')
+    def test_caches_repeated_query(self, mock_bedrock):
+        """Test a repeated query and dimension reuses the first embedding"""
+        mock_bedrock.invoke_model.side_effect = lambda **kwargs: _embedding_response()
+        
+        first = query_handler.embed_query("test query", 1024)
+        first.append(0.0)  # callers get their own list
+        second = query_handler.embed_query("test query", 1024)
+        
+        assert len(second) == 1024
+        assert mock_bedrock.invoke_model.call_count == 1
+        
+        query_handler.embed_query("test query", 256)
+        assert mock_bedrock.invoke_model.call_count == 2
 
 
 class TestCosineSimilarity:
@@ -100,6 +110,64 @@ class TestCosineSimilarity:
         vec2 = [1.0, 2.0, 3.0]
         similarity = query_handler.cosine_similarity(vec1, vec2)
         assert similarity == 0.0
+    
+    @pytest.mark.parametrize("vec1,vec2", [
+        ([1.0, 2.0, 3.0], [1.0, 2.0, 3.0]),
+        ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0]),
+        ([1.0, 2.0, 3.0], [-1.0, -2.0, -3.0]),
+    ], ids=['identical', 'orthogonal', 'opposite'])
+    def test_normalized_dot_equals_cosine(self, vec1, vec2):
+        """Test the dot product of pre-normalized vectors matches cosine similarity"""
+        similarity = query_handler.dot_product(
+            query_handler.normalize(vec1),
+            query_handler.normalize(vec2)
+        )
+        assert abs(similarity - query_handler.cosine_similarity(vec1, vec2)) < 1e-6
+
+
+class TestRerankResults:
+    """Tests for rerank_results function"""
+    
+    def test_matches_cosine_ranking(self):
+        """Test dot-product scores on unit-norm vectors equal cosine similarity"""
+        query = [3.0, 4.0]
+        results = [
+            {'embedding': [1.0, 0.0], 'metadata': {'id': 'a'}},
+            {'embedding': [0.6, 0.8], 'metadata': {'id': 'b'}},
+            {'embedding': [0.0, 2.0, 5.0], 'metadata': {'id': 'c'}}
+        ]
+        
+        reranked = query_handler.rerank_results(results, query, 3)
+        
+        assert [r['metadata']['id'] for r in reranked] == ['b', 'c', 'a']
+        for r, stored in zip(reranked, [[0.6, 0.8], [0.0, 2.0], [1.0, 0.0]]):
+            expected = query_handler.cosine_similarity(query, stored)
+            assert abs(r['similarity'] - expected) < 1e-6
+    
+    def test_falls_back_without_embedding(self):
+        """Test results without stored vectors keep their search similarity"""
+        results = [{'similarity': 0.7, 'metadata': {'id': 'a'}}]
+        
+        reranked = query_handler.rerank_results(results, [1.0, 0.0], 1)
+        
+        assert reranked == [{'similarity': 0.7, 'metadata': {'id': 'a'}}]
+    
+    def test_top_k_matches_full_sort(self, rng_pool):
+        """Test the selected top k equals the first k of a full sort"""
+        query = rng_pool[0][:256].tolist()
+        results = [
+            {'embedding': row[:256].tolist(), 'metadata': {'id': i}}
+            for i, row in enumerate(rng_pool[1:])
+        ]
+        
+        reranked = query_handler.rerank_results(results, query, 5)
+        
+        expected = sorted(
+            results,
+            key=lambda r: query_handler.cosine_similarity(query, r['embedding']),
+            reverse=True
+        )[:5]
+        assert [r['metadata'] for r in reranked] == [r['metadata'] for r in expected]
 
 
 class TestFormatPrompt:
@@ -150,9 +218,25 @@ class TestFormatPrompt:
         assert "Answer:" in prompt
 
 
+class TestParseS3Uri:
+    """Tests for parse_s3_uri function"""
+    
+    def test_splits_bucket_and_key(self):
+        """Test nested keys are kept whole"""
+        assert query_handler.parse_s3_uri('s3://bucket/docs/a/file.txt') == ('bucket', 'docs/a/file.txt')
+    
+    @pytest.mark.parametrize("source_uri", ['', None, 'invalid-uri', 's3://bucket', 's3://bucket/'])
+    def test_rejects_non_object_uris(self, source_uri):
+        """Test anything without a bucket and key is rejected"""
+        assert query_handler.parse_s3_uri(source_uri) == (None, None)
+
+
 class TestGetTextContent:
     """Tests for get_text_content function"""
     
+    def setup_method(self):
+        query_handler._text_cache.clear()
+    
     @patch.object(query_handler, 's3_client')
     def test_retrieves_full_text(self, mock_s3):
         """Test retrieving full text content"""
@@ -181,6 +265,44 @@ class TestGetTextContent:
         
         assert len(content) == 100
         assert content == full_text[:100]
+        
+        # Only the prefix that can contain the segment is downloaded
+        mock_s3.get_object.assert_called_once_with(
+            Bucket='bucket', Key='file.txt', Range='bytes=0-399'
+        )
+    
+    @patch.object(query_handler, 's3_client')
+    def test_retrieves_multibyte_text_segment(self, mock_s3):
+        """Test segment character positions are applied to decoded text, not bytes"""
+        full_text = "a" + "é" * 100  # 2 bytes per é
+        # The 80-byte range S3 returns ends mid-character
+        mock_s3.get_object.side_effect = _ranged_get(full_text.encode())
+        
+        metadata = {
+            'segmentStartCharPosition': '10',
+            'segmentEndCharPosition': '20'
+        }
+        content = query_handler.get_text_content('s3://bucket/file.txt', metadata)
+        
+        assert content == full_text[10:20]
+        mock_s3.get_object.assert_called_once_with(
+            Bucket='bucket', Key='file.txt', Range='bytes=0-79'
+        )
+    
+    @patch.object(query_handler, 's3_client')
+    def test_ascii_segment_after_multibyte_text(self, mock_s3):
+        """Test an ASCII segment after multibyte characters is not shifted"""
+        full_text = "日本語のテキスト" * 10 + "The segment in English."  # 80 chars in 240 bytes
+        mock_s3.get_object.side_effect = _ranged_get(full_text.encode())
+        
+        metadata = {
+            'segmentStartCharPosition': '80',
+            'segmentEndCharPosition': str(len(full_text))
+        }
+        content = query_handler.get_text_content('s3://bucket/file.txt', metadata)
+        
+        assert content == "The segment in English."
+        mock_s3.get_object.assert_called_once()
     
     @patch.object(query_handler, 's3_client')
     def test_truncates_long_text(self, mock_s3):
@@ -195,6 +317,35 @@ class TestGetTextContent:
         
         assert len(content) < 5000
         assert "truncated" in content.lower()
+        
+        # The read stops after the characters that can be kept
+        assert mock_s3.get_object.call_args[1]['Range'] == 'bytes=0-8003'
+    
+    @patch.object(query_handler, 's3_client')
+    def test_segment_cached_on_repeat(self, mock_s3):
+        """Test an unchanged segment is revalidated instead of re-read"""
+        full_text = "0123456789" * 100
+        not_modified = ClientError(
+            {'Error': {'Code': '304', 'Message': 'Not Modified'}, 'ResponseMetadata': {'HTTPStatusCode': 304}},
+            'GetObject'
+        )
+        responses = [_ranged_get(full_text.encode(), ETag='"abc"'), not_modified]
+        
+        def get_object(**kwargs):
+            response = responses.pop(0)
+            if isinstance(response, ClientError):
+                raise response
+            return response(**kwargs)
+        
+        mock_s3.get_object.side_effect = get_object
+        metadata = {'segmentStartCharPosition': '100', 'segmentEndCharPosition': '200'}
+        
+        first = query_handler.get_text_content('s3://bucket/file.txt', metadata)
+        second = query_handler.get_text_content('s3://bucket/file.txt', metadata)
+        
+        assert first == second == full_text[100:200]
+        assert mock_s3.get_object.call_args[1]['IfNoneMatch'] == '"abc"'
+        assert mock_s3.get_object.call_args[1]['Range'] == 'bytes=0-799'
     
     def test_handles_invalid_uri(self):
         """Test handling of invalid S3 URI"""
@@ -256,11 +407,40 @@ class TestCallClaudeMultimodal:
         assert body['messages'][0]['role'] == 'user'
         assert isinstance(body['messages'][0]['content'], list)
         assert len(body['messages'][0]['content']) == 2
+        assert 'cache_control' not in body['messages'][0]['content'][0]
+    
+    @patch.object(query_handler, 'LLM_PROMPT_CACHE', True)
+    @patch.object(query_handler, 'bedrock_runtime_llm')
+    def test_call_claude_uses_prompt_cache(self, mock_bedrock_llm):
+        """Test the last image block is marked as the prompt cache point"""
+        mock_bedrock_llm.invoke_model.return_value = {
+            'body': Mock(read=lambda: json.dumps({
+                'content': [{'text': 'Answer'}]
+            }).encode())
+        }
+        image = {
+            "type": "image",
+            "source": {"type": "base64", "media_type": "image/png", "data": "aW1n"}
+        }
+        content_blocks = [image, dict(image), {"type": "text", "text": "test prompt"}]
+        
+        query_handler.call_claude_multimodal(content_blocks)
+        
+        body = json.loads(mock_bedrock_llm.invoke_model.call_args[1]['body'])
+        content = body['messages'][0]['content']
+        assert 'cache_control' not in content[0]
+        assert content[1]['cache_control'] == {'type': 'ephemeral'}
+        assert 'cache_control' not in content[2]
+        # The caller's blocks are left as they were
+        assert 'cache_control' not in content_blocks[1]
 
 
 class TestFetchImageFromS3:
     """Tests for fetch_image_from_s3 function"""
     
+    def setup_method(self):
+        query_handler._image_cache.clear()
+    
     @patch.object(query_handler, 's3_client')
     def test_fetches_image_successfully(self, mock_s3):
         """Test successful image fetch"""
@@ -271,9 +451,30 @@ class TestFetchImageFromS3:
         
         result = query_handler.fetch_image_from_s3('s3://bucket/image.jpg')
         
-        assert result == image_data
+        assert result == base64.b64encode(image_data).decode('utf-8')
         mock_s3.get_object.assert_called_once_with(Bucket='bucket', Key='image.jpg')
     
+    @patch.object(query_handler, 's3_client')
+    def test_cached_on_repeat(self, mock_s3):
+        """Test an unchanged image is served from cache after a conditional GET"""
+        image_data = b"fake image data"
+        mock_s3.get_object.side_effect = [
+            {'Body': Mock(read=lambda: image_data), 'ETag': '"abc123"'},
+            ClientError(
+                {'Error': {'Code': '304', 'Message': 'Not Modified'},
+                 'ResponseMetadata': {'HTTPStatusCode': 304}},
+                'GetObject'
+            )
+        ]
+        
+        first = query_handler.fetch_image_from_s3('s3://bucket/page.png')
+        second = query_handler.fetch_image_from_s3('s3://bucket/page.png')
+        
+        assert second == first == base64.b64encode(image_data).decode('utf-8')
+        assert mock_s3.get_object.call_args_list[1][1] == {
+            'Bucket': 'bucket', 'Key': 'page.png', 'IfNoneMatch': '"abc123"'
+        }
+    
     def test_handles_invalid_uri(self):
         """Test handling of invalid S3 URI"""
         result = query_handler.fetch_image_from_s3('invalid-uri')
@@ -290,14 +491,19 @@ class TestFetchImageFromS3:
     @patch.object(query_handler, 's3_client')
     def test_rejects_oversized_image(self, mock_s3):
         """Test rejection of images over 5MB"""
-        # Create 6MB of fake data
-        large_image = b"x" * (6 * 1024 * 1024)
+        # 6MB object, rejected from its Content-Length header
+        mock_body = Mock()
         mock_s3.get_object.return_value = {
-            'Body': Mock(read=lambda: large_image)
+            'Body': mock_body,
+            'ContentLength': 6 * 1024 * 1024
         }
         
         result = query_handler.fetch_image_from_s3('s3://bucket/large.jpg')
         assert result is None
+        
+        # The body is never downloaded
+        mock_body.read.assert_not_called()
+        mock_body.close.assert_called_once()
 
 
 class TestPrepareMultimodalContent:
@@ -307,7 +513,7 @@ class TestPrepareMultimodalContent:
     @patch.object(query_handler, 'get_text_content')
     def test_prepares_mixed_content(self, mock_get_text, mock_fetch_image):
         """Test preparing multimodal content with images and text"""
-        mock_fetch_image.return_value = b"fake image data"
+        mock_fetch_image.return_value = "ZmFrZSBpbWFnZSBkYXRh"
         mock_get_text.return_value = "Text content here"
         
         sources = [
@@ -344,7 +550,7 @@ class TestPrepareMultimodalContent:
     @patch.object(query_handler, 'fetch_image_from_s3')
     def test_handles_regular_images(self, mock_fetch_image):
         """Test handling regular images (not PDF pages)"""
-        mock_fetch_image.return_value = b"fake image data"
+        mock_fetch_image.return_value = "ZmFrZSBpbWFnZSBkYXRh"
         
         sources = [
             {
@@ -404,7 +610,7 @@ class TestPrepareMultimodalContent:
     @patch.object(query_handler, 'get_text_content')
     def test_handles_all_modalities(self, mock_get_text, mock_fetch_image):
         """Test handling all content types together"""
-        mock_fetch_image.return_value = b"fake image data"
+        mock_fetch_image.return_value = "ZmFrZSBpbWFnZSBkYXRh"
         mock_get_text.return_value = "Text content"
         
         sources = [
@@ -449,6 +655,44 @@ class TestPrepareMultimodalContent:
         assert 'Text content' in result[1]['text']
         assert 'video.mp4' in result[1]['text']
         assert '0.0s - 5.0s' in result[1]['text']
+    
+    @patch.object(query_handler, 'fetch_image_from_s3')
+    @patch.object(query_handler, 'get_text_content')
+    def test_parallel_fetches(self, mock_get_text, mock_fetch_image):
+        """Test S3 fetches run concurrently and blocks keep source order"""
+        # Each fetch waits until all three are in flight; sequential fetches would time out
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def fetch_image(source_uri):
+            barrier.wait()
+            return source_uri
+        
+        def get_text(source_uri, metadata):
+            barrier.wait()
+            return f"Content of {metadata['fileName']}"
+        
+        mock_fetch_image.side_effect = fetch_image
+        mock_get_text.side_effect = get_text
+        
+        sources = [
+            {'metadata': {'fileName': 'a.png', 'modalityType': 'IMAGE', 'sourceS3Uri': 's3://bucket/a.png'}},
+            {'metadata': {'fileName': 'notes.txt', 'modalityType': 'TEXT', 'sourceS3Uri': 's3://bucket/notes.txt'}},
+            {'metadata': {'fileName': 'b.jpg', 'modalityType': 'IMAGE', 'sourceS3Uri': 's3://bucket/b.jpg'}}
+        ]
+        
+        result = query_handler.prepare_multimodal_content("test query", sources)
+        
+        assert [block['type'] for block in result] == ['image', 'image', 'text']
+        assert result[0]['source']['media_type'] == 'image/png'
+        assert result[1]['source']['media_type'] == 'image/jpeg'
+        assert 'Content of notes.txt' in result[2]['text']
+    
+    def test_s3_pool_fits_fetch_workers(self):
+        """Test the S3 client keeps a live connection for every fetch worker"""
+        config = query_handler.s3_client.meta.config
+        
+        assert config.max_pool_connections >= query_handler.MAX_FETCH_WORKERS
+        assert config.tcp_keepalive is True
 
 
 class TestFormatSources:
@@ -547,6 +791,37 @@ class TestCreateResponse:
         assert body['error'] == 'Something went wrong'
 
 
+class TestCompressResponse:
+    """Tests for compress_response function"""
+    
+    def test_gzips_large_body(self):
+        """Test large bodies are gzipped and base64 encoded for gzip clients"""
+        response = query_handler.create_response(200, {'answer': 'word ' * 1000})
+        
+        result = query_handler.compress_response(response, 'gzip, deflate, br')
+        
+        assert result['isBase64Encoded'] is True
+        assert result['headers']['Content-Encoding'] == 'gzip'
+        assert result['headers']['Access-Control-Allow-Origin'] == '*'
+        assert len(result['body']) < len(response['body'])
+        body = json.loads(gzip.decompress(base64.b64decode(result['body'])))
+        assert body['answer'] == 'word ' * 1000
+        # The cached response is left uncompressed
+        assert 'Content-Encoding' not in response['headers']
+    
+    def test_skips_small_body(self):
+        """Test small bodies are returned as plain JSON"""
+        response = query_handler.create_response(200, {'answer': 'short'})
+        
+        assert query_handler.compress_response(response, 'gzip') is response
+    
+    def test_skips_client_without_gzip(self):
+        """Test clients that don't accept gzip get plain JSON"""
+        response = query_handler.create_response(200, {'answer': 'word ' * 1000})
+        
+        assert query_handler.compress_response(response, '') is response
+
+
 class TestCreateNoResultsResponse:
     """Tests for create_no_results_response function"""
     
@@ -571,6 +846,9 @@ class TestCreateNoResultsResponse:
 class TestHandler:
     """Tests for main handler function"""
     
+    def setup_method(self):
+        query_handler._response_cache.clear()
+    
     @patch.object(query_handler, 'call_claude_multimodal')
     @patch.object(query_handler, 'prepare_multimodal_content')
     @patch.object(query_handler, 'simple_search')
@@ -677,6 +955,57 @@ class TestHandler:
         assert result['statusCode'] == 500
         body = json.loads(result['body'])
         assert 'error' in body
+    
+    @patch.object(query_handler, 'call_claude_multimodal')
+    @patch.object(query_handler, 'prepare_multimodal_content')
+    @patch.object(query_handler, 'simple_search')
+    @patch.object(query_handler, 'embed_query')
+    def test_repeat_query_served_from_cache(self, mock_embed, mock_search, mock_prepare, mock_claude):
+        """Test identical payloads skip embedding, search and the LLM"""
+        mock_embed.return_value = [0.1] * 1024
+        mock_search.return_value = [
+            {'metadata': {'fileName': 'test.txt', 'modalityType': 'TEXT'}, 'similarity': 0.9}
+        ]
+        mock_prepare.return_value = [{"type": "text", "text": "test prompt"}]
+        mock_claude.return_value = 'Cached answer.'
+        
+        first = query_handler.handler({'body': json.dumps({'query': 'what is X?', 'hierarchical': False})}, None)
+        # Same payload with a different key order hits the cache
+        second = query_handler.handler({'body': json.dumps({'hierarchical': False, 'query': 'what is X?'})}, None)
+        
+        assert second == first
+        assert mock_embed.call_count == 1
+        assert mock_claude.call_count == 1
+    
+    @patch.object(query_handler, 'call_claude_multimodal')
+    @patch.object(query_handler, 'prepare_multimodal_content')
+    @patch.object(query_handler, 'simple_search')
+    @patch.object(query_handler, 'embed_query')
+    def test_no_cache_header_bypasses_cache(self, mock_embed, mock_search, mock_prepare, mock_claude):
+        """Test Cache-Control: no-cache always runs the full query"""
+        mock_embed.return_value = [0.1] * 1024
+        mock_search.return_value = [
+            {'metadata': {'fileName': 'test.txt', 'modalityType': 'TEXT'}, 'similarity': 0.9}
+        ]
+        mock_prepare.return_value = [{"type": "text", "text": "test prompt"}]
+        mock_claude.return_value = 'Fresh answer.'
+        event = {
+            'headers': {'cache-control': 'no-cache'},
+            'body': json.dumps({'query': 'what is X?', 'hierarchical': False})
+        }
+        
+        query_handler.handler(event, None)
+        query_handler.handler(event, None)
+        
+        assert mock_claude.call_count == 2
+        assert query_handler._response_cache == {}
+    
+    def test_expired_entry_is_dropped(self):
+        """Test cached responses are not served after the TTL"""
+        query_handler._response_cache['key'] = (0.0, {'statusCode': 200})
+        
+        assert query_handler.get_cached_response('key') is None
+        assert 'key' not in query_handler._response_cache
 
 
 if __name__ == '__main__':
@@ -8,132 +8,95 @@ import pytest
 import json
 import os
 from unittest.mock import Mock, patch, MagicMock
-import importlib.util
 
-# Set required environment variables
-os.environ['VECTOR_BUCKET'] = 'test-vector-bucket'
-os.environ['EMBEDDING_MODEL_ID'] = 'amazon.nova-2-multimodal-embeddings-v1:0'
-os.environ['LLM_MODEL_ID'] = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
-os.environ['DEFAULT_DIMENSION'] = '1024'
-os.environ['DEFAULT_K'] = '5'
-os.environ['HIERARCHICAL_ENABLED'] = 'false'
-os.environ['HIERARCHICAL_CONFIG'] = '{}'
-os.environ['VECTOR_INDEXES'] = json.dumps({
-    '256': 'embeddings-256d',
-    '384': 'embeddings-384d',
-    '1024': 'embeddings-1024d',
-    '3072': 'embeddings-3072d'
-})
-os.environ['LLM_MAX_TOKENS'] = '2048'
-os.environ['LLM_TEMPERATURE'] = '0.7'
-
-# Import query handler
-query_handler_path = os.path.join(os.path.dirname(__file__), '../../lambda/chatbot/query_handler/index.py')
-spec = importlib.util.spec_from_file_location("query_handler", query_handler_path)
-query_handler = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(query_handler)
+# lambda/chatbot is on pythonpath (pytest.ini); environment variables are set in conftest.py
+# (shared with the query handler tests, so the handler only executes once)
+from query_handler import index as query_handler
 
 
 class TestS3VectorsQueryAPI:
     """Tests for S3 Vectors query_vectors API integration"""
     
-    @patch.object(query_handler, 's3_client')
-    def test_query_vectors_api_called_correctly(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_query_vectors_api_called_correctly(self, mock_s3vectors):
         """Test that query_vectors API is called with correct parameters"""
-        # Setup mock response
-        mock_s3.query_vectors.return_value = {
-            'Vectors': [
+        # Metadata comes back inline with each match; no per-result S3 reads
+        mock_s3vectors.query_vectors.return_value = {
+            'vectors': [
                 {
-                    'Key': 'embeddings-1024d/test_file_segment_0.json',
-                    'Distance': 0.05  # Low distance = high similarity
+                    'key': 'test_file_segment_0',
+                    'distance': 0.1,  # Low distance = high similarity
+                    'metadata': {
+                        'fileName': 'test.jpg',
+                        'modalityType': 'IMAGE'
+                    }
                 }
             ]
         }
         
-        # Mock get_object for metadata retrieval
-        mock_s3.get_object.return_value = {
-            'Body': Mock(read=lambda: json.dumps({
-                'vector': [0.1] * 1024,
-                'metadata': {
-                    'fileName': 'test.jpg',
-                    'modalityType': 'IMAGE'
-                }
-            }).encode())
-        }
-        
         # Call search function
         query_embedding = [0.1] * 1024
         results = query_handler.search_s3_vector_index('embeddings-1024d', query_embedding, 5)
         
         # Verify query_vectors was called
-        mock_s3.query_vectors.assert_called_once_with(
-            Bucket='test-vector-bucket',
-            IndexName='embeddings-1024d',
-            QueryVector=query_embedding,
-            MaxResults=5,
-            DistanceMetric='cosine'
+        mock_s3vectors.query_vectors.assert_called_once_with(
+            vectorBucketName='test-vector-bucket',
+            indexName='embeddings-1024d',
+            queryVector={'float32': query_embedding},
+            topK=5,
+            returnMetadata=True,
+            returnDistance=True
         )
         
         # Verify results
         assert len(results) == 1
-        assert results[0]['similarity'] == 0.95  # 1 - 0.05 distance
+        assert results[0]['similarity'] == 0.95  # 1 - 0.1 / 2
         assert results[0]['metadata']['fileName'] == 'test.jpg'
     
-    @patch.object(query_handler, 's3_client')
-    def test_handles_multiple_results(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_handles_multiple_results(self, mock_s3vectors):
         """Test handling multiple results from S3 Vectors"""
-        mock_s3.query_vectors.return_value = {
-            'Vectors': [
-                {'Key': 'embeddings-1024d/file1_segment_0.json', 'Distance': 0.1},
-                {'Key': 'embeddings-1024d/file2_segment_0.json', 'Distance': 0.2},
-                {'Key': 'embeddings-1024d/file3_segment_0.json', 'Distance': 0.3}
+        mock_s3vectors.query_vectors.return_value = {
+            'vectors': [
+                {'key': 'file1_segment_0', 'distance': 0.2, 'metadata': {'fileName': 'file1.jpg'}},
+                {'key': 'file2_segment_0', 'distance': 0.4, 'metadata': {'fileName': 'file2.jpg'}},
+                {'key': 'file3_segment_0', 'distance': 0.6, 'metadata': {'fileName': 'file3.jpg'}}
             ]
         }
         
-        # Mock get_object for each result
-        def mock_get_object(Bucket, Key):
-            file_num = '1' if 'file1' in Key else ('2' if 'file2' in Key else '3')
-            return {
-                'Body': Mock(read=lambda: json.dumps({
-                    'vector': [0.1] * 1024,
-                    'metadata': {'fileName': f'file{file_num}.jpg'}
-                }).encode())
-            }
-        
-        mock_s3.get_object.side_effect = mock_get_object
-        
         results = query_handler.search_s3_vector_index('embeddings-1024d', [0.1] * 1024, 5)
         
         assert len(results) == 3
-        assert results[0]['similarity'] == 0.9  # 1 - 0.1
-        assert results[1]['similarity'] == 0.8  # 1 - 0.2
-        assert results[2]['similarity'] == 0.7  # 1 - 0.3
+        assert results[0]['similarity'] == pytest.approx(0.9)  # 1 - 0.2 / 2
+        assert results[1]['similarity'] == pytest.approx(0.8)  # 1 - 0.4 / 2
+        assert results[2]['similarity'] == pytest.approx(0.7)  # 1 - 0.6 / 2
+        assert [r['metadata']['fileName'] for r in results] == ['file1.jpg', 'file2.jpg', 'file3.jpg']
     
-    @patch.object(query_handler, 's3_client')
-    def test_handles_empty_results(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_handles_empty_results(self, mock_s3vectors):
         """Test handling empty results from S3 Vectors"""
-        mock_s3.query_vectors.return_value = {'Vectors': []}
+        mock_s3vectors.query_vectors.return_value = {'vectors': []}
         
         results = query_handler.search_s3_vector_index('embeddings-1024d', [0.1] * 1024, 5)
         
         assert len(results) == 0
     
-    @patch.object(query_handler, 's3_client')
-    def test_handles_query_vectors_error(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_handles_query_vectors_error(self, mock_s3vectors):
         """Test error handling when query_vectors fails"""
-        mock_s3.query_vectors.side_effect = Exception("S3 Vectors API error")
+        mock_s3vectors.query_vectors.side_effect = Exception("S3 Vectors API error")
         
         results = query_handler.search_s3_vector_index('embeddings-1024d', [0.1] * 1024, 5)
         
         # Should return empty list on error
         assert len(results) == 0
     
-    @patch.object(query_handler, 's3_client')
-    def test_works_with_all_dimensions(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_works_with_all_dimensions(self, mock_s3vectors):
         """Test that query_vectors works with all MRL dimensions"""
         for dim in [256, 384, 1024, 3072]:
-            mock_s3.reset_mock()
-            mock_s3.query_vectors.return_value = {'Vectors': []}
+            mock_s3vectors.reset_mock()
+            mock_s3vectors.query_vectors.return_value = {'vectors': []}
             
             index_name = f'embeddings-{dim}d'
             query_embedding = [0.1] * dim
@@ -141,39 +104,46 @@ class TestS3VectorsQueryAPI:
             query_handler.search_s3_vector_index(index_name, query_embedding, 5)
             
             # Verify called with correct dimension
-            call_args = mock_s3.query_vectors.call_args
-            assert call_args[1]['IndexName'] == index_name
-            assert len(call_args[1]['QueryVector']) == dim
+            call_args = mock_s3vectors.query_vectors.call_args
+            assert call_args[1]['indexName'] == index_name
+            assert len(call_args[1]['queryVector']['float32']) == dim
     
-    @patch.object(query_handler, 's3_client')
-    def test_distance_to_similarity_conversion(self, mock_s3):
+    @patch.object(query_handler, 's3vectors_client')
+    def test_distance_to_similarity_conversion(self, mock_s3vectors):
         """Test that cosine distance is correctly converted to similarity"""
         test_cases = [
             (0.0, 1.0),   # Distance 0 = Similarity 1 (identical)
-            (0.1, 0.9),   # Distance 0.1 = Similarity 0.9
-            (0.5, 0.5),   # Distance 0.5 = Similarity 0.5
-            (1.0, 0.0),   # Distance 1 = Similarity 0 (opposite)
+            (0.2, 0.9),   # Distance 0.2 = Similarity 0.9
+            (1.0, 0.5),   # Distance 1 = Similarity 0.5 (orthogonal)
+            (2.0, 0.0),   # Distance 2 = Similarity 0 (opposite)
         ]
         
         for distance, expected_similarity in test_cases:
-            mock_s3.reset_mock()
-            mock_s3.query_vectors.return_value = {
-                'Vectors': [
-                    {'Key': 'embeddings-1024d/test_segment_0.json', 'Distance': distance}
+            mock_s3vectors.reset_mock()
+            mock_s3vectors.query_vectors.return_value = {
+                'vectors': [
+                    {'key': 'test_segment_0', 'distance': distance, 'metadata': {'fileName': 'test.jpg'}}
                 ]
             }
             
-            mock_s3.get_object.return_value = {
-                'Body': Mock(read=lambda: json.dumps({
-                    'vector': [0.1] * 1024,
-                    'metadata': {'fileName': 'test.jpg'}
-                }).encode())
-            }
-            
             results = query_handler.search_s3_vector_index('embeddings-1024d', [0.1] * 1024, 5)
             
             assert len(results) == 1
             assert abs(results[0]['similarity'] - expected_similarity) < 0.001
+    
+    @patch.object(query_handler, 's3vectors_client')
+    def test_hierarchical_first_pass_skips_metadata(self, mock_s3vectors):
+        """Test that only the final pass of hierarchical search returns metadata"""
+        mock_s3vectors.query_vectors.return_value = {'vectors': []}
+        
+        query_handler.hierarchical_search([0.1] * 1024, 5)
+        
+        calls = mock_s3vectors.query_vectors.call_args_list
+        assert [c[1]['indexName'] for c in calls] == ['embeddings-256d', 'embeddings-1024d']
+        assert calls[0][1]['topK'] == 20
+        assert calls[0][1]['returnMetadata'] is False
+        assert calls[1][1]['topK'] == 5
+        assert calls[1][1]['returnMetadata'] is True
 
 
 class TestURLEncoding:
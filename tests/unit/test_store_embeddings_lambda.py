@@ -6,41 +6,81 @@ import pytest
 import json
 import sys
 import os
+from io import BytesIO
 from unittest.mock import Mock, patch, MagicMock, call
 import numpy as np
-import importlib.util
 
-# Set required environment variables before importing
-os.environ['VECTOR_BUCKET'] = 'test-vector-bucket'
-os.environ['EMBEDDING_DIMENSIONS'] = '256,384,1024,3072'
+# lambda/embedder is on pythonpath (pytest.ini); environment variables are set in conftest.py
+from store_embeddings import index as store_embeddings
 
-# Import the store_embeddings module directly to avoid name collision
-store_embeddings_path = os.path.join(os.path.dirname(__file__), '../../lambda/embedder/store_embeddings/index.py')
-spec = importlib.util.spec_from_file_location("store_embeddings", store_embeddings_path)
-store_embeddings = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(store_embeddings)
+PROCESSING_TIMESTAMP = '2024-01-15T10:30:00'
+
+# segmented-embedding-result.json for a single-modality video job, shared by the
+# read_result_file and handler tests
+RESULT_FILE = {
+    'sourceFileUri': 's3://bucket/file.mp4',
+    'embeddingDimension': 3072,
+    'embeddingResults': [
+        {
+            'embeddingType': 'VIDEO',
+            'status': 'SUCCESS',
+            'outputFileUri': 's3://bucket/output/embedding-video.jsonl'
+        }
+    ]
+}
+
+# Job output files, serialized once at import rather than in every test
+RESULT_FILE_BYTES = json.dumps(RESULT_FILE).encode('utf-8')
+
+JSONL_THREE_SEGMENTS = '\n'.join(
+    json.dumps({
+        'embedding': [value] * 3072,
+        'segmentMetadata': {'segmentIndex': i},
+        'status': 'SUCCESS'
+    })
+    for i, value in enumerate([0.1, 0.2, 0.3])
+).encode('utf-8')
+
+JSONL_ONE_FAILED_SEGMENT = '\n'.join([
+    json.dumps({
+        'embedding': [0.1] * 3072,
+        'segmentMetadata': {'segmentIndex': 0},
+        'status': 'SUCCESS'
+    }),
+    json.dumps({
+        'segmentMetadata': {'segmentIndex': 1},
+        'status': 'FAILURE',
+        'failureReason': 'Invalid content'
+    }),
+    json.dumps({
+        'embedding': [0.3] * 3072,
+        'segmentMetadata': {'segmentIndex': 2},
+        'status': 'SUCCESS'
+    })
+]).encode('utf-8')
+
+
+def make_event(**overrides):
+    """Store embeddings event as passed by Step Functions, with fields overridden"""
+    return {
+        'outputS3Uri': 's3://bucket/output',
+        'invocationArn': 'arn:aws:bedrock:us-east-1:123456789012:async-invoke/abc123',
+        'metadata': {'objectId': 'test'},
+        **overrides
+    }
 
 
 class TestParseS3Uri:
     """Tests for parse_s3_uri function"""
     
-    def test_basic_uri(self):
-        """Test parsing basic S3 URI"""
-        bucket, prefix = store_embeddings.parse_s3_uri('s3://my-bucket/my-prefix')
-        assert bucket == 'my-bucket'
-        assert prefix == 'my-prefix'
-    
-    def test_nested_prefix(self):
-        """Test parsing URI with nested prefix"""
-        bucket, prefix = store_embeddings.parse_s3_uri('s3://my-bucket/path/to/files')
-        assert bucket == 'my-bucket'
-        assert prefix == 'path/to/files'
-    
-    def test_no_prefix(self):
-        """Test parsing URI with no prefix"""
-        bucket, prefix = store_embeddings.parse_s3_uri('s3://my-bucket')
-        assert bucket == 'my-bucket'
-        assert prefix == ''
+    @pytest.mark.parametrize('uri,expected', [
+        ('s3://my-bucket/my-prefix', ('my-bucket', 'my-prefix')),
+        ('s3://my-bucket/path/to/files', ('my-bucket', 'path/to/files')),
+        ('s3://my-bucket', ('my-bucket', '')),
+    ], ids=['basic', 'nested_prefix', 'no_prefix'])
+    def test_parses_uri(self, uri, expected):
+        """Test splitting S3 URIs into bucket and prefix"""
+        assert store_embeddings.parse_s3_uri(uri) == expected
 
 
 class TestReadResultFile:
@@ -49,25 +89,13 @@ class TestReadResultFile:
     @patch.object(store_embeddings, 's3_client')
     def test_reads_result_file(self, mock_s3):
         """Test reading segmented-embedding-result.json"""
-        mock_result = {
-            'sourceFileUri': 's3://bucket/file.mp4',
-            'embeddingDimension': 3072,
-            'embeddingResults': [
-                {
-                    'embeddingType': 'VIDEO',
-                    'status': 'SUCCESS',
-                    'outputFileUri': 's3://bucket/output/embedding-video.jsonl'
-                }
-            ]
-        }
-        
         mock_s3.get_object.return_value = {
-            'Body': Mock(read=lambda: json.dumps(mock_result).encode('utf-8'))
+            'Body': BytesIO(RESULT_FILE_BYTES)
         }
         
         result = store_embeddings.read_result_file('bucket', 'prefix')
         
-        assert result == mock_result
+        assert result == RESULT_FILE
         mock_s3.get_object.assert_called_once_with(
             Bucket='bucket',
             Key='prefix/segmented-embedding-result.json'
@@ -99,7 +127,8 @@ class TestCreateCombinedMetadata:
             source_metadata,
             segment_metadata,
             'VIDEO',
-            1024
+            1024,
+            PROCESSING_TIMESTAMP
         )
         
         # From source metadata
@@ -117,56 +146,53 @@ class TestCreateCombinedMetadata:
         # From processing
         assert result['modalityType'] == 'VIDEO'
         assert result['embeddingDimension'] == 1024
-        assert 'processingTimestamp' in result
+        assert result['processingTimestamp'] == PROCESSING_TIMESTAMP
     
-    def test_text_segment_metadata(self):
-        """Test text-specific segment metadata"""
-        segment_metadata = {
-            'segmentIndex': 0,
-            'segmentStartCharPosition': 0,
-            'segmentEndCharPosition': 1000,
-            'truncatedCharLength': 950
-        }
-        
-        result = store_embeddings.create_combined_metadata(
-            {'objectId': 'test'},
-            segment_metadata,
+    @pytest.mark.parametrize('segment_metadata,modality,dimension', [
+        (
+            {
+                'segmentIndex': 0,
+                'segmentStartCharPosition': 0,
+                'segmentEndCharPosition': 1000,
+                'truncatedCharLength': 950
+            },
             'TEXT',
             256
-        )
-        
-        assert result['segmentStartCharPosition'] == 0
-        assert result['segmentEndCharPosition'] == 1000
-        assert result['truncatedCharLength'] == 950
-    
-    def test_video_segment_metadata(self):
-        """Test video-specific segment metadata"""
-        segment_metadata = {
-            'segmentIndex': 2,
-            'segmentStartSeconds': 10.0,
-            'segmentEndSeconds': 15.0
-        }
-        
+        ),
+        (
+            {
+                'segmentIndex': 2,
+                'segmentStartSeconds': 10.0,
+                'segmentEndSeconds': 15.0
+            },
+            'VIDEO',
+            384
+        ),
+    ], ids=['text', 'video'])
+    def test_modality_segment_metadata(self, segment_metadata, modality, dimension):
+        """Test modality-specific segment metadata is carried over"""
         result = store_embeddings.create_combined_metadata(
             {'objectId': 'test'},
             segment_metadata,
-            'VIDEO',
-            384
+            modality,
+            dimension,
+            PROCESSING_TIMESTAMP
         )
         
-        assert result['segmentStartSeconds'] == 10.0
-        assert result['segmentEndSeconds'] == 15.0
+        for field, value in segment_metadata.items():
+            assert result[field] == value
+        assert result['modalityType'] == modality
+        assert result['embeddingDimension'] == dimension
 
 
 class TestProcessSegment:
     """Tests for process_segment function"""
     
-    @patch.object(store_embeddings, 'store_in_vector_index')
     @patch.object(store_embeddings, 'create_multi_dimensional_embeddings')
-    def test_processes_single_segment(self, mock_create_embeddings, mock_store):
+    def test_processes_single_segment(self, mock_create_embeddings, rng_pool):
         """Test processing a single segment"""
         # Create mock 3072-dim embedding
-        embedding_3072 = np.random.randn(3072).tolist()
+        embedding_3072 = rng_pool[0].tolist()
         
         segment_data = {
             'embedding': embedding_3072,
@@ -191,23 +217,25 @@ class TestProcessSegment:
             3072: embedding_3072
         }
         
+        batches = {}
         result = store_embeddings.process_segment(
             segment_data,
             source_metadata,
-            'VIDEO'
+            'VIDEO',
+            batches,
+            PROCESSING_TIMESTAMP
         )
         
-        # Should return 4 (number of dimensions stored)
+        # Should return 4 (number of dimensions queued)
         assert result == 4
         
-        # Should call store_in_vector_index 4 times
-        assert mock_store.call_count == 4
+        # Should queue one vector per dimension
+        assert {dim: len(v) for dim, v in batches.items()} == {256: 1, 384: 1, 1024: 1, 3072: 1}
     
-    @patch.object(store_embeddings, 'store_in_vector_index')
     @patch.object(store_embeddings, 'create_multi_dimensional_embeddings')
-    def test_stores_all_dimensions(self, mock_create_embeddings, mock_store):
-        """Test that all dimensions are stored"""
-        embedding_3072 = np.random.randn(3072).tolist()
+    def test_stores_all_dimensions(self, mock_create_embeddings, rng_pool):
+        """Test that all dimensions are queued"""
+        embedding_3072 = rng_pool[0].tolist()
         
         mock_create_embeddings.return_value = {
             256: [0.1] * 256,
@@ -222,66 +250,307 @@ class TestProcessSegment:
             'status': 'SUCCESS'
         }
         
+        batches = {}
         store_embeddings.process_segment(
             segment_data,
             {'objectId': 'test'},
-            'IMAGE'
+            'IMAGE',
+            batches,
+            PROCESSING_TIMESTAMP
         )
         
-        # Verify each dimension was stored
-        stored_dimensions = [call[0][0] for call in mock_store.call_args_list]
-        assert 256 in stored_dimensions
-        assert 384 in stored_dimensions
-        assert 1024 in stored_dimensions
-        assert 3072 in stored_dimensions
+        # Verify each dimension was queued with the right vector length
+        assert set(batches.keys()) == {256, 384, 1024, 3072}
+        for dim, vectors in batches.items():
+            assert len(vectors[0]['data']['float32']) == dim
 
 
-class TestStoreInVectorIndex:
-    """Tests for store_in_vector_index function"""
+class TestBuildVectorRecord:
+    """Tests for build_vector_record function"""
     
-    @patch.object(store_embeddings, 's3_client')
-    def test_stores_embedding(self, mock_s3):
-        """Test storing embedding in S3"""
-        embedding = [0.1] * 256
+    def test_builds_put_vectors_record(self):
+        """Test the record matches the PutVectors vector shape"""
         metadata = {
             'objectId': 'test_image_123',
             'segmentIndex': 0,
             'fileName': 'test.jpg'
         }
         
-        store_embeddings.store_in_vector_index(256, embedding, metadata)
+        record = store_embeddings.build_vector_record([0.1] * 256, metadata)
         
-        # Verify S3 put_object was called
-        mock_s3.put_object.assert_called_once()
-        call_args = mock_s3.put_object.call_args
+        assert record['key'] == 'test_image_123_segment_00000000'
+        assert len(record['data']['float32']) == 256
+        assert record['metadata']['fileName'] == 'test.jpg'
+    
+    def test_key_is_zero_padded(self):
+        """Test that key order matches segment order"""
+        keys = [
+            store_embeddings.build_vector_record(
+                [0.1] * 4, {'objectId': 'video', 'segmentIndex': i}
+            )['key']
+            for i in [2, 10, 1]
+        ]
+        
+        assert sorted(keys) == [
+            'video_segment_00000001',
+            'video_segment_00000002',
+            'video_segment_00000010'
+        ]
+
+
+class TestStoreVectorBatches:
+    """Tests for store_vector_batches function"""
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_puts_vectors_sorted_by_key(self, mock_s3vectors):
+        """Test vectors are written to the dimension index in key order"""
+        vectors = [
+            {'key': 'b_segment_00000001', 'data': {'float32': [0.1]}, 'metadata': {}},
+            {'key': 'a_segment_00000002', 'data': {'float32': [0.1]}, 'metadata': {}},
+            {'key': 'a_segment_00000001', 'data': {'float32': [0.1]}, 'metadata': {}}
+        ]
+        
+        store_embeddings.store_vector_batches(256, vectors)
+        
+        mock_s3vectors.put_vectors.assert_called_once()
+        call_args = mock_s3vectors.put_vectors.call_args
+        assert call_args[1]['vectorBucketName'] == store_embeddings.VECTOR_BUCKET
+        assert call_args[1]['indexName'] == 'embeddings-256d'
+        assert [v['key'] for v in call_args[1]['vectors']] == [
+            'a_segment_00000001',
+            'a_segment_00000002',
+            'b_segment_00000001'
+        ]
+        
+        # The caller's list is left in its original order
+        assert [v['key'] for v in vectors] == [
+            'b_segment_00000001',
+            'a_segment_00000002',
+            'a_segment_00000001'
+        ]
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_legacy_keys_kept_by_default(self, mock_s3vectors):
+        """Test no DeleteVectors call is made unless the legacy-key migration is enabled"""
+        store_embeddings.store_vector_batches(
+            256, [{'key': 'doc_segment_00000000', 'data': {'float32': [0.1]}, 'metadata': {}}]
+        )
         
-        assert call_args[1]['Bucket'] == store_embeddings.VECTOR_BUCKET
-        assert 'embeddings-256d' in call_args[1]['Key']
-        assert 'test_image_123' in call_args[1]['Key']
+        mock_s3vectors.delete_vectors.assert_not_called()
+        mock_s3vectors.put_vectors.assert_called_once()
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_splits_into_batches(self, mock_s3vectors):
+        """Test that large inputs are split at the PutVectors batch limit"""
+        batch_size = store_embeddings.PUT_VECTORS_BATCH_SIZE
+        vectors = [
+            {'key': f'doc_segment_{i:08d}', 'data': {'float32': [0.1]}, 'metadata': {}}
+            for i in range(batch_size + 1)
+        ]
+        
+        store_embeddings.store_vector_batches(1024, vectors)
+        
+        assert mock_s3vectors.put_vectors.call_count == 2
+        sizes = [len(c[1]['vectors']) for c in mock_s3vectors.put_vectors.call_args_list]
+        assert sizes == [batch_size, 1]
+
+
+    @patch.object(store_embeddings, 'DELETE_LEGACY_VECTOR_KEYS', True)
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_deletes_legacy_unpadded_keys(self, mock_s3vectors):
+        """Test keys from before zero-padding are removed so re-ingested files aren't duplicated"""
+        vectors = [
+            {'key': 'doc_segment_00000010', 'data': {'float32': [0.1]}, 'metadata': {}},
+            {'key': 'doc_segment_00000002', 'data': {'float32': [0.1]}, 'metadata': {}}
+        ]
+        
+        store_embeddings.store_vector_batches(256, vectors)
+        
+        mock_s3vectors.delete_vectors.assert_called_once_with(
+            vectorBucketName=store_embeddings.VECTOR_BUCKET,
+            indexName='embeddings-256d',
+            keys=['doc_segment_2', 'doc_segment_10']
+        )
+        mock_s3vectors.put_vectors.assert_called_once()
+    
+    @patch.object(store_embeddings, 'DELETE_LEGACY_VECTOR_KEYS', True)
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_legacy_delete_failure_is_raised(self, mock_s3vectors):
+        """Test a failed legacy-key delete stops the write instead of passing silently"""
+        from botocore.exceptions import ClientError
+        mock_s3vectors.delete_vectors.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'DeleteVectors'
+        )
+        
+        with pytest.raises(ClientError):
+            store_embeddings.store_vector_batches(
+                256, [{'key': 'doc_segment_00000000', 'data': {'float32': [0.1]}, 'metadata': {}}]
+            )
         
-        # Verify data structure
-        stored_data = json.loads(call_args[1]['Body'])
-        assert 'vector' in stored_data  # Changed from 'embedding' to 'vector' for S3 Vectors
-        assert 'metadata' in stored_data
-        assert stored_data['vector'] == embedding
-        assert stored_data['metadata'] == metadata
+        mock_s3vectors.put_vectors.assert_not_called()
     
-    @patch.object(store_embeddings, 's3_client')
-    def test_creates_correct_key_structure(self, mock_s3):
-        """Test that S3 key structure is correct"""
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_batches_stay_under_request_size_limit(self, mock_s3vectors, rng_pool):
+        """Test full-size 3072d batches are split to fit the PutVectors request limit"""
         metadata = {
-            'objectId': 'video_mp4_20240115',
-            'segmentIndex': 3
+            'sourceS3Uri': 's3://bucket/long-video.mp4',
+            'fileName': 'long-video.mp4',
+            'objectId': 'long_video_mp4_20240115103000',
+            'modalityType': 'VIDEO',
+            'embeddingDimension': 3072,
+            'processingTimestamp': PROCESSING_TIMESTAMP
         }
+        vectors = [
+            store_embeddings.build_vector_record(
+                rng_pool[i % len(rng_pool)].tolist(), {**metadata, 'segmentIndex': i}
+            )
+            for i in range(store_embeddings.PUT_VECTORS_BATCH_SIZE)
+        ]
+        
+        store_embeddings.store_vector_batches(3072, vectors)
+        
+        bodies = [
+            json.dumps(c[1]).encode('utf-8')
+            for c in mock_s3vectors.put_vectors.call_args_list
+        ]
+        assert len(bodies) > 1
+        assert all(len(body) < 20 * 1024 * 1024 for body in bodies)
+        written = [v['key'] for c in mock_s3vectors.put_vectors.call_args_list for v in c[1]['vectors']]
+        assert written == sorted(v['key'] for v in vectors)
+
+
+class TestStoreAllDimensions:
+    """Tests for store_all_dimensions function"""
+    
+    @patch.object(store_embeddings, 'store_vector_batches')
+    def test_stores_each_non_empty_dimension(self, mock_store):
+        """Test every dimension with vectors is written exactly once"""
+        batches = {
+            256: [{'key': 'a'}],
+            384: [],
+            1024: [{'key': 'b'}],
+            3072: [{'key': 'c'}]
+        }
+        
+        store_embeddings.store_all_dimensions(batches)
+        
+        stored = sorted(c.args[0] for c in mock_store.call_args_list)
+        assert stored == [256, 1024, 3072]
+    
+    @patch.object(store_embeddings, 'store_vector_batches')
+    def test_reraises_write_errors(self, mock_store):
+        """Test a failure in one dimension fails the whole flush"""
+        def store(dimension, vectors):
+            if dimension == 1024:
+                raise RuntimeError('write failed')
+        mock_store.side_effect = store
+        
+        with pytest.raises(RuntimeError, match='write failed'):
+            store_embeddings.store_all_dimensions({256: [{'key': 'a'}], 1024: [{'key': 'b'}]})
+        
+        assert mock_store.call_count == 2
+
+
+class TestPutWithSplit:
+    """Tests for conflict split-and-retry in _put_with_split"""
+    
+    @staticmethod
+    def _conflict():
+        from botocore.exceptions import ClientError
+        return ClientError({'Error': {'Code': 'ConflictException', 'Message': 'conflict'}}, 'PutVectors')
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_splits_batch_on_conflict(self, mock_s3vectors):
+        """Test the batch is halved until the conflicting vector is isolated"""
+        batch = [{'key': f'doc_segment_{i:08d}'} for i in range(4)]
+        conflict = self._conflict()
+        
+        def put_vectors(vectorBucketName, indexName, vectors):
+            if any(v['key'] == 'doc_segment_00000003' for v in vectors) and len(vectors) > 1:
+                raise conflict
+        
+        mock_s3vectors.put_vectors.side_effect = put_vectors
+        
+        store_embeddings._put_with_split(256, 'embeddings-256d', batch)
+        
+        written = [
+            [v['key'] for v in c[1]['vectors']]
+            for c in mock_s3vectors.put_vectors.call_args_list
+        ]
+        # full batch, first half, second half, then the two singles of the conflicting half
+        assert written[1:] == [
+            ['doc_segment_00000000', 'doc_segment_00000001'],
+            ['doc_segment_00000002', 'doc_segment_00000003'],
+            ['doc_segment_00000002'],
+            ['doc_segment_00000003']
+        ]
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_raises_for_single_conflicting_vector(self, mock_s3vectors):
+        """Test a conflict on a single vector is re-raised"""
+        from botocore.exceptions import ClientError
+        mock_s3vectors.put_vectors.side_effect = self._conflict()
+        
+        with pytest.raises(ClientError):
+            store_embeddings._put_with_split(256, 'embeddings-256d', [{'key': 'doc_segment_00000000'}])
+    
+    @patch.object(store_embeddings, 's3vectors_client')
+    def test_other_errors_are_not_split(self, mock_s3vectors):
+        """Test non-conflict errors fail the batch without retries"""
+        from botocore.exceptions import ClientError
+        mock_s3vectors.put_vectors.side_effect = ClientError(
+            {'Error': {'Code': 'ValidationException', 'Message': 'bad'}}, 'PutVectors'
+        )
+        
+        with pytest.raises(ClientError):
+            store_embeddings._put_with_split(256, 'embeddings-256d', [{'key': 'a'}, {'key': 'b'}])
+        
+        assert mock_s3vectors.put_vectors.call_count == 1
+
+
+class TestPrebuiltPutVectorsBody:
+    """Tests for the PutVectors body prebuild/inject event handlers"""
+    
+    def test_sent_body_matches_vectors(self):
+        """Test the signed request carries the full vectors despite the emptied params"""
+        import boto3
+        from botocore.awsrequest import AWSResponse
+        
+        client = boto3.client(
+            's3vectors',
+            region_name='us-east-1',
+            aws_access_key_id='testing',
+            aws_secret_access_key='testing'
+        )
+        client.meta.events.register(
+            'before-parameter-build.s3vectors.PutVectors',
+            store_embeddings._prebuild_put_vectors_body
+        )
+        client.meta.events.register(
+            'before-call.s3vectors.PutVectors',
+            store_embeddings._inject_put_vectors_body
+        )
+        
+        sent = {}
+        
+        def capture_request(request, **kwargs):
+            sent['body'] = request.body
+            sent['authorization'] = request.headers.get('Authorization')
+            return AWSResponse(request.url, 200, {}, Mock(stream=lambda: iter([b'{}'])))
         
-        store_embeddings.store_in_vector_index(1024, [0.1] * 1024, metadata)
+        client.meta.events.register('before-send.s3vectors.PutVectors', capture_request)
         
-        key = mock_s3.put_object.call_args[1]['Key']
+        vectors = [
+            {'key': 'doc_segment_00000000', 'data': {'float32': [0.5, -0.25]}, 'metadata': {'modalityType': 'TEXT'}}
+        ]
+        client.put_vectors(vectorBucketName='test-vector-bucket', indexName='embeddings-256d', vectors=vectors)
         
-        # Should be: embeddings-1024d/video_mp4_20240115/segment_3.json
-        assert key.startswith('embeddings-1024d/')
-        assert 'video_mp4_20240115' in key
-        assert 'segment_3.json' in key
+        body = json.loads(sent['body'])
+        assert body['vectors'] == vectors
+        assert body['indexName'] == 'embeddings-256d'
+        assert sent['authorization'] is not None
+        # Caller's vectors are not modified
+        assert vectors[0]['data']['float32'] == [0.5, -0.25]
 
 
 class TestProcessModalityEmbeddings:
@@ -292,26 +561,8 @@ class TestProcessModalityEmbeddings:
     def test_processes_multiple_segments(self, mock_s3, mock_process_segment):
         """Test processing multiple segments from JSONL"""
         # Mock JSONL content with 3 segments
-        jsonl_content = '\n'.join([
-            json.dumps({
-                'embedding': [0.1] * 3072,
-                'segmentMetadata': {'segmentIndex': 0},
-                'status': 'SUCCESS'
-            }),
-            json.dumps({
-                'embedding': [0.2] * 3072,
-                'segmentMetadata': {'segmentIndex': 1},
-                'status': 'SUCCESS'
-            }),
-            json.dumps({
-                'embedding': [0.3] * 3072,
-                'segmentMetadata': {'segmentIndex': 2},
-                'status': 'SUCCESS'
-            })
-        ])
-        
         mock_s3.get_object.return_value = {
-            'Body': Mock(read=lambda: jsonl_content.encode('utf-8'))
+            'Body': BytesIO(JSONL_THREE_SEGMENTS)
         }
         
         mock_process_segment.return_value = 4  # 4 dimensions per segment
@@ -326,7 +577,8 @@ class TestProcessModalityEmbeddings:
             embedding_result,
             {'objectId': 'test'},
             'bucket',
-            'prefix'
+            'prefix',
+            PROCESSING_TIMESTAMP
         )
         
         # Should process 3 segments
@@ -338,26 +590,8 @@ class TestProcessModalityEmbeddings:
     @patch.object(store_embeddings, 's3_client')
     def test_skips_failed_segments(self, mock_s3, mock_process_segment):
         """Test that failed segments are skipped"""
-        jsonl_content = '\n'.join([
-            json.dumps({
-                'embedding': [0.1] * 3072,
-                'segmentMetadata': {'segmentIndex': 0},
-                'status': 'SUCCESS'
-            }),
-            json.dumps({
-                'segmentMetadata': {'segmentIndex': 1},
-                'status': 'FAILURE',
-                'failureReason': 'Invalid content'
-            }),
-            json.dumps({
-                'embedding': [0.3] * 3072,
-                'segmentMetadata': {'segmentIndex': 2},
-                'status': 'SUCCESS'
-            })
-        ])
-        
         mock_s3.get_object.return_value = {
-            'Body': Mock(read=lambda: jsonl_content.encode('utf-8'))
+            'Body': BytesIO(JSONL_ONE_FAILED_SEGMENT)
         }
         
         mock_process_segment.return_value = 4
@@ -372,13 +606,43 @@ class TestProcessModalityEmbeddings:
             embedding_result,
             {'objectId': 'test'},
             'bucket',
-            'prefix'
+            'prefix',
+            PROCESSING_TIMESTAMP
         )
         
         # Should only process 2 successful segments
         assert mock_process_segment.call_count == 2
 
 
+    @patch.object(store_embeddings, 'store_all_dimensions')
+    @patch.object(store_embeddings, 's3_client')
+    def test_zero_prefix_segment_fails_instead_of_storing_nan(self, mock_s3, mock_store):
+        """Test the shared MRL batch function rejects an all-zero prefix before anything is stored"""
+        jsonl = json.dumps({
+            'embedding': [0.0] * 256 + [1.0] * 2816,
+            'segmentMetadata': {'segmentIndex': 0},
+            'status': 'SUCCESS'
+        }).encode('utf-8')
+        mock_s3.get_object.return_value = {'Body': BytesIO(jsonl)}
+        
+        embedding_result = {
+            'outputFileUri': 's3://bucket/output/embedding-image.jsonl',
+            'embeddingType': 'IMAGE',
+            'status': 'SUCCESS'
+        }
+        
+        with pytest.raises(ValueError, match="Cannot normalize zero vector"):
+            store_embeddings.process_modality_embeddings(
+                embedding_result,
+                {'objectId': 'test'},
+                'bucket',
+                'prefix',
+                PROCESSING_TIMESTAMP
+            )
+        
+        mock_store.assert_not_called()
+
+
 class TestHandler:
     """Tests for main handler function"""
     
@@ -386,27 +650,14 @@ class TestHandler:
     @patch.object(store_embeddings, 'read_result_file')
     def test_successful_processing(self, mock_read_result, mock_process_modality):
         """Test successful end-to-end processing"""
-        mock_read_result.return_value = {
-            'sourceFileUri': 's3://bucket/video.mp4',
-            'embeddingDimension': 3072,
-            'embeddingResults': [
-                {
-                    'embeddingType': 'VIDEO',
-                    'status': 'SUCCESS',
-                    'outputFileUri': 's3://bucket/output/embedding-video.jsonl'
-                }
-            ]
-        }
+        mock_read_result.return_value = RESULT_FILE
         
         mock_process_modality.return_value = 12  # 3 segments × 4 dimensions
         
-        event = {
-            'outputS3Uri': 's3://output-bucket/job123',
-            'metadata': {
-                'objectId': 'video_mp4_123',
-                'fileName': 'video.mp4'
-            }
-        }
+        event = make_event(
+            outputS3Uri='s3://output-bucket/job123',
+            metadata={'objectId': 'video_mp4_123', 'fileName': 'video.mp4'}
+        )
         
         result = store_embeddings.handler(event, None)
         
@@ -436,15 +687,13 @@ class TestHandler:
         
         mock_process_modality.return_value = 8
         
-        event = {
-            'outputS3Uri': 's3://bucket/output',
-            'metadata': {'objectId': 'test'}
-        }
-        
-        result = store_embeddings.handler(event, None)
+        result = store_embeddings.handler(make_event(), None)
         
         # Should process both modalities
         assert mock_process_modality.call_count == 2
+        # Both modalities share the invocation's processing timestamp
+        timestamps = {c[0][4] for c in mock_process_modality.call_args_list}
+        assert len(timestamps) == 1
         assert result['embeddingsStored'] == 16  # 8 per modality
     
     @patch.object(store_embeddings, 'read_result_file')
@@ -452,16 +701,12 @@ class TestHandler:
         """Test error handling in handler"""
         mock_read_result.side_effect = Exception("S3 read error")
         
-        event = {
-            'outputS3Uri': 's3://bucket/output',
-            'metadata': {'objectId': 'test'}
-        }
-        
-        result = store_embeddings.handler(event, None)
+        result = store_embeddings.handler(make_event(), None)
         
         assert result['statusCode'] == 500
         assert result['status'] == 'FAILED'
-        assert 'error' in result
+        assert result['error'] == 'S3 read error'
+        mock_read_result.assert_called_once_with('bucket', 'output/abc123')
 
 
 if __name__ == '__main__':